@@ -37,6 +37,10 @@ def create_app(config_name=None):
     jwt.init_app(app)
     compress.init_app(app)  # Enable gzip compression
     
+    # Response cache backend (in-process LRU, or Redis shared by all workers)
+    from app.performance import init_cache
+    init_cache(app)
+    
     # Setup CORS - Allow all origins with proper headers for Azure
     CORS(app, resources={
         r"/api/*": {
@@ -77,9 +81,55 @@ def create_app(config_name=None):
         transports=['websocket', 'polling'],
         cors_credentials=False,
         cookie=None,  # Disable cookies to avoid CORS issues
-        manage_session=False  # Don't manage Flask session
+        manage_session=False,  # Don't manage Flask session
+        # Lets emit(room=...) reach sockets connected to other gunicorn workers
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE')
     )
     
+    # Connected-user registry (in-process, or Redis shared by all workers)
+    from app.presence import init_presence
+    init_presence(app)
+    
+    # Background bulk writer for notification fan-out
+    from app.services.notification_fanout import init_notification_fanout
+    init_notification_fanout(app)
+    
+    # Buffered bulk writer for the activity log (audit trail)
+    from app.services.activity_log_writer import init_activity_log_writer
+    init_activity_log_writer(app)
+    
+    # Create-ahead / detach / archive jobs for the partitioned activity log
+    from app.services.activity_log_partitions import init_activity_log_partitions
+    init_activity_log_partitions(app)
+    
+    # Scheduled reconciliation of the per-member unread chat counters
+    from app.services.unread_reconciler import init_unread_reconciler
+    init_unread_reconciler(app)
+    
+    # Scheduled refresh of the dashboard stats rollups
+    from app.services.dashboard_stats import init_dashboard_stats
+    init_dashboard_stats(app)
+    
+    # Durable PDF stamp queue (embedded worker only when STAMP_WORKER_EMBEDDED)
+    from app.services.stamp_queue import init_stamp_queue
+    init_stamp_queue(app)
+    
+    # Pooled, retrying IPFS/Pinata client (and gateway URLs)
+    from app.services.ipfs_client import init_ipfs_client
+    init_ipfs_client(app)
+    
+    # Local CID-keyed cache for documents fetched from IPFS
+    from app.services.ipfs_cache import init_ipfs_cache
+    init_ipfs_cache(app)
+    
+    # Process pool the stamp queue stamps PDFs in
+    from app.services.stamp_engine import init_stamp_engine
+    init_stamp_engine(app)
+    
+    # Bounded, cached verification code extraction for /verify-file
+    from app.services.verification_extractor import init_verification_extractor
+    init_verification_extractor(app)
+    
     # Import WebSocket events (must be after socketio init)
     from app import websocket_events
     
@@ -96,7 +146,7 @@ def create_app(config_name=None):
             return response
     
     # Import models to ensure they are registered with SQLAlchemy
-    from app.models import user, document, institution, folder, recent_activity, approval, document_template, chat, blockchain_transaction, activity_log
+    from app.models import user, document, institution, folder, recent_activity, approval, document_template, chat, blockchain_transaction, activity_log, stamp_job
     
     # Register blueprints
     from app.routes import auth, documents, users, approvals, chat, circulars, institutions, folders, shares, recent, document_generation, blockchain, activity_log as activity_log_routes, dashboard, notifications, health
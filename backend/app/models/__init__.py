@@ -8,6 +8,7 @@ from .document_template import DocumentTemplate, GeneratedDocument
 from .chat import Conversation, ConversationMember, Message, UserOnlineStatus
 from .blockchain_transaction import BlockchainTransaction, WalletBalance
 from .activity_log import ActivityLog, log_activity
+from .stamp_job import StampJob
 
 __all__ = [
     'User', 
@@ -29,5 +30,6 @@ __all__ = [
     'BlockchainTransaction',
     'WalletBalance',
     'ActivityLog',
-    'log_activity'
+    'log_activity',
+    'StampJob'
 ]
\ No newline at end of file
@@ -9,7 +9,12 @@ import uuid
 
 
 class ActivityLog(db.Model):
-    """Model for tracking all user activities - immutable audit trail"""
+    """
+    Model for tracking all user activities - immutable audit trail
+    
+    Range-partitioned by month on created_at once
+    database/partition_activity_logs.sql has run (primary key (id, created_at)).
+    """
     __tablename__ = 'activity_logs'
     __table_args__ = {'extend_existing': True}
     
@@ -130,6 +135,10 @@ def log_activity(user_id, action_type, action_category, description,
     """
     Helper function to log an activity
     
+    The entry is timestamped now and handed to the buffered activity log
+    writer, which inserts it in bulk in its own transaction - the caller's
+    session is neither flushed nor committed.
+    
     Args:
         user_id: UUID of the user performing the action
         action_type: Type of action (login, upload, etc.)
@@ -144,25 +153,32 @@ def log_activity(user_id, action_type, action_category, description,
         status: 'success', 'failed', or 'pending'
     
     Returns:
-        ActivityLog instance or None if error
+        The activity_logs row that was queued, or None if error
     """
+    from app.services.activity_log_writer import activity_log_writer
     try:
-        activity = ActivityLog(
-            user_id=user_id,
-            action_type=action_type,
-            action_category=action_category,
-            description=description,
-            target_id=str(target_id) if target_id else None,
-            target_type=target_type,
-            target_name=target_name,
-            extra_data=metadata or {},
-            ip_address=ip_address,
-            user_agent=user_agent,
-            status=status
-        )
-        db.session.add(activity)
-        db.session.commit()
-        return activity
+        entry = {
+            'id': uuid.uuid4(),
+            'user_id': _as_uuid(user_id),
+            'action_type': action_type,
+            'action_category': action_category,
+            'description': description,
+            'target_id': str(target_id) if target_id else None,
+            'target_type': target_type,
+            'target_name': target_name[:500] if target_name else target_name,
+            'extra_data': metadata or {},
+            'ip_address': ip_address,
+            'user_agent': user_agent[:500] if user_agent else user_agent,
+            'status': status,
+            'created_at': datetime.utcnow()
+        }
+        activity_log_writer.write(entry)
+        return entry
     except Exception:
-        db.session.rollback()
         return None
+
+
+def _as_uuid(value):
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
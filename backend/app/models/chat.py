@@ -1,8 +1,18 @@
 from app import db
+from flask import current_app
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
+# Messages counted as unread for member cm (alias m): from others, not
+# deleted, newer than the member's last read (everything if never read).
+# Shared by the conversation list, the unread total and the reconciler.
+UNREAD_MESSAGE_SQL = """
+    m.sender_id <> cm.user_id
+    AND m.is_deleted = false
+    AND (cm.last_read_at IS NULL OR m.created_at > cm.last_read_at)
+"""
+
 class Conversation(db.Model):
     """Represents a chat conversation (direct or group)"""
     __tablename__ = 'conversations'
@@ -59,12 +69,16 @@ class Conversation(db.Model):
                 conversation_id=self.id, 
                 user_id=user_id
             ).first()
-            if member:
+            if member and unread_counters_enabled():
+                unread_count = member.unread_count or 0
+            elif member:
                 unread_count = self.messages.filter(
                     Message.created_at > member.last_read_at,
-                    Message.sender_id != user_id
+                    Message.sender_id != user_id,
+                    Message.is_deleted == False
                 ).count() if member.last_read_at else self.messages.filter(
-                    Message.sender_id != user_id
+                    Message.sender_id != user_id,
+                    Message.is_deleted == False
                 ).count()
         
         return {
@@ -90,9 +104,102 @@ class Conversation(db.Model):
         return f'<Conversation {self.id} ({self.type})>'
 
 
+def conversation_list_for_user(user_id, conv_type=None):
+    """
+    Build the conversation list for a user with one query: membership
+    settings, last message, unread count, member count and, for direct chats,
+    the peer's profile, online status and department all come back per row
+    (LATERAL subqueries instead of ~6 queries per conversation).
+    
+    Returns the same dicts get_conversations has always returned.
+    """
+    type_filter = "AND c.type = :conv_type" if conv_type else ""
+    if unread_counters_enabled():
+        unread_column, unread_join = "cm.unread_count", ""
+    else:
+        unread_column, unread_join = "unread.count", f"""
+        LEFT JOIN LATERAL (
+            SELECT count(*) AS count FROM messages m
+            WHERE m.conversation_id = c.id AND {UNREAD_MESSAGE_SQL}
+        ) unread ON true"""
+    rows = db.session.execute(db.text(f"""
+        SELECT c.id, c.type, c.name, c.description, c.is_auto_created, c.auto_type,
+               c.avatar, c.created_by, c.institution_id, c.last_message_at, c.created_at,
+               cm.is_muted AS member_muted, cm.is_pinned AS member_pinned,
+               last_msg.content AS last_message,
+               {unread_column} AS unread,
+               members.count AS member_count,
+               peer.id AS peer_id, peer.first_name AS peer_first_name,
+               peer.last_name AS peer_last_name, peer.role AS peer_role,
+               peer.email AS peer_email, peer.phone AS peer_phone,
+               peer.department_id AS peer_department_id,
+               status.is_online AS peer_online, status.last_seen AS peer_last_seen,
+               dept.name AS peer_department
+        FROM conversation_members cm
+        JOIN conversations c ON c.id = cm.conversation_id
+        LEFT JOIN LATERAL (
+            SELECT m.content FROM messages m
+            WHERE m.conversation_id = c.id
+            ORDER BY m.created_at DESC
+            LIMIT 1
+        ) last_msg ON true{unread_join}
+        LEFT JOIN LATERAL (
+            SELECT count(*) AS count FROM conversation_members x
+            WHERE x.conversation_id = c.id
+        ) members ON true
+        LEFT JOIN users peer ON c.type = 'direct' AND peer.id =
+            CASE WHEN c.user2_id = cm.user_id THEN c.user1_id ELSE c.user2_id END
+        LEFT JOIN user_online_status status ON status.user_id = peer.id
+        LEFT JOIN departments dept ON dept.id = peer.department_id
+        WHERE cm.user_id = CAST(:user_id AS uuid) {type_filter}
+        ORDER BY c.last_message_at DESC
+    """), {'user_id': str(user_id), 'conv_type': conv_type})
+    
+    result = []
+    for row in rows:
+        conv_data = {
+            'id': str(row.id),
+            'type': row.type,
+            'name': row.name,
+            'description': row.description,
+            'isAutoCreated': row.is_auto_created,
+            'autoType': row.auto_type,
+            'avatar': row.avatar,
+            'isMuted': row.member_muted,
+            'isPinned': row.member_pinned,
+            'createdBy': str(row.created_by) if row.created_by else None,
+            'institutionId': str(row.institution_id),
+            'lastMessage': row.last_message,
+            'lastMessageAt': row.last_message_at.isoformat() if row.last_message_at else None,
+            'unread': row.unread or 0,
+            'memberCount': row.member_count,
+            'createdAt': row.created_at.isoformat() if row.created_at else None
+        }
+        
+        if row.type == 'direct':
+            if row.peer_id:
+                conv_data['userId'] = str(row.peer_id)  # Important for WebSocket online status
+                conv_data['name'] = f"{row.peer_first_name} {row.peer_last_name}"
+                conv_data['role'] = row.peer_role
+                conv_data['email'] = row.peer_email
+                conv_data['phone'] = row.peer_phone
+                conv_data['avatar'] = row.peer_first_name[0].upper()
+                conv_data['online'] = row.peer_online if row.peer_online is not None else False
+                conv_data['lastSeen'] = row.peer_last_seen.isoformat() if row.peer_last_seen else None
+                if row.peer_department_id:
+                    conv_data['department'] = row.peer_department
+        else:
+            conv_data['members'] = row.member_count
+        
+        result.append(conv_data)
+    return result
+
+
 class ConversationMember(db.Model):
     """Represents a member of a conversation"""
     __tablename__ = 'conversation_members'
+    # Don't read server-side values back after INSERT (unread_count may not exist yet)
+    __mapper_args__ = {'eager_defaults': False}
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     conversation_id = db.Column(UUID(as_uuid=True), db.ForeignKey('conversations.id'), nullable=False)
@@ -109,6 +216,13 @@ class ConversationMember(db.Model):
     # Read status
     last_read_at = db.Column(db.DateTime)
     
+    # Messages from others since last_read_at, maintained on send/read when
+    # USE_UNREAD_COUNTERS is enabled (see database/add_unread_counters.sql).
+    # Deferred so it is never selected unless explicitly requested. Left out of
+    # INSERTs and (with eager_defaults off) never read back, so members can be
+    # added before the migration; server_default still serves db.create_all().
+    unread_count = db.deferred(db.Column(db.Integer, nullable=False, server_default='0'))
+    
     # Timestamps
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -135,6 +249,73 @@ class ConversationMember(db.Model):
         }
 
 
+def unread_counters_enabled():
+    """Whether the denormalized conversation_members.unread_count column is in use"""
+    return bool(current_app.config.get('USE_UNREAD_COUNTERS'))
+
+
+def increment_unread(conversation_id, sender_id):
+    """Bump every other member's unread counter after a message is sent"""
+    if not unread_counters_enabled():
+        return
+    ConversationMember.query.filter(
+        ConversationMember.conversation_id == conversation_id,
+        ConversationMember.user_id != sender_id
+    ).update(
+        {ConversationMember.unread_count: ConversationMember.unread_count + 1},
+        synchronize_session=False
+    )
+
+
+def mark_conversation_read(member):
+    """Record that a member has read everything in the conversation"""
+    member.last_read_at = datetime.utcnow()
+    if unread_counters_enabled():
+        member.unread_count = 0
+
+
+def total_unread_for_user(user_id):
+    """Unread messages across all of a user's conversations, in one query"""
+    if unread_counters_enabled():
+        total = db.session.query(
+            db.func.coalesce(db.func.sum(ConversationMember.unread_count), 0)
+        ).filter(ConversationMember.user_id == user_id).scalar()
+        return int(total)
+    
+    return db.session.execute(db.text(f"""
+        SELECT count(m.id)
+        FROM conversation_members cm
+        JOIN messages m ON m.conversation_id = cm.conversation_id
+        WHERE cm.user_id = CAST(:user_id AS uuid) AND {UNREAD_MESSAGE_SQL}
+    """), {'user_id': str(user_id)}).scalar()
+
+
+def reconcile_unread_counters(institution_id=None):
+    """
+    Recompute unread_count from messages and fix rows that drifted (deleted
+    messages, auto-generated messages, concurrent read/send races).
+    
+    Returns the number of member rows corrected.
+    """
+    institution_filter = "AND c.institution_id = CAST(:institution_id AS uuid)" if institution_id else ""
+    result = db.session.execute(db.text(f"""
+        UPDATE conversation_members target
+        SET unread_count = actual.count
+        FROM (
+            SELECT cm.id, count(m.id) AS count
+            FROM conversation_members cm
+            JOIN conversations c ON c.id = cm.conversation_id
+            LEFT JOIN messages m
+              ON m.conversation_id = cm.conversation_id AND {UNREAD_MESSAGE_SQL}
+            WHERE true {institution_filter}
+            GROUP BY cm.id
+        ) actual
+        WHERE target.id = actual.id
+          AND target.unread_count IS DISTINCT FROM actual.count
+    """), {'institution_id': str(institution_id) if institution_id else None})
+    return result.rowcount
+
+
 class Message(db.Model):
     """Represents a chat message"""
     __tablename__ = 'messages'
@@ -331,3 +512,133 @@ class SavedPost(db.Model):
             'userId': str(self.user_id),
             'createdAt': self.created_at.isoformat() if self.created_at else None
         }
+
+
+def circulars_feed_page(user_id, institution_id, limit, before=None, circular_id=None):
+    """
+    One page of the circulars feed across every circular in an institution,
+    newest first, continuing strictly after `before` = (created_at, id).
+    
+    Each circular contributes at most limit + 1 candidates through an index
+    walk on messages (conversation_id, created_at, id), so the cost depends on
+    the page size and number of circulars rather than on feed history. Like
+    and comment counts and the user's liked/saved flags are computed by
+    grouped subqueries over the page only.
+    
+    Returns (rows, has_more).
+    """
+    cursor_filter = "AND (m.created_at, m.id) < (:before_at, CAST(:before_id AS uuid))" if before else ""
+    circular_filter = "AND c.id = CAST(:circular_id AS uuid)" if circular_id else ""
+    rows = db.session.execute(db.text(f"""
+        WITH page AS (
+            SELECT m.id, m.conversation_id, c.name AS circular_name, m.content,
+                   m.created_at, m.edited_at, m.sender_id,
+                   m.document_id, m.document_name, m.document_hash
+            FROM conversations c
+            CROSS JOIN LATERAL (
+                SELECT m.* FROM messages m
+                WHERE m.conversation_id = c.id
+                  AND m.is_deleted = false
+                  {cursor_filter}
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT :fetch
+            ) m
+            WHERE c.type = 'circular'
+              AND c.institution_id = CAST(:institution_id AS uuid)
+              {circular_filter}
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT :fetch
+        ),
+        likes AS (
+            SELECT l.message_id, count(*) AS count,
+                   bool_or(l.user_id = CAST(:user_id AS uuid)) AS user_liked
+            FROM message_likes l
+            WHERE l.message_id IN (SELECT id FROM page)
+            GROUP BY l.message_id
+        ),
+        comments AS (
+            SELECT mc.message_id, count(*) AS count
+            FROM message_comments mc
+            WHERE mc.message_id IN (SELECT id FROM page)
+              AND mc.is_deleted = false
+            GROUP BY mc.message_id
+        ),
+        saved AS (
+            SELECT s.message_id
+            FROM saved_posts s
+            WHERE s.message_id IN (SELECT id FROM page)
+              AND s.user_id = CAST(:user_id AS uuid)
+        )
+        SELECT page.*,
+               u.id AS sender_user_id, u.first_name AS sender_first_name, u.last_name AS sender_last_name,
+               u.role AS sender_role,
+               COALESCE(likes.count, 0) AS likes_count,
+               COALESCE(likes.user_liked, false) AS user_liked,
+               COALESCE(comments.count, 0) AS comments_count,
+               saved.message_id IS NOT NULL AS user_saved
+        FROM page
+        LEFT JOIN users u ON u.id = page.sender_id
+        LEFT JOIN likes ON likes.message_id = page.id
+        LEFT JOIN comments ON comments.message_id = page.id
+        LEFT JOIN saved ON saved.message_id = page.id
+        ORDER BY page.created_at DESC, page.id DESC
+    """), {
+        'user_id': str(user_id),
+        'institution_id': str(institution_id),
+        'circular_id': str(circular_id) if circular_id else None,
+        'before_at': before[0] if before else None,
+        'before_id': str(before[1]) if before else None,
+        'fetch': limit + 1
+    }).all()
+    
+    # One extra row was fetched to know whether another page exists
+    return rows[:limit], len(rows) > limit
+
+
+def circulars_with_post_counts(institution_id):
+    """Circulars of an institution with their live post counts, newest first"""
+    return db.session.execute(db.text("""
+        SELECT c.id, c.name, c.created_by, count(m.id) AS post_count
+        FROM conversations c
+        LEFT JOIN messages m ON m.conversation_id = c.id AND m.is_deleted = false
+        WHERE c.type = 'circular'
+          AND c.institution_id = CAST(:institution_id AS uuid)
+        GROUP BY c.id
+        ORDER BY c.created_at DESC
+    """), {'institution_id': str(institution_id)}).all()
+
+
+def bulk_upsert_online_status(changes):
+    """Write a batch of (user_id, is_online, last_seen) with one INSERT ... ON CONFLICT"""
+    from sqlalchemy.dialects.postgresql import insert
+    if not changes:
+        return
+    stmt = insert(UserOnlineStatus).values([
+        {'user_id': uuid.UUID(str(user_id)), 'is_online': is_online, 'last_seen': last_seen}
+        for user_id, is_online, last_seen in changes
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[UserOnlineStatus.user_id],
+        set_={'is_online': stmt.excluded.is_online, 'last_seen': stmt.excluded.last_seen}
+    ))
+
+
+def presence_peers(user_ids):
+    """
+    Map each user to the distinct set of users sharing at least one
+    conversation with them, in one query: {user_id: {peer_id, ...}}.
+    """
+    if not user_ids:
+        return {}
+    rows = db.session.execute(db.text("""
+        SELECT DISTINCT cm.user_id AS subject_id, peer.user_id AS peer_id
+        FROM conversation_members cm
+        JOIN conversation_members peer
+          ON peer.conversation_id = cm.conversation_id
+         AND peer.user_id <> cm.user_id
+        WHERE cm.user_id = ANY(CAST(:user_ids AS uuid[]))
+    """), {'user_ids': [str(u) for u in user_ids]})
+    peers = {}
+    for row in rows:
+        peers.setdefault(str(row.subject_id), set()).add(str(row.peer_id))
+    return peers
@@ -1,10 +1,24 @@
 from app import db
+from flask import current_app
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import undefer
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 import uuid
 
+# Full-text search document, generated by PostgreSQL on every insert/update.
+# Punctuation is folded to spaces so "annual_report-2024.pdf" yields the words
+# annual, report, 2024, pdf. Name matches rank above file name and type matches.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', regexp_replace(coalesce(name, ''), '[^[:alnum:]]+', ' ', 'g')), 'A') || "
+    "setweight(to_tsvector('simple', regexp_replace(coalesce(file_name, ''), '[^[:alnum:]]+', ' ', 'g')), 'B') || "
+    "setweight(to_tsvector('simple', regexp_replace(coalesce(document_type, ''), '[^[:alnum:]]+', ' ', 'g')), 'C')"
+)
+
 class Document(db.Model):
     __tablename__ = 'documents'
+    # Don't read server-side values back after INSERT (share_count and
+    # search_vector may not exist yet)
+    __mapper_args__ = {'eager_defaults': False}
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = db.Column(db.String(66), nullable=True)  # Blockchain document ID (nullable until blockchain upload completes)
@@ -38,11 +52,25 @@ class Document(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Denormalized number of shares, maintained by routes/shares.py when
+    # USE_DOCUMENT_SHARE_COUNT is enabled (see database/add_document_share_count.sql).
+    # Deferred so it is never selected unless explicitly requested. Left out of
+    # INSERTs and (with eager_defaults off) never read back, so documents can be
+    # created before the migration; server_default still serves db.create_all().
+    share_count = db.deferred(db.Column(db.Integer, nullable=False, server_default='0'))
+    
+    # Maintained by the database (see SEARCH_VECTOR_SQL and database/add_document_search.sql),
+    # read only by the ranked search (USE_DOCUMENT_SEARCH); never written or read back on INSERT
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR_SQL, persisted=True)))
+    
     # Relationships
     shares = db.relationship('DocumentShare', back_populates='document', lazy='dynamic')
     versions = db.relationship('DocumentVersion', back_populates='document', lazy='dynamic')
     
-    def to_dict(self):
+    def to_dict(self, is_shared=None):
+        from app.services.ipfs_client import ipfs_url
+        if is_shared is None:
+            is_shared = self.shares.count() > 0  # Check if document has any shares
         return {
             'id': str(self.id),
             'documentId': self.document_id,
@@ -58,13 +86,61 @@ class Document(db.Model):
             'isActive': self.is_active,
             'isInTrash': self.is_in_trash,
             'isStarred': self.is_starred,
-            'isShared': self.shares.count() > 0,  # Check if document has any shares
+            'isShared': is_shared,
             'timestamp': self.timestamp,
             'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'ipfsUrl': f"https://gateway.pinata.cloud/ipfs/{self.ipfs_hash}"
+            'ipfsUrl': ipfs_url(self.ipfs_hash)
         }
 
 
+def share_count_enabled():
+    """Whether the denormalized documents.share_count column is in use"""
+    return bool(current_app.config.get('USE_DOCUMENT_SHARE_COUNT'))
+
+
+def with_share_count(query):
+    """Load share_count with a document list query when the column is in use"""
+    if share_count_enabled():
+        return query.options(undefer(Document.share_count))
+    return query
+
+
+def adjust_share_count(document_id, delta):
+    """Keep documents.share_count in sync after shares are added or removed"""
+    if not share_count_enabled() or not delta:
+        return
+    Document.query.filter(Document.id == document_id).update(
+        {Document.share_count: Document.share_count + delta},
+        synchronize_session=False
+    )
+
+
+def serialize_documents(documents):
+    """
+    Serialize a page of documents exactly like Document.to_dict(), resolving
+    isShared for the whole page with one grouped query instead of one
+    shares.count() per document.
+    """
+    documents = list(documents)
+    # Rows loaded through with_share_count() already carry the answer
+    pending_ids = [doc.id for doc in documents if 'share_count' not in doc.__dict__]
+    shared_ids = set()
+    if pending_ids:
+        rows = db.session.query(DocumentShare.document_id).filter(
+            DocumentShare.document_id.in_(pending_ids)
+        ).group_by(DocumentShare.document_id).all()
+        shared_ids = {row[0] for row in rows}
+    
+    results = []
+    for doc in documents:
+        if 'share_count' in doc.__dict__:
+            is_shared = (doc.share_count or 0) > 0
+        else:
+            is_shared = doc.id in shared_ids
+        results.append(doc.to_dict(is_shared=is_shared))
+    return results
+
+
 class DocumentShare(db.Model):
     __tablename__ = 'document_shares'
     
@@ -117,6 +193,7 @@ class DocumentVersion(db.Model):
     document = db.relationship('Document', back_populates='versions')
     
     def to_dict(self):
+        from app.services.ipfs_client import ipfs_url
         return {
             'id': str(self.id),
             'documentId': str(self.document_id),
@@ -127,5 +204,5 @@ class DocumentVersion(db.Model):
             'transactionId': self.transaction_id,
             'description': self.changes_description,
             'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'ipfsUrl': f"https://gateway.pinata.cloud/ipfs/{self.ipfs_hash}"
+            'ipfsUrl': ipfs_url(self.ipfs_hash)
         }
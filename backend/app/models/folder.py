@@ -1,10 +1,14 @@
 from app import db
+from flask import current_app
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import event, text
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 import uuid
 
 class Folder(db.Model):
     __tablename__ = 'folders'
+    # Don't read server-side values back after INSERT (ancestor_ids may not exist yet)
+    __mapper_args__ = {'eager_defaults': False}
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = db.Column(db.String(255), nullable=False)
@@ -14,6 +18,12 @@ class Folder(db.Model):
     parent_id = db.Column(UUID(as_uuid=True), db.ForeignKey('folders.id'), nullable=True)
     path = db.Column(db.String(1000), nullable=False)  # Full path like /folder1/subfolder
     level = db.Column(db.Integer, default=0)
+    # Materialized ancestry: folder ids from the root down to this folder (inclusive).
+    # Set on insert, re-materialized for whole subtrees by update_children_paths(),
+    # only while USE_FOLDER_ANCESTRY is enabled (see database/add_folder_ancestor_ids.sql).
+    # FetchedValue keeps it out of INSERTs that don't set it, so folders can be
+    # created before the column exists.
+    ancestor_ids = db.deferred(db.Column(ARRAY(UUID(as_uuid=True)), server_default=db.FetchedValue()))
     
     # Owner information
     owner_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
@@ -172,13 +182,132 @@ class Folder(db.Model):
             parent = Folder.query.get(self.parent_id)
             return f"{parent.get_full_path()}/{self.name}"
     
+    def get_ancestor_ids(self):
+        """Folder ids from the root down to this folder (inclusive)"""
+        if ancestry_enabled():
+            return list(self.ancestor_ids or [])
+        chain = []
+        folder = self
+        while folder is not None:
+            chain.insert(0, folder.id)
+            folder = Folder.query.get(folder.parent_id) if folder.parent_id else None
+        return chain
+    
     def update_children_paths(self):
-        """Update paths of all children when this folder's path changes"""
-        new_path = self.get_full_path()
-        self.path = new_path
+        """
+        Re-materialize path, level and ancestor_ids for this folder and every
+        descendant after a rename or move. Call after changing name/parent_id;
+        the subtree is rewritten with one set-based UPDATE.
+        """
+        if not ancestry_enabled():
+            return self._update_subtree_paths()
+        
+        with db.session.no_autoflush:
+            old = db.session.query(Folder.path, Folder.ancestor_ids).filter(Folder.id == self.id).first()
+            parent = Folder.query.filter_by(id=self.parent_id).first() if self.parent_id else None
+            parent_chain = db.session.query(Folder.ancestor_ids).filter(
+                Folder.id == self.parent_id
+            ).scalar() if self.parent_id else []
+        
+        old_depth = len(old.ancestor_ids) if old and old.ancestor_ids else (self.level or 0) + 1
+        self.path = f"{parent.path}/{self.name}" if parent else f"/{self.name}"
+        self.level = (parent.level or 0) + 1 if parent else 0
+        self.ancestor_ids = list(parent_chain or []) + [self.id]
+        
+        if old is None:
+            return
         
+        # Relies on descendant paths starting with this folder's old path, which
+        # the backfill in add_folder_ancestor_ids.sql guarantees
+        db.session.execute(text("""
+            UPDATE folders SET
+                path = :new_path || substring(path from :old_path_length + 1),
+                level = level + :depth_delta,
+                ancestor_ids = CAST(:new_chain AS uuid[])
+                    || ancestor_ids[array_position(ancestor_ids, CAST(:folder_id AS uuid)) + 1:]
+            WHERE ancestor_ids @> ARRAY[CAST(:folder_id AS uuid)]
+              AND id <> CAST(:folder_id AS uuid)
+        """), {
+            'new_path': self.path,
+            'old_path_length': len(old.path),
+            'depth_delta': len(self.ancestor_ids) - old_depth,
+            'new_chain': [str(folder_id) for folder_id in self.ancestor_ids],
+            'folder_id': str(self.id)
+        })
+    
+    def _update_subtree_paths(self, parent=None):
+        """Recompute path and level from the parent, folder by folder (no ancestor_ids column)"""
+        if parent is None and self.parent_id:
+            parent = Folder.query.get(self.parent_id)
+        self.path = f"{parent.path}/{self.name}" if parent else f"/{self.name}"
+        self.level = (parent.level or 0) + 1 if parent else 0
         for child in self.children:
-            child.update_children_paths()
+            child._update_subtree_paths(self)
+    
+    @staticmethod
+    def breadcrumbs_for(folder_ids):
+        """
+        Resolve root-to-folder breadcrumbs for many folders with one query.
+        Returns {folder_id (str): [{'id': ..., 'name': ...}, ...]}.
+        """
+        folder_ids = [str(folder_id) for folder_id in set(folder_ids) if folder_id]
+        if not folder_ids:
+            return {}
+        
+        if ancestry_enabled():
+            sql = """
+                SELECT f.id AS folder_id, a.id AS ancestor_id, a.name
+                FROM folders f
+                CROSS JOIN LATERAL unnest(f.ancestor_ids) WITH ORDINALITY AS chain(ancestor_id, position)
+                JOIN folders a ON a.id = chain.ancestor_id
+                WHERE f.id = ANY(CAST(:folder_ids AS uuid[]))
+                ORDER BY f.id, chain.position
+            """
+        else:
+            # Same result by walking parent_id inside the database
+            sql = """
+                WITH RECURSIVE chain AS (
+                    SELECT id AS folder_id, id AS ancestor_id, name, parent_id, 0 AS depth
+                    FROM folders
+                    WHERE id = ANY(CAST(:folder_ids AS uuid[]))
+                    UNION ALL
+                    SELECT c.folder_id, p.id, p.name, p.parent_id, c.depth + 1
+                    FROM chain c
+                    JOIN folders p ON p.id = c.parent_id
+                )
+                SELECT folder_id, ancestor_id, name
+                FROM chain
+                ORDER BY folder_id, depth DESC
+            """
+        rows = db.session.execute(text(sql), {'folder_ids': folder_ids})
+        
+        breadcrumbs = {}
+        for folder_id, ancestor_id, name in rows:
+            breadcrumbs.setdefault(str(folder_id), []).append({
+                'id': str(ancestor_id),
+                'name': name
+            })
+        return breadcrumbs
+
+
+def ancestry_enabled():
+    """Whether the materialized folders.ancestor_ids column is in use"""
+    return bool(current_app.config.get('USE_FOLDER_ANCESTRY'))
+
+
+@event.listens_for(Folder, 'before_insert')
+def set_ancestor_ids(mapper, connection, target):
+    """Materialize ancestry for new folders from the parent's chain"""
+    if not ancestry_enabled():
+        return  # Leaves ancestor_ids out of the INSERT
+    if target.id is None:
+        target.id = uuid.uuid4()
+    parent_chain = []
+    if target.parent_id:
+        parent_chain = connection.execute(
+            db.select(Folder.ancestor_ids).where(Folder.id == target.parent_id)
+        ).scalar() or []
+    target.ancestor_ids = list(parent_chain) + [target.id]
 
 
 class FolderShare(db.Model):
@@ -0,0 +1,55 @@
+"""
+Stamp Job Model - Durable queue of PDF stamping work
+Created in the same transaction as the final approval; claimed by stamp
+workers with FOR UPDATE SKIP LOCKED (see app/services/stamp_queue.py)
+"""
+from app import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+import uuid
+
+
+class StampJob(db.Model):
+    __tablename__ = 'stamp_jobs'
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    approval_request_id = db.Column(UUID(as_uuid=True), db.ForeignKey('approval_requests.id', ondelete='CASCADE'), nullable=False, index=True)
+    requested_by = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+
+    # queued -> running -> succeeded | failed (running jobs whose lease expires are queued again)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Worker lease
+    locked_by = db.Column(db.String(255))
+    locked_at = db.Column(db.DateTime)
+
+    # What to stamp: source IPFS hash, approval type and the approval details drawn on the stamp
+    payload = db.Column(JSONB, nullable=False)
+
+    # Outcome
+    result_ipfs_hash = db.Column(db.String(255))
+    last_error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'approvalRequestId': str(self.approval_request_id),
+            'status': self.status,
+            'attempts': self.attempts,
+            'maxAttempts': self.max_attempts,
+            'nextAttemptAt': (self.run_after.isoformat() + 'Z') if self.status == 'queued' and self.run_after else None,
+            'stampedDocumentIpfsHash': self.result_ipfs_hash,
+            'error': self.last_error,
+            'createdAt': (self.created_at.isoformat() + 'Z') if self.created_at else None,
+            'completedAt': (self.completed_at.isoformat() + 'Z') if self.completed_at else None
+        }
+
+    def __repr__(self):
+        return f'<StampJob {self.id} {self.status}>'
@@ -1,25 +1,333 @@
 """
 Performance optimizations for high concurrency (50+ users)
-- Response caching
+- Response caching (pluggable backends shared across gunicorn workers)
 - Query optimization
 - Compression
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, make_response, Response, g
 from functools import wraps
 from flask_compress import Compress
+from collections import OrderedDict
+from datetime import datetime
+import base64
 import hashlib
 import json
-from datetime import datetime, timedelta
+import os
+import threading
+import time
+import uuid
 
-# Simple in-memory cache (use Redis in production for multi-server)
-cache_store = {}
-cache_timestamps = {}
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
-def cache_response(timeout=300):
+
+CACHE_KEY_PREFIX = 'docuchain:cache:'
+# Kept outside CACHE_KEY_PREFIX so a full invalidation doesn't reset the counters
+STATS_KEY_PREFIX = 'docuchain:cache-stats:'
+INVALIDATION_CHANNEL = 'docuchain:cache:invalidate'
+
+_redis_clients = {}
+
+
+def get_redis_client(url=None):
+    """
+    Return a shared redis client for url (default REDIS_URL), or None if Redis
+    is not configured/installed. Clients are pooled per URL and reused by every
+    subsystem in the worker.
+    """
+    url = url or os.getenv('REDIS_URL')
+    if not url or not REDIS_AVAILABLE:
+        return None
+    client = _redis_clients.get(url)
+    if client is None:
+        client = redis.Redis.from_url(url)
+        _redis_clients[url] = client
+    return client
+
+
+class CacheBackend:
+    """Interface for response cache storage"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, timeout, tags=()):
+        raise NotImplementedError
+
+    def delete_matching(self, pattern=None):
+        """Delete keys containing pattern (all keys when pattern is None)"""
+        raise NotImplementedError
+
+    def delete_tags(self, tags):
+        """Delete every key stored under any of the given tags"""
+        raise NotImplementedError
+
+    def record(self, hit):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+    """In-process LRU cache bounded by max_entries, with per-entry expiry and tags"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _remove(self, key):
+        # Caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def set(self, key, value, timeout, tags=()):
+        with self._lock:
+            self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (time.monotonic() + timeout, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete_matching(self, pattern=None):
+        with self._lock:
+            if pattern is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+                return removed
+            keys = [k for k in self._entries if pattern in k]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def delete_tags(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        return {
+            'backend': 'local',
+            'entries': len(self._entries),
+            'tags': len(self._tags),
+            'maxEntries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache shared by every worker through a Redis-protocol server.
+    Accepts any redis-py compatible client (e.g. fakeredis for local tests).
+
+    A short-lived local LRU sits in front of Redis so hot keys skip the network;
+    invalidations are published on INVALIDATION_CHANNEL so every worker drops
+    its local copy at the same time Redis is cleared.
+    """
+
+    def __init__(self, client, near_cache_entries=256, near_cache_timeout=5):
+        self.client = client
+        self.near_cache = LocalCacheBackend(max_entries=near_cache_entries)
+        self.near_cache_timeout = near_cache_timeout
+        self._listener = None
+        self._start_listener()
+
+    def _start_listener(self):
+        try:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidate})
+            self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception:
+            # Without the channel, near-cache entries simply expire on their own
+            self._listener = None
+
+    def _on_invalidate(self, message):
+        try:
+            payload = json.loads(message.get('data'))
+        except (TypeError, ValueError):
+            payload = {}
+        if payload.get('tags'):
+            self.near_cache.delete_tags(payload['tags'])
+        else:
+            self.near_cache.delete_matching(payload.get('pattern'))
+
+    def _tag_key(self, tag):
+        return f"{CACHE_KEY_PREFIX}tag:{tag}"
+
+    def get(self, key):
+        value = self.near_cache.get(key)
+        if value is not None:
+            return value
+        raw = self.client.get(CACHE_KEY_PREFIX + key)
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        self.near_cache.set(key, value, self.near_cache_timeout, value.get('tags', ()))
+        return value
+
+    def set(self, key, value, timeout, tags=()):
+        tags = list(tags)
+        value = dict(value, tags=tags)  # Lets other workers tag their near-cache copy
+        pipe = self.client.pipeline()
+        pipe.set(CACHE_KEY_PREFIX + key, json.dumps(value), ex=int(timeout))
+        for tag in tags:
+            # Tag sets outlive their newest member, then expire with it
+            pipe.sadd(self._tag_key(tag), key)
+            pipe.expire(self._tag_key(tag), int(timeout))
+        pipe.execute()
+        self.near_cache.set(key, value, min(timeout, self.near_cache_timeout), tags)
+
+    def delete_matching(self, pattern=None):
+        match = f"{CACHE_KEY_PREFIX}*{pattern}*" if pattern else f"{CACHE_KEY_PREFIX}*"
+        keys = list(self.client.scan_iter(match=match, count=500))
+        if keys:
+            self.client.delete(*keys)
+        self.near_cache.delete_matching(pattern)
+        self.client.publish(INVALIDATION_CHANNEL, json.dumps({'pattern': pattern}))
+        return len(keys)
+
+    def delete_tags(self, tags):
+        tags = list(tags)
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.smembers(self._tag_key(tag))
+        keys = set()
+        for members in pipe.execute():
+            keys.update(m.decode('utf-8') if isinstance(m, bytes) else m for m in members)
+        to_delete = [CACHE_KEY_PREFIX + k for k in keys] + [self._tag_key(t) for t in tags]
+        if to_delete:
+            self.client.delete(*to_delete)
+        self.near_cache.delete_tags(tags)
+        self.client.publish(INVALIDATION_CHANNEL, json.dumps({'tags': tags}))
+        return len(keys)
+
+    def record(self, hit):
+        # Counters live in Redis so the hit rate covers the whole fleet
+        try:
+            self.client.incr(f"{STATS_KEY_PREFIX}{'hits' if hit else 'misses'}")
+        except Exception:
+            pass
+
+    def stats(self):
+        hits = int(self.client.get(f"{STATS_KEY_PREFIX}hits") or 0)
+        misses = int(self.client.get(f"{STATS_KEY_PREFIX}misses") or 0)
+        return {
+            'backend': 'redis',
+            'hits': hits,
+            'misses': misses,
+            'nearCache': self.near_cache.stats()
+        }
+
+
+_cache_backend = None
+
+
+def init_cache(app):
+    """Select the response cache backend from app config (CACHE_TYPE)"""
+    global _cache_backend
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    if not event.contains(Session, 'after_commit', _flush_session_tags):
+        event.listen(Session, 'after_commit', _flush_session_tags)
+        event.listen(Session, 'after_rollback', _discard_session_tags)
+
+    cache_type = app.config.get('CACHE_TYPE', 'simple')
+    client = None
+    if cache_type == 'redis':
+        client = get_redis_client(app.config.get('CACHE_REDIS_URL'))
+    if client is not None:
+        _cache_backend = RedisCacheBackend(client)
+    else:
+        _cache_backend = LocalCacheBackend(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1000))
+    return _cache_backend
+
+
+def get_cache_backend():
+    """Return the active cache backend (local LRU until init_cache runs)"""
+    global _cache_backend
+    if _cache_backend is None:
+        _cache_backend = LocalCacheBackend()
+    return _cache_backend
+
+
+def _serialize_response(response):
+    return {
+        'body': response.get_data(as_text=True),
+        'status': response.status_code,
+        'mimetype': response.mimetype
+    }
+
+
+def _build_response(entry):
+    response = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def add_cache_tags(*tags):
+    """
+    Attach extra invalidation tags to the response being cached, from inside
+    a @cache_response view (e.g. document:<id> for documents owned by others).
+    """
+    g.setdefault('_cache_tags', set()).update(t for t in tags if _is_valid_tag(t))
+
+
+def _is_valid_tag(tag):
+    return bool(tag) and not tag.endswith(':None')
+
+
+def cache_response(timeout=300, tags=None):
     """
     Cache decorator for API responses
     timeout: cache duration in seconds (default 5 minutes)
+    tags: optional callable(*args, **kwargs) returning entity tags such as
+          'folder:<id>'; every entry is also tagged 'user:<id>' of the caller
+    Only successful (200) responses are cached.
     """
     def decorator(f):
         @wraps(f)
@@ -30,56 +338,100 @@ def cache_response(timeout=300):
                 user_id = get_jwt_identity()
             except:
                 user_id = 'anonymous'
-            
-            cache_key = f"{f.__name__}:{user_id}:{request.full_path}"
-            cache_key_hash = hashlib.md5(cache_key.encode()).hexdigest()
-            
-            # Check if cached and not expired
-            if cache_key_hash in cache_store:
-                timestamp = cache_timestamps.get(cache_key_hash)
-                if timestamp and datetime.now() < timestamp:
-                    return cache_store[cache_key_hash]
-            
+
+            path_hash = hashlib.md5(request.full_path.encode()).hexdigest()
+            cache_key = f"{f.__name__}:{user_id}:{path_hash}"
+            backend = get_cache_backend()
+
+            try:
+                entry = backend.get(cache_key)
+            except Exception:
+                entry = None  # Cache outage must never break the endpoint
+            backend.record(entry is not None)
+            if entry is not None:
+                return _build_response(entry)
+
             # Call function and cache result
-            result = f(*args, **kwargs)
-            cache_store[cache_key_hash] = result
-            cache_timestamps[cache_key_hash] = datetime.now() + timedelta(seconds=timeout)
-            
-            # Clean old cache entries (simple cleanup)
-            if len(cache_store) > 1000:
-                cleanup_cache()
-            
-            return result
+            g._cache_tags = {f"user:{user_id}"}
+            if tags is not None:
+                add_cache_tags(*tags(*args, **kwargs))
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                try:
+                    backend.set(cache_key, _serialize_response(response), timeout, g._cache_tags)
+                except Exception:
+                    pass
+
+            return response
         return decorated_function
     return decorator
 
 
 def cleanup_cache():
-    """Remove expired cache entries"""
-    now = datetime.now()
-    expired_keys = [k for k, v in cache_timestamps.items() if v < now]
-    for key in expired_keys:
-        cache_store.pop(key, None)
-        cache_timestamps.pop(key, None)
+    """Remove expired cache entries (backends expire lazily; kept for compatibility)"""
+    backend = get_cache_backend()
+    if isinstance(backend, LocalCacheBackend):
+        now = time.monotonic()
+        with backend._lock:
+            expired_keys = [k for k, (expires_at, _, _) in backend._entries.items() if expires_at < now]
+            for key in expired_keys:
+                backend._remove(key)
 
 
 def invalidate_cache(pattern=None):
-    """Invalidate cache entries matching pattern"""
-    if pattern:
-        keys_to_remove = [k for k in cache_store.keys() if pattern in k]
-        for key in keys_to_remove:
-            cache_store.pop(key, None)
-            cache_timestamps.pop(key, None)
-    else:
-        cache_store.clear()
-        cache_timestamps.clear()
+    """Invalidate cache entries matching pattern, in every worker"""
+    try:
+        return get_cache_backend().delete_matching(pattern)
+    except Exception:
+        return 0
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidate every cached response tagged with any of tags, in every worker.
+    Call after the write has been committed.
+    """
+    tags = [t for t in tags if _is_valid_tag(t)]
+    if not tags:
+        return 0
+    try:
+        return get_cache_backend().delete_tags(tags)
+    except Exception:
+        return 0
+
+
+def invalidate_tags_after_commit(*tags):
+    """
+    Queue tag invalidation until the current db session commits, for helpers
+    that add/delete rows but leave the commit to their caller.
+    """
+    from app import db
+    db.session().info.setdefault('cache_tags', set()).update(t for t in tags if _is_valid_tag(t))
+
+
+def _flush_session_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(*tags)
+
+
+def _discard_session_tags(session):
+    session.info.pop('cache_tags', None)
+
+
+def cache_stats():
+    """Return hit/miss statistics for the active cache backend"""
+    try:
+        return get_cache_backend().stats()
+    except Exception as e:
+        return {'error': str(e)}
 
 
 def setup_compression(app):
     """Setup gzip compression for responses"""
     compress = Compress()
     compress.init_app(app)
-    
+
     # Compress responses larger than 500 bytes
     app.config['COMPRESS_MIMETYPES'] = [
         'text/html',
@@ -91,7 +443,7 @@ def setup_compression(app):
     ]
     app.config['COMPRESS_LEVEL'] = 6  # Balanced compression
     app.config['COMPRESS_MIN_SIZE'] = 500  # Only compress responses > 500 bytes
-    
+
     return compress
 
 
@@ -104,3 +456,19 @@ def optimize_query_joins(query, relationships):
     for rel in relationships:
         query = query.options(joinedload(rel))
     return query
+
+
+def encode_keyset_cursor(created_at, row_id):
+    """Opaque keyset cursor for a (created_at, id) position in a newest-first listing"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_keyset_cursor(cursor):
+    """Return (created_at, id) from a cursor, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
@@ -0,0 +1,346 @@
+"""
+WebSocket presence registry
+- Tracks which socket ids (sids) belong to which user, with a sid -> user
+  reverse index so disconnects are O(1)
+- Pluggable stores: in-process for a single worker, Redis (or any
+  redis-py compatible client, e.g. fakeredis in tests) shared by all
+  gunicorn workers
+- Debounced, batched online/offline transitions (PresenceAggregator)
+- Socket.IO emits reach other workers through SOCKETIO_MESSAGE_QUEUE
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from app.performance import get_redis_client
+
+
+PRESENCE_KEY_PREFIX = 'docuchain:presence:'
+HEARTBEAT_INTERVAL = 15  # seconds between worker heartbeats
+HEARTBEAT_TTL = 45       # a worker missing this long is considered dead
+OFFLINE_GRACE = 5        # seconds a disconnected user has to reconnect before going offline
+FLUSH_INTERVAL = 2       # seconds between batched status writes/broadcasts
+
+
+class PresenceStore:
+    """Interface for the connection registry"""
+
+    def add_connection(self, user_id, sid):
+        """Register sid for user_id. Returns True if this is the user's first connection."""
+        raise NotImplementedError
+
+    def remove_connection(self, sid):
+        """Forget sid. Returns (user_id, remaining connection count), or (None, 0) if unknown."""
+        raise NotImplementedError
+
+    def user_for_sid(self, sid):
+        raise NotImplementedError
+
+    def sids_for_user(self, user_id):
+        raise NotImplementedError
+
+    def online_users(self, user_ids):
+        """Subset of user_ids with at least one live connection"""
+        raise NotImplementedError
+
+    def is_online(self, user_id):
+        return bool(self.online_users([user_id]))
+
+    def stats(self):
+        return {}
+
+
+class LocalPresenceStore(PresenceStore):
+    """Registry for a single process (development, or one worker)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._user_by_sid = {}
+        self._sids_by_user = {}
+
+    def add_connection(self, user_id, sid):
+        user_id = str(user_id)
+        with self._lock:
+            self._user_by_sid[sid] = user_id
+            sids = self._sids_by_user.setdefault(user_id, set())
+            sids.add(sid)
+            return len(sids) == 1
+
+    def remove_connection(self, sid):
+        with self._lock:
+            user_id = self._user_by_sid.pop(sid, None)
+            if user_id is None:
+                return None, 0
+            sids = self._sids_by_user.get(user_id, set())
+            sids.discard(sid)
+            if not sids:
+                self._sids_by_user.pop(user_id, None)
+            return user_id, len(sids)
+
+    def user_for_sid(self, sid):
+        return self._user_by_sid.get(sid)
+
+    def sids_for_user(self, user_id):
+        return set(self._sids_by_user.get(str(user_id), ()))
+
+    def online_users(self, user_ids):
+        return {str(u) for u in user_ids if self._sids_by_user.get(str(u))}
+
+    def stats(self):
+        return {
+            'type': 'local',
+            'users': len(self._sids_by_user),
+            'connections': len(self._user_by_sid)
+        }
+
+
+class RedisPresenceStore(PresenceStore):
+    """
+    Registry shared by every worker.
+
+    Keys: a hash sid -> user_id, one set of sids per user, and one set of
+    sids per worker. Workers refresh a heartbeat key; sids owned by a worker
+    whose heartbeat expired (crash, OOM kill) are swept so users do not stay
+    online forever.
+    """
+
+    def __init__(self, client, prefix=PRESENCE_KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._worker_pid = None
+        self._worker_id = None
+
+    @property
+    def worker_id(self):
+        # Computed lazily per process: the app is preloaded before gunicorn forks
+        pid = os.getpid()
+        if self._worker_pid != pid:
+            self._worker_pid = pid
+            self._worker_id = f"{socket.gethostname()}:{pid}"
+        return self._worker_id
+
+    def _sids_key(self):
+        return f"{self.prefix}sids"
+
+    def _user_key(self, user_id):
+        return f"{self.prefix}user:{user_id}"
+
+    def _worker_key(self, worker_id):
+        return f"{self.prefix}worker:{worker_id}"
+
+    def _heartbeat_key(self, worker_id):
+        return f"{self.prefix}alive:{worker_id}"
+
+    def add_connection(self, user_id, sid):
+        user_id = str(user_id)
+        pipe = self.client.pipeline()
+        pipe.hset(self._sids_key(), sid, user_id)
+        pipe.sadd(self._user_key(user_id), sid)
+        pipe.sadd(self._worker_key(self.worker_id), sid)
+        pipe.scard(self._user_key(user_id))
+        count = pipe.execute()[-1]
+        return count == 1
+
+    def remove_connection(self, sid):
+        user_id = self.client.hget(self._sids_key(), sid)
+        if user_id is None:
+            return None, 0
+        user_id = _decode(user_id)
+        pipe = self.client.pipeline()
+        pipe.hdel(self._sids_key(), sid)
+        pipe.srem(self._user_key(user_id), sid)
+        pipe.srem(self._worker_key(self.worker_id), sid)
+        pipe.scard(self._user_key(user_id))
+        remaining = pipe.execute()[-1]
+        return user_id, remaining
+
+    def user_for_sid(self, sid):
+        user_id = self.client.hget(self._sids_key(), sid)
+        return _decode(user_id) if user_id is not None else None
+
+    def sids_for_user(self, user_id):
+        return {_decode(s) for s in self.client.smembers(self._user_key(user_id))}
+
+    def online_users(self, user_ids):
+        user_ids = [str(u) for u in user_ids]
+        if not user_ids:
+            return set()
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.scard(self._user_key(user_id))
+        return {u for u, count in zip(user_ids, pipe.execute()) if count}
+
+    def heartbeat(self):
+        """Mark this worker alive"""
+        worker_id = self.worker_id
+        self.client.set(self._heartbeat_key(worker_id), 1, ex=HEARTBEAT_TTL)
+        self.client.sadd(f"{self.prefix}workers", worker_id)
+
+    def sweep_dead_workers(self):
+        """
+        Drop connections owned by workers whose heartbeat expired.
+        Returns the user ids that lost their last connection.
+        """
+        went_offline = set()
+        for worker_id in self.client.smembers(f"{self.prefix}workers"):
+            worker_id = _decode(worker_id)
+            if self.client.exists(self._heartbeat_key(worker_id)):
+                continue
+            for sid in self.client.smembers(self._worker_key(worker_id)):
+                user_id, remaining = self.remove_connection(_decode(sid))
+                if user_id and not remaining:
+                    went_offline.add(user_id)
+            self.client.delete(self._worker_key(worker_id))
+            self.client.srem(f"{self.prefix}workers", worker_id)
+        return went_offline
+
+    def stats(self):
+        return {
+            'type': 'redis',
+            'connections': self.client.hlen(self._sids_key())
+        }
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+_presence_store = None
+_maintenance_pid = None
+
+
+def init_presence(app):
+    """Select the presence store from app config (PRESENCE_TYPE)"""
+    global _presence_store
+    client = None
+    if app.config.get('PRESENCE_TYPE', 'local') == 'redis':
+        client = get_redis_client(app.config.get('PRESENCE_REDIS_URL'))
+    if client is not None:
+        _presence_store = RedisPresenceStore(client)
+    else:
+        _presence_store = LocalPresenceStore()
+    return _presence_store
+
+
+def get_presence_store():
+    """Return the active presence store (in-process until init_presence runs)"""
+    global _presence_store
+    if _presence_store is None:
+        _presence_store = LocalPresenceStore()
+    return _presence_store
+
+
+class PresenceAggregator:
+    """
+    Coalesces online/offline transitions for this worker.
+
+    A disconnect only becomes "offline" after OFFLINE_GRACE seconds, so a
+    reconnect inside that window (page reload, deploy, flaky network) produces
+    no write and no event at all. Due transitions are handed out in batches
+    for one bulk status UPSERT and one presence event per peer.
+    """
+
+    def __init__(self, offline_grace=OFFLINE_GRACE):
+        self.offline_grace = offline_grace
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> (is_online, last_seen, due_at)
+        self._coalesced = 0
+        self._flushed = 0
+
+    def connected(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending and not pending[0]:
+                # Reconnected before the offline transition was published
+                del self._pending[user_id]
+                self._coalesced += 1
+                return
+            self._pending[user_id] = (True, datetime.utcnow(), time.monotonic())
+
+    def disconnected(self, user_id, grace=None):
+        user_id = str(user_id)
+        grace = self.offline_grace if grace is None else grace
+        with self._lock:
+            if user_id in self._pending:
+                self._coalesced += 1
+            self._pending[user_id] = (False, datetime.utcnow(), time.monotonic() + grace)
+
+    def take_due(self, store=None):
+        """
+        Pop transitions that are due as [(user_id, is_online, last_seen)].
+        Offline transitions for users the store still sees connected (e.g.
+        on another worker) are dropped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [(u, p[0], p[1]) for u, p in self._pending.items() if p[2] <= now]
+            for user_id, _, _ in due:
+                del self._pending[user_id]
+
+        going_offline = [u for u, is_online, _ in due if not is_online]
+        if store is not None and going_offline:
+            still_online = store.online_users(going_offline)
+            due = [c for c in due if c[1] or c[0] not in still_online]
+        self._flushed += len(due)
+        return due
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'coalesced': self._coalesced,
+            'flushed': self._flushed
+        }
+
+
+_presence_aggregator = PresenceAggregator()
+
+
+def get_presence_aggregator():
+    return _presence_aggregator
+
+
+def start_presence_maintenance(socketio, flush_handler):
+    """
+    Start this worker's presence loop (once per process): every
+    FLUSH_INTERVAL seconds due status transitions are passed to
+    flush_handler(changes) as one batch; with the Redis store the worker also
+    heartbeats and sweeps connections left behind by dead workers.
+    """
+    global _maintenance_pid
+    if _maintenance_pid == os.getpid():
+        return
+    _maintenance_pid = os.getpid()
+    store = get_presence_store()
+    aggregator = get_presence_aggregator()
+    shared = isinstance(store, RedisPresenceStore)
+
+    def loop():
+        next_heartbeat = 0
+        while True:
+            try:
+                if shared and time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL
+                    store.heartbeat()
+                    for user_id in store.sweep_dead_workers():
+                        aggregator.disconnected(user_id, grace=0)
+                changes = aggregator.take_due(store)
+                if changes:
+                    flush_handler(changes)
+            except Exception as e:
+                print(f"Presence maintenance error: {str(e)}")
+            socketio.sleep(FLUSH_INTERVAL)
+
+    if shared:
+        store.heartbeat()
+    socketio.start_background_task(loop)
+
+
+def presence_stats():
+    """Registry statistics for the health endpoint"""
+    stats = get_presence_store().stats()
+    stats['aggregator'] = get_presence_aggregator().stats()
+    return stats
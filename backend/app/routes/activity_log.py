@@ -2,16 +2,15 @@
 Activity Log Routes - API endpoints for viewing activity logs
 Users can only view their own logs - NO edit/delete operations allowed
 """
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.activity_log import ActivityLog, log_activity
 from app.models.user import User
+from app.exports import ExportColumn, select_columns, stream_csv_response, format_datetime
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
 import uuid as uuid_module
-import csv
-import io
 
 bp = Blueprint('activity_log', __name__, url_prefix='/api/activity-logs')
 
@@ -135,19 +134,25 @@ def get_activity_stats():
         week_ago = today - timedelta(days=7)
         month_ago = today - timedelta(days=30)
         
+        # Range predicates on created_at (not func.date()) so Postgres can use
+        # the (user_id, created_at) index and prune monthly partitions
+        today_start = datetime.combine(today, datetime.min.time())
+        week_start = datetime.combine(week_ago, datetime.min.time())
+        trend_start = today_start - timedelta(days=6)
+        
         # Total activities
         total = ActivityLog.query.filter(ActivityLog.user_id == current_user_id).count()
         
         # Today's activities
         today_count = ActivityLog.query.filter(
             ActivityLog.user_id == current_user_id,
-            func.date(ActivityLog.created_at) == today
+            ActivityLog.created_at >= today_start
         ).count()
         
         # This week
         week_count = ActivityLog.query.filter(
             ActivityLog.user_id == current_user_id,
-            func.date(ActivityLog.created_at) >= week_ago
+            ActivityLog.created_at >= week_start
         ).count()
         
         # By category
@@ -168,17 +173,22 @@ def get_activity_stats():
             func.count(ActivityLog.id).desc()
         ).limit(5).all()
         
-        # Daily activity trend (last 7 days)
+        # Daily activity trend (last 7 days) in one grouped query
+        day_column = func.date(ActivityLog.created_at)
+        counts_by_day = dict(db.session.query(
+            day_column,
+            func.count(ActivityLog.id)
+        ).filter(
+            ActivityLog.user_id == current_user_id,
+            ActivityLog.created_at >= trend_start
+        ).group_by(day_column).all())
+        
         daily_trend = []
         for i in range(6, -1, -1):
             day = today - timedelta(days=i)
-            count = ActivityLog.query.filter(
-                ActivityLog.user_id == current_user_id,
-                func.date(ActivityLog.created_at) == day
-            ).count()
             daily_trend.append({
                 'date': day.isoformat(),
-                'count': count
+                'count': counts_by_day.get(day, 0)
             })
         
         return jsonify({
@@ -197,12 +207,24 @@ def get_activity_stats():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+ACTIVITY_EXPORT_COLUMNS = [
+    ExportColumn('createdAt', 'Date & Time (UTC)', lambda row: format_datetime(row.created_at)),
+    ExportColumn('category', 'Category', lambda row: row.action_category),
+    ExportColumn('actionType', 'Action Type', lambda row: row.action_type),
+    ExportColumn('description', 'Description', lambda row: row.description),
+    ExportColumn('target', 'Target', lambda row: row.target_name or ''),
+    ExportColumn('status', 'Status', lambda row: row.status),
+    ExportColumn('ipAddress', 'IP Address', lambda row: row.ip_address or '')
+]
+
+
 @bp.route('/export', methods=['GET'])
 @jwt_required()
 def export_activity_logs():
     """
-    Export activity logs as CSV
+    Export activity logs as CSV (streamed)
     Users can only export their own logs
+    Optional: ?columns=createdAt,category,... and ?gzip=true
     """
     try:
         current_user_id = get_uuid_from_identity(get_jwt_identity())
@@ -242,51 +264,23 @@ def export_activity_logs():
         if action_type and action_type != 'all':
             query = query.filter(ActivityLog.action_type == action_type)
         
-        # Get all matching logs
-        logs = query.order_by(ActivityLog.created_at.desc()).all()
-        
-        # Create CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Header row
-        writer.writerow([
-            'Date & Time (UTC)',
-            'Category',
-            'Action Type',
-            'Description',
-            'Target',
-            'Status',
-            'IP Address'
-        ])
-        
-        # Data rows
-        for log in logs:
-            writer.writerow([
-                log.created_at.strftime('%Y-%m-%d %H:%M:%S') if log.created_at else '',
-                log.action_category,
-                log.action_type,
-                log.description,
-                log.target_name or '',
-                log.status,
-                log.ip_address or ''
-            ])
-        
-        # Create response
-        output.seek(0)
+        # Stream newest first, reading only the columns the CSV needs
+        columns = select_columns(ACTIVITY_EXPORT_COLUMNS)
+        query = query.with_entities(
+            ActivityLog.created_at,
+            ActivityLog.action_category,
+            ActivityLog.action_type,
+            ActivityLog.description,
+            ActivityLog.target_name,
+            ActivityLog.status,
+            ActivityLog.ip_address
+        ).order_by(ActivityLog.created_at.desc())
         
         # Generate filename with current timestamp
         timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        filename = f'activity_log_{user.first_name}_{user.last_name}_{timestamp}.csv'
-        
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename={filename}',
-                'Content-Type': 'text/csv; charset=utf-8'
-            }
-        )
+        filename = f'activity_log_{user.first_name}_{user.last_name}_{timestamp}'
+        
+        return stream_csv_response(query, columns, filename)
         
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
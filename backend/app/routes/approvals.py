@@ -4,15 +4,15 @@ from app.models import User, ApprovalRequest, ApprovalStep, ApprovedDocument, Ap
 from app.models.approval import generate_verification_code
 from app.models.blockchain_transaction import BlockchainTransaction
 from app.models.activity_log import log_activity
-from app.models.notification import create_notification
-from app.services.pdf_stamping import pdf_stamping_service
+from app.services.notification_fanout import notification_fanout
+from app.services.stamp_queue import stamp_job_queue
 from app.services.approval_folder_service import approval_folder_service
+from app.services.verification_extractor import verification_extractor, ExtractorBusy
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from sqlalchemy import or_
 from uuid import UUID
 import logging
-import requests as http_requests
 
 bp = Blueprint('approvals', __name__)
 logger = logging.getLogger(__name__)
@@ -164,6 +164,7 @@ def create_approval_request():
         
         # Send chat messages to all approvers
         try:
+            approver_ids = []
             for step in ApprovalStep.query.filter_by(request_id=approval_request.id).all():
                 send_approval_request_chat_message(
                     sender_id=current_user_id,
@@ -171,21 +172,23 @@ def create_approval_request():
                     approval_request=approval_request,
                     document={'name': approval_request.document_name}
                 )
-                # Create notification for approver
-                create_notification(
-                    user_id=step.approver_id,
-                    notification_type='approval_request',
-                    title='New Approval Request',
-                    message=f'{user.first_name} {user.last_name} requested your approval for "{approval_request.document_name}"',
-                    sender_id=current_user_id,
-                    sender_name=f'{user.first_name} {user.last_name}',
-                    extra_data={
-                        'approval_request_id': str(approval_request.id),
-                        'document_name': approval_request.document_name,
-                        'requester_id': current_user_id,
-                        'priority': approval_request.priority
-                    }
-                )
+                approver_ids.append(step.approver_id)
+            
+            # One fan-out event notifies every approver
+            notification_fanout.publish(
+                user_ids=approver_ids,
+                notification_type='approval_request',
+                title='New Approval Request',
+                message=f'{user.first_name} {user.last_name} requested your approval for "{approval_request.document_name}"',
+                sender_id=current_user_id,
+                sender_name=f'{user.first_name} {user.last_name}',
+                extra_data={
+                    'approval_request_id': str(approval_request.id),
+                    'document_name': approval_request.document_name,
+                    'requester_id': current_user_id,
+                    'priority': approval_request.priority
+                }
+            )
             logger.info(f"Sent chat messages to approvers for request {approval_request.request_id}")
         except Exception as chat_error:
             logger.warning(f"Could not send chat messages: {chat_error}")
@@ -292,6 +295,7 @@ def approve_document(request_id):
         
         logger.info(f"📋 Found {len(all_steps)} approval steps for request")
         approved = sum(1 for s in all_steps if s.has_approved)
+        stamp_job = None
         
         if approved == len(all_steps):
             approval_request.status = 'APPROVED'
@@ -337,60 +341,22 @@ def approve_document(request_id):
                         'verification_info': digital_signature_data.get('verificationInfo', {})
                     }
                 
-                # Generate stamped PDF
-                logger.info(f"📄 Starting PDF stamping for document: {approval_request.document_name}")
-                logger.info(f"📄 IPFS Hash: {approval_request.document_ipfs_hash}")
-                logger.info(f"📄 Verification Code: {approval_request.verification_code}")
-                logger.info(f"📄 Is Digital Signature: {is_digital_signature}")
-                logger.info(f"📄 Approval Type from request: {approval_request.approval_type}")
-                logger.info(f"📄 Digital Signature Data: {digital_signature_data}")
-                
                 # Use DIGITAL_SIGNATURE type if this is a digital signature approval
                 effective_approval_type = 'DIGITAL_SIGNATURE' if is_digital_signature else approval_request.approval_type
-                logger.info(f"📄 Effective Approval Type: {effective_approval_type}")
-                
-                stamped_pdf = pdf_stamping_service.stamp_pdf_from_url(
-                    approval_request.document_ipfs_hash,
-                    approval_details,
-                    effective_approval_type
-                )
                 
-                logger.info(f"📄 Stamped PDF result: {'Success' if stamped_pdf else 'Failed'}")
-                
-                if stamped_pdf:
-                    # Upload stamped PDF to IPFS (Pinata)
-                    from config import Config
-                    pinata_jwt = Config.PINATA_JWT
-                    
-                    if pinata_jwt:
-                        upload_url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
-                        headers = {"Authorization": f"Bearer {pinata_jwt}"}
-                        files = {
-                            'file': (f"stamped_{approval_request.document_name}", stamped_pdf, 'application/pdf')
-                        }
-                        pinata_metadata = {
-                            "name": f"Stamped_{approval_request.document_name}",
-                            "keyvalues": {
-                                "verification_code": approval_request.verification_code,
-                                "original_hash": approval_request.document_ipfs_hash,
-                                "type": "stamped_document"
-                            }
-                        }
-                        import json
-                        data_payload = {"pinataMetadata": json.dumps(pinata_metadata)}
-                        
-                        response = http_requests.post(upload_url, headers=headers, files=files, data=data_payload)
-                        if response.status_code == 200:
-                            ipfs_hash = response.json().get('IpfsHash')
-                            approval_request.stamped_document_ipfs_hash = ipfs_hash
-                            approval_request.stamped_at = datetime.utcnow()
-                            logger.info(f"Stamped PDF uploaded to IPFS: {ipfs_hash}")
-                        else:
-                            logger.error(f"Failed to upload stamped PDF to IPFS: {response.text}")
-                    else:
-                        logger.warning("Pinata JWT not configured, skipping IPFS upload")
+                if stamp_job_queue.enabled():
+                    # Stamping (download, QR/stamp overlays, upload to IPFS) runs in a
+                    # stamp worker; the job commits together with the approval
+                    stamp_job = stamp_job_queue.enqueue(
+                        approval_request,
+                        approval_details,
+                        effective_approval_type,
+                        requested_by=current_user_id
+                    )
+                    logger.info(f"📄 Queued PDF stamping for document: {approval_request.document_name}")
                 else:
-                    logger.warning("Failed to generate stamped PDF")
+                    ipfs_hash = stamp_job_queue.stamp_inline(approval_request, approval_details, effective_approval_type)
+                    logger.info(f"Stamped PDF uploaded to IPFS: {ipfs_hash}")
                     
             except Exception as stamp_error:
                 # Log error but don't fail the approval
@@ -455,8 +421,8 @@ def approve_document(request_id):
             logger.info(f"Sent approval status chat message to requester")
             
             # Create notification for requester
-            create_notification(
-                user_id=approval_request.requester_id,
+            notification_fanout.publish(
+                user_ids=[approval_request.requester_id],
                 notification_type='approval_response',
                 title=f'Document {"Signed" if is_digital_signature else "Approved"}',
                 message=f'Your document "{approval_request.document_name}" has been {status_type} by {user.first_name} {user.last_name}',
@@ -509,7 +475,11 @@ def approve_document(request_id):
             except Exception as tx_error:
                 logger.warning(f"Could not record approval blockchain transaction: {tx_error}")
         
-        return jsonify({'success': True, 'data': approval_request.to_dict_detailed()}), 200
+        response_data = approval_request.to_dict_detailed()
+        if stamp_job is not None:
+            # Poll GET /api/approvals/<id>/stamp-status or wait for 'stamp_job_completed'
+            response_data['stampJob'] = stamp_job.to_dict()
+        return jsonify({'success': True, 'data': response_data}), 200
         
     except Exception as e:
         db.session.rollback()
@@ -610,8 +580,8 @@ def reject_document(request_id):
             logger.info(f"Sent rejection status chat message to requester")
             
             # Create notification for requester about rejection
-            create_notification(
-                user_id=approval_request.requester_id,
+            notification_fanout.publish(
+                user_ids=[approval_request.requester_id],
                 notification_type='approval_response',
                 title='Document Rejected',
                 message=f'Your document "{approval_request.document_name}" has been rejected by {user.first_name} {user.last_name}',
@@ -742,6 +712,40 @@ def get_approval_status(request_id):
     return jsonify({'success': True, 'data': approval_request.to_dict_detailed()}), 200
 
 
+@bp.route('/<request_id>/stamp-status', methods=['GET'])
+@jwt_required()
+def get_stamp_status(request_id):
+    """Progress of the stamped (V2) PDF for an approval request"""
+    approval_request = ApprovalRequest.query.filter_by(request_id=request_id).first()
+    if not approval_request:
+        try:
+            approval_request = ApprovalRequest.query.get(UUID(request_id))
+        except (ValueError, AttributeError):
+            pass
+    
+    if not approval_request:
+        return jsonify({'error': 'Not found'}), 404
+    
+    # Only the requester and the approvers may see the job (and its errors)
+    current_user_id = get_jwt_identity()
+    is_approver = ApprovalStep.query.filter_by(
+        request_id=approval_request.id, approver_id=current_user_id
+    ).first() is not None
+    if str(approval_request.requester_id) != str(current_user_id) and not is_approver:
+        return jsonify({'error': 'Not authorized to view this request'}), 403
+    
+    job = stamp_job_queue.latest_for_request(approval_request.id)
+    return jsonify({
+        'success': True,
+        'data': {
+            'status': job.status if job else ('succeeded' if approval_request.stamped_document_ipfs_hash else 'none'),
+            'stampedDocumentIpfsHash': approval_request.stamped_document_ipfs_hash,
+            'stampedAt': (approval_request.stamped_at.isoformat() + 'Z') if approval_request.stamped_at else None,
+            'job': job.to_dict() if job else None
+        }
+    }), 200
+
+
 @bp.route('/my-requests', methods=['GET'])
 @jwt_required()
 def get_my_requests():
@@ -995,40 +999,16 @@ def verify_uploaded_file():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'success': False, 'error': 'Only PDF files are supported'}), 400
         
-        # Try to extract verification code from PDF
-        verification_code = None
-        
+        # Extract the verification code: spooled to disk, cached by SHA-256,
+        # metadata and first page first, later pages only within a CPU budget
         try:
-            import PyPDF2
-            import re
-            import io
-            
-            # Read the PDF
-            pdf_bytes = file.read()
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            
-            # Search for verification code pattern in all pages
-            code_pattern = r'DCH-\d{4}-[A-Z0-9]{6}'
-            
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text:
-                    match = re.search(code_pattern, text)
-                    if match:
-                        verification_code = match.group()
-                        break
-            
-            # Also check PDF metadata
-            if not verification_code and pdf_reader.metadata:
-                for key, value in pdf_reader.metadata.items():
-                    if value and isinstance(value, str):
-                        match = re.search(code_pattern, value)
-                        if match:
-                            verification_code = match.group()
-                            break
-                            
-        except Exception as pdf_error:
-            logger.warning(f"Error reading PDF: {pdf_error}")
+            extraction = verification_extractor.extract_upload(file.stream)
+        except ExtractorBusy:
+            return jsonify({
+                'success': False,
+                'error': 'Too many verifications in progress. Please try again in a moment.'
+            }), 503
+        verification_code = extraction['code']
         
         if not verification_code:
             return jsonify({
@@ -7,6 +7,7 @@ from app.models.folder import Folder
 from app.models.activity_log import log_activity
 # Use simple Brevo email service
 from app.services.brevo_email_simple import SimpleBrevoEmailService
+from app.services.auto_group_service import auto_group_service
 from datetime import datetime, timedelta
 from functools import wraps
 import random
@@ -253,6 +254,9 @@ def admin_create_user():
         except Exception as e:
             pass  # Don't fail if folder creation fails
         
+        # Join institution/department groups in the background
+        auto_group_service.schedule_sync(user_ids=[user.id])
+        
         # Send welcome email with temporary password info
         try:
             full_name = f"{user.first_name} {user.last_name}"
@@ -424,12 +428,11 @@ def login():
         user.last_login = datetime.utcnow()
         db.session.commit()
         
-        # Create/join auto-generated groups (institution, department)
+        # Reconcile auto-generated groups (institution, department) off the request path
         try:
-            from app.routes.chat import create_auto_groups_for_user
-            create_auto_groups_for_user(user)
+            auto_group_service.schedule_sync(user_ids=[user.id])
         except Exception as e:
-            pass  # Don't fail login if group creation fails
+            pass  # Don't fail login if group sync cannot be scheduled
         
         # Create access token
         access_token = create_access_token(identity=user.id)
@@ -1,8 +1,9 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.blockchain_transaction import BlockchainTransaction, WalletBalance
 from app.models.user import User
+from app.exports import ExportColumn, select_columns, stream_csv_response
 from datetime import datetime, timedelta, date
 from sqlalchemy import func, and_, or_
 from decimal import Decimal
@@ -453,10 +454,31 @@ def get_admin_analytics():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def _gas_cost_eth(row):
+    if row.gas_used and row.gas_price:
+        return f'{(row.gas_used * row.gas_price) / 1e18:.10f}'
+    return f'{0:.10f}'
+
+
+TRANSACTION_EXPORT_COLUMNS = [
+    ExportColumn('hash', 'Transaction Hash', lambda row: row.transaction_hash or ''),
+    ExportColumn('type', 'Type', lambda row: row.transaction_type),
+    ExportColumn('status', 'Status', lambda row: row.status),
+    ExportColumn('gasUsed', 'Gas Used', lambda row: row.gas_used or 0),
+    ExportColumn('gasPrice', 'Gas Price (Wei)', lambda row: row.gas_price or 0),
+    ExportColumn('gasCostEth', 'Gas Cost (ETH)', _gas_cost_eth),
+    ExportColumn('blockNumber', 'Block Number', lambda row: row.block_number or ''),
+    ExportColumn('date', 'Date', lambda row: row.created_at.isoformat() if row.created_at else '')
+]
+
+
 @bp.route('/export', methods=['GET'])
 @jwt_required()
 def export_transactions():
-    """Export transactions as CSV"""
+    """
+    Export transactions as CSV (streamed; admins export every transaction)
+    Optional: ?columns=hash,type,... and ?gzip=true
+    """
     try:
         current_user_id = get_uuid_from_identity(get_jwt_identity())
         if not current_user_id:
@@ -491,34 +513,19 @@ def export_transactions():
         if status and status != 'all':
             query = query.filter(BlockchainTransaction.status == status)
         
-        transactions = query.order_by(BlockchainTransaction.created_at.desc()).all()
-        
-        # Build CSV data
-        csv_rows = ['Transaction Hash,Type,Status,Gas Used,Gas Price (Wei),Gas Cost (ETH),Block Number,Date']
-        
-        for tx in transactions:
-            gas_cost_eth = 0
-            if tx.gas_used and tx.gas_price:
-                gas_cost_eth = (tx.gas_used * tx.gas_price) / 1e18
-            
-            csv_rows.append(
-                f'{tx.transaction_hash or ""},'
-                f'{tx.transaction_type},'
-                f'{tx.status},'
-                f'{tx.gas_used or 0},'
-                f'{tx.gas_price or 0},'
-                f'{gas_cost_eth:.10f},'
-                f'{tx.block_number or ""},'
-                f'{tx.created_at.isoformat() if tx.created_at else ""}'
-            )
-        
-        csv_content = '\n'.join(csv_rows)
-        
-        return Response(
-            csv_content,
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename=blockchain_transactions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'}
-        )
+        columns = select_columns(TRANSACTION_EXPORT_COLUMNS)
+        query = query.with_entities(
+            BlockchainTransaction.transaction_hash,
+            BlockchainTransaction.transaction_type,
+            BlockchainTransaction.status,
+            BlockchainTransaction.gas_used,
+            BlockchainTransaction.gas_price,
+            BlockchainTransaction.block_number,
+            BlockchainTransaction.created_at
+        ).order_by(BlockchainTransaction.created_at.desc())
+        
+        filename = f'blockchain_transactions_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        return stream_csv_response(query, columns, filename)
         
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
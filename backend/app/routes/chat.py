@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models import User, Conversation, ConversationMember, Message, UserOnlineStatus, Document
-from app.models.chat import MessageLike, MessageComment, SavedPost
-from app.models.institution import Institution, Department
-from app.models.notification import create_notification
+from app.models.chat import (
+    MessageLike, MessageComment, SavedPost, conversation_list_for_user,
+    circulars_feed_page, circulars_with_post_counts,
+    increment_unread, mark_conversation_read, total_unread_for_user, reconcile_unread_counters
+)
+from app.models.institution import Department
+from app.services.auto_group_service import auto_group_service
+from app.services.notification_fanout import notification_fanout
+from app.performance import encode_keyset_cursor, decode_keyset_cursor
+from app.websocket_events import invalidate_membership
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from sqlalchemy import or_, and_, func
@@ -11,117 +18,8 @@ import uuid
 
 bp = Blueprint('chat', __name__)
 
-
-# ============== AUTO GROUP FUNCTIONS ==============
-
-def ensure_auto_groups(user):
-    """Ensure user is added to their institution and department groups automatically"""
-    if not user:
-        return
-    
-    # 1. Institution Group
-    institution_group = Conversation.query.filter_by(
-        type='group',
-        is_auto_created=True,
-        auto_type='institution',
-        linked_id=user.institution_id
-    ).first()
-    
-    if not institution_group:
-        # Create institution group
-        institution = Institution.query.get(user.institution_id)
-        if institution:
-            institution_group = Conversation(
-                type='group',
-                name=f"{institution.name} - All Members",
-                description=f"Official group for all members of {institution.name}",
-                is_auto_created=True,
-                auto_type='institution',
-                linked_id=user.institution_id,
-                institution_id=user.institution_id,
-                avatar='🏛️'
-            )
-            db.session.add(institution_group)
-            db.session.flush()
-    
-    if institution_group:
-        # Add user if not already a member
-        existing_member = ConversationMember.query.filter_by(
-            conversation_id=institution_group.id,
-            user_id=user.id
-        ).first()
-        
-        if not existing_member:
-            member = ConversationMember(
-                conversation_id=institution_group.id,
-                user_id=user.id,
-                role='admin' if user.role == 'admin' else 'member'
-            )
-            db.session.add(member)
-    
-    # 2. Department Group (if user has a department)
-    if user.department_id:
-        dept_group = Conversation.query.filter_by(
-            type='group',
-            is_auto_created=True,
-            auto_type='department',
-            linked_id=user.department_id
-        ).first()
-        
-        if not dept_group:
-            # Create department group
-            department = Department.query.get(user.department_id)
-            if department:
-                dept_group = Conversation(
-                    type='group',
-                    name=f"{department.name} Department",
-                    description=f"Official group for {department.name} department members",
-                    is_auto_created=True,
-                    auto_type='department',
-                    linked_id=user.department_id,
-                    institution_id=user.institution_id,
-                    avatar='📚'
-                )
-                db.session.add(dept_group)
-                db.session.flush()
-        
-        if dept_group:
-            # Add user if not already a member
-            existing_member = ConversationMember.query.filter_by(
-                conversation_id=dept_group.id,
-                user_id=user.id
-            ).first()
-            
-            if not existing_member:
-                member = ConversationMember(
-                    conversation_id=dept_group.id,
-                    user_id=user.id,
-                    role='admin' if user.role in ['admin', 'faculty'] else 'member'
-                )
-                db.session.add(member)
-    
-    # 3. Admin gets added to ALL groups in their institution
-    if user.role == 'admin':
-        all_groups = Conversation.query.filter(
-            Conversation.type == 'group',
-            Conversation.institution_id == user.institution_id
-        ).all()
-        
-        for group in all_groups:
-            existing_member = ConversationMember.query.filter_by(
-                conversation_id=group.id,
-                user_id=user.id
-            ).first()
-            
-            if not existing_member:
-                member = ConversationMember(
-                    conversation_id=group.id,
-                    user_id=user.id,
-                    role='admin'
-                )
-                db.session.add(member)
-    
-    db.session.commit()
+FEED_PAGE_SIZE = 50
+FEED_MAX_PAGE_SIZE = 200
 
 
 # ============== USER SEARCH ==============
@@ -192,66 +90,13 @@ def get_conversations():
     if not current_user:
         return jsonify({'error': 'User not found'}), 404
     
-    # Ensure user is added to auto-groups (institution, department)
-    ensure_auto_groups(current_user)
-    
+    # Auto-group membership is reconciled in the background on account
+    # changes (see auto_group_service), so listing is a pure read
     conv_type = request.args.get('type')  # 'direct', 'group', 'circular'
     
-    # Get conversations where user is a member
-    member_query = ConversationMember.query.filter(
-        ConversationMember.user_id == current_user.id
-    ).all()
-    
-    conversation_ids = [m.conversation_id for m in member_query]
-    
-    conversations_query = Conversation.query.filter(
-        Conversation.id.in_(conversation_ids)
-    )
-    
-    if conv_type:
-        conversations_query = conversations_query.filter(Conversation.type == conv_type)
-    
-    conversations = conversations_query.order_by(Conversation.last_message_at.desc()).all()
-    
-    result = []
-    for conv in conversations:
-        conv_data = conv.to_dict(user_id=current_user.id)
-        
-        # Get member settings for this user
-        member = ConversationMember.query.filter_by(
-            conversation_id=conv.id,
-            user_id=current_user.id
-        ).first()
-        
-        if member:
-            conv_data['isMuted'] = member.is_muted
-            conv_data['isPinned'] = member.is_pinned
-        
-        # For direct messages, get the other user's info
-        if conv.type == 'direct':
-            other_user_id = conv.get_other_user(current_user.id)
-            if other_user_id:
-                other_user = User.query.get(other_user_id)
-                if other_user:
-                    online_status = UserOnlineStatus.query.get(other_user.id)
-                    conv_data['userId'] = str(other_user.id)  # Important for WebSocket online status
-                    conv_data['name'] = f"{other_user.first_name} {other_user.last_name}"
-                    conv_data['role'] = other_user.role
-                    conv_data['email'] = other_user.email
-                    conv_data['phone'] = other_user.phone
-                    conv_data['avatar'] = other_user.first_name[0].upper()
-                    conv_data['online'] = online_status.is_online if online_status else False
-                    conv_data['lastSeen'] = online_status.last_seen.isoformat() if online_status and online_status.last_seen else None
-                    
-                    # Get department
-                    if other_user.department_id:
-                        dept = Department.query.get(other_user.department_id)
-                        conv_data['department'] = dept.name if dept else None
-        else:
-            # For groups, get member count
-            conv_data['members'] = conv.members.count()
-        
-        result.append(conv_data)
+    # Every conversation the user belongs to, with unread/member counts and
+    # direct-chat peer info, in a single aggregated query
+    result = conversation_list_for_user(current_user.id, conv_type)
     
     return jsonify({'conversations': result})
 
@@ -259,91 +104,87 @@ def get_conversations():
 @bp.route('/circulars/feed', methods=['GET'])
 @jwt_required()
 def get_circulars_feed():
-    """Get all circulars as a feed/timeline for the user's institution"""
+    """
+    Get circulars as a feed/timeline for the user's institution, newest first.
+    
+    Query params: limit (default 50, max 200), cursor (nextCursor from the
+    previous page), circularId (only posts of one circular).
+    """
     current_user_id = get_jwt_identity()
     current_user = User.query.get(current_user_id)
     if not current_user:
         return jsonify({'error': 'User not found'}), 404
     
-    # Get all circulars for user's institution
-    circulars = Conversation.query.filter(
-        Conversation.type == 'circular',
-        Conversation.institution_id == current_user.institution_id
-    ).order_by(Conversation.created_at.desc()).all()
+    limit = max(1, min(request.args.get('limit', FEED_PAGE_SIZE, type=int), FEED_MAX_PAGE_SIZE))
+    before = None
+    if request.args.get('cursor'):
+        try:
+            before = decode_keyset_cursor(request.args['cursor'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     
-    feed_items = []
-    for circular in circulars:
-        # Get all messages (posts) in this circular
-        messages = Message.query.filter_by(
-            conversation_id=circular.id,
-            is_deleted=False
-        ).order_by(Message.created_at.desc()).all()
-        
-        # Get creator info
-        creator = User.query.get(circular.created_by) if circular.created_by else None
-        
-        for msg in messages:
-            sender = User.query.get(msg.sender_id)
-            
-            # Check if current user liked this post
-            user_liked = MessageLike.query.filter_by(
-                message_id=msg.id,
-                user_id=current_user.id
-            ).first() is not None
-            
-            # Check if current user saved this post
-            user_saved = SavedPost.query.filter_by(
-                message_id=msg.id,
-                user_id=current_user.id
-            ).first() is not None
-            
-            feed_items.append({
-                'id': str(msg.id),
-                'circularId': str(circular.id),
-                'circularName': circular.name,
-                'content': msg.content,
-                'createdAt': msg.created_at.isoformat() + 'Z' if msg.created_at else None,
-                'editedAt': msg.edited_at.isoformat() + 'Z' if msg.edited_at else None,
-                'sender': {
-                    'id': str(sender.id) if sender else None,
-                    'name': f"{sender.first_name} {sender.last_name}" if sender else 'Unknown',
-                    'firstName': sender.first_name if sender else None,
-                    'role': sender.role if sender else None,
-                    'avatar': sender.first_name[0].upper() if sender and sender.first_name else 'U'
-                },
-                'hasDocument': msg.document_id is not None,
-                'document': {
-                    'id': str(msg.document_id) if msg.document_id else None,
-                    'name': msg.document_name,
-                    'hash': msg.document_hash,
-                    'ipfsHash': msg.document_hash
-                } if msg.document_id or msg.document_name else None,
-                'blockchainDocument': {
-                    'id': str(msg.document_id) if msg.document_id else None,
-                    'name': msg.document_name,
-                    'ipfsHash': msg.document_hash
-                } if msg.document_hash and msg.document_name else None,
-                'likesCount': msg.likes.count(),
-                'commentsCount': msg.comments.filter_by(is_deleted=False).count(),
-                'userLiked': user_liked,
-                'userSaved': user_saved,
-                'isOwner': str(msg.sender_id) == current_user_id
-            })
+    circular_id = request.args.get('circularId')
+    if circular_id:
+        try:
+            circular_id = uuid.UUID(circular_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid circularId'}), 400
     
-    # Sort all feed items by date
-    feed_items.sort(key=lambda x: x['createdAt'] or '', reverse=True)
+    # One page across all circulars with counts and liked/saved flags in one query
+    rows, has_more = circulars_feed_page(
+        current_user.id, current_user.institution_id, limit,
+        before=before, circular_id=circular_id
+    )
+    
+    feed_items = []
+    for row in rows:
+        feed_items.append({
+            'id': str(row.id),
+            'circularId': str(row.conversation_id),
+            'circularName': row.circular_name,
+            'content': row.content,
+            'createdAt': row.created_at.isoformat() + 'Z' if row.created_at else None,
+            'editedAt': row.edited_at.isoformat() + 'Z' if row.edited_at else None,
+            'sender': {
+                'id': str(row.sender_user_id) if row.sender_user_id else None,
+                'name': f"{row.sender_first_name} {row.sender_last_name}" if row.sender_user_id else 'Unknown',
+                'firstName': row.sender_first_name,
+                'role': row.sender_role,
+                'avatar': row.sender_first_name[0].upper() if row.sender_first_name else 'U'
+            },
+            'hasDocument': row.document_id is not None,
+            'document': {
+                'id': str(row.document_id) if row.document_id else None,
+                'name': row.document_name,
+                'hash': row.document_hash,
+                'ipfsHash': row.document_hash
+            } if row.document_id or row.document_name else None,
+            'blockchainDocument': {
+                'id': str(row.document_id) if row.document_id else None,
+                'name': row.document_name,
+                'ipfsHash': row.document_hash
+            } if row.document_hash and row.document_name else None,
+            'likesCount': row.likes_count,
+            'commentsCount': row.comments_count,
+            'userLiked': row.user_liked,
+            'userSaved': row.user_saved,
+            'isOwner': str(row.sender_id) == current_user_id
+        })
     
     # Also return list of circulars user can post to
     can_post = current_user.role in ['admin', 'faculty']
     
     return jsonify({
         'feed': feed_items,
+        'nextCursor': encode_keyset_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        'hasMore': has_more,
         'canPost': can_post,
         'circulars': [{
             'id': str(c.id), 
             'name': c.name,
-            'isCreator': str(c.created_by) == current_user_id
-        } for c in circulars]
+            'isCreator': str(c.created_by) == current_user_id,
+            'postCount': c.post_count
+        } for c in circulars_with_post_counts(current_user.institution_id)]
     })
 
 
@@ -450,6 +291,14 @@ def create_conversation():
         return jsonify({'error': 'Invalid conversation type'}), 400
     
     db.session.commit()
+    if conv_type == 'direct':
+        invalidate_membership(current_user.id, user_id)
+    else:
+        invalidate_membership(current_user.id, *member_ids)
+    
+    # Institution admins are members of every group
+    if conv_type == 'group':
+        auto_group_service.schedule_sync(institution_ids=[current_user.institution_id])
     
     return jsonify({'conversation': conversation.to_dict(user_id=current_user.id)}), 201
 
@@ -564,7 +413,7 @@ def get_messages(conversation_id):
     )
     
     # Update last read
-    member.last_read_at = datetime.utcnow()
+    mark_conversation_read(member)
     db.session.commit()
     
     return jsonify({
@@ -623,57 +472,43 @@ def send_message(conversation_id):
         approval_request_id=data.get('approvalRequestId')
     )
     db.session.add(message)
+    increment_unread(conversation_id, current_user.id)
     
     # Update conversation last message time
     conversation.last_message_at = datetime.utcnow()
     
     db.session.commit()
     
-    # Create notifications for other members (for direct messages or smaller groups)
+    # Notify other members: one queued fan-out event, written in bulk off the request
     try:
-        # Get conversation type and members
+        sender_name = f'{current_user.first_name} {current_user.last_name}'
+        extra_data = {
+            'conversation_id': str(conversation_id),
+            'message_id': str(message.id),
+            'sender_id': str(current_user_id)
+        }
         if conversation.type == 'direct':
-            # For direct messages, notify the other person
-            other_member = ConversationMember.query.filter(
-                ConversationMember.conversation_id == conversation_id,
-                ConversationMember.user_id != current_user.id
-            ).first()
-            if other_member:
-                notif = create_notification(
-                    user_id=str(other_member.user_id),
-                    notification_type='message',
-                    title='New Message',
-                    message=f'{current_user.first_name} {current_user.last_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
-                    sender_id=str(current_user_id),
-                    sender_name=f'{current_user.first_name} {current_user.last_name}',
-                    extra_data={
-                        'conversation_id': str(conversation_id),
-                        'message_id': str(message.id),
-                        'sender_id': str(current_user_id)
-                    }
-                )
+            notification_fanout.publish(
+                notification_type='message',
+                title='New Message',
+                message=f'{sender_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
+                user_ids=[conversation.get_other_user(current_user.id)],
+                sender_id=current_user_id,
+                sender_name=sender_name,
+                extra_data=extra_data
+            )
         elif conversation.type == 'group':
-            # For all groups, notify members (limit to prevent spam in large groups)
-            members = ConversationMember.query.filter(
-                ConversationMember.conversation_id == conversation_id,
-                ConversationMember.user_id != current_user.id,
-                ConversationMember.is_muted == False  # Don't notify muted members
-            ).limit(50).all()  # Limit to avoid spamming very large groups
-            for m in members:
-                notif = create_notification(
-                    user_id=str(m.user_id),
-                    notification_type='group_message',
-                    title=f'New Message in {conversation.name or "Group"}',
-                    message=f'{current_user.first_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
-                    sender_id=str(current_user_id),
-                    sender_name=f'{current_user.first_name} {current_user.last_name}',
-                    extra_data={
-                        'conversation_id': str(conversation_id),
-                        'message_id': str(message.id),
-                        'sender_id': str(current_user_id),
-                        'group_name': conversation.name
-                    }
-                )
+            # Every unmuted member except the sender, resolved by the worker
+            notification_fanout.publish(
+                notification_type='group_message',
+                title=f'New Message in {conversation.name or "Group"}',
+                message=f'{current_user.first_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
+                conversation_id=conversation_id,
+                exclude_user_id=current_user.id,
+                sender_id=current_user_id,
+                sender_name=sender_name,
+                extra_data=dict(extra_data, group_name=conversation.name)
+            )
     except Exception:
         pass
     
@@ -887,6 +722,7 @@ def add_members(conversation_id):
                 added.append(member_id)
     
     db.session.commit()
+    invalidate_membership(*added)
     
     return jsonify({'added': added})
 
@@ -925,6 +761,7 @@ def remove_member(conversation_id, member_id):
     if member:
         db.session.delete(member)
         db.session.commit()
+        invalidate_membership(member_id)
     
     return jsonify({'success': True})
 
@@ -955,6 +792,7 @@ def leave_conversation(conversation_id):
     if member:
         db.session.delete(member)
         db.session.commit()
+        invalidate_membership(current_user.id)
         return jsonify({'success': True, 'message': 'Left the conversation successfully'})
     else:
         return jsonify({'error': 'You are not a member of this conversation'}), 400
@@ -1036,6 +874,9 @@ def delete_conversation(conversation_id):
         return jsonify({'error': 'Only admins can delete the group'}), 403
     
     # Delete all members first
+    member_ids = [row[0] for row in db.session.query(ConversationMember.user_id).filter_by(
+        conversation_id=conversation_id
+    ).all()]
     ConversationMember.query.filter_by(conversation_id=conversation_id).delete()
     
     # Delete all messages
@@ -1044,88 +885,11 @@ def delete_conversation(conversation_id):
     # Delete the conversation
     db.session.delete(conversation)
     db.session.commit()
+    invalidate_membership(*member_ids)
     
     return jsonify({'success': True, 'message': 'Group deleted successfully'})
 
 
-# ============== AUTO GROUPS ==============
-
-def create_auto_groups_for_user(user):
-    """Create or add user to auto-generated groups"""
-    # Institution group
-    inst_group = Conversation.query.filter_by(
-        is_auto_created=True,
-        auto_type='institution',
-        linked_id=user.institution_id
-    ).first()
-    
-    if not inst_group:
-        institution = Institution.query.get(user.institution_id)
-        inst_group = Conversation(
-            type='group',
-            name=f"{institution.name} - All Members",
-            is_auto_created=True,
-            auto_type='institution',
-            linked_id=user.institution_id,
-            institution_id=user.institution_id,
-            avatar='🏫'
-        )
-        db.session.add(inst_group)
-        db.session.flush()
-    
-    # Add user to institution group if not already a member
-    inst_member = ConversationMember.query.filter_by(
-        conversation_id=inst_group.id,
-        user_id=user.id
-    ).first()
-    
-    if not inst_member:
-        inst_member = ConversationMember(
-            conversation_id=inst_group.id,
-            user_id=user.id,
-            role='admin' if user.role == 'admin' else 'member'
-        )
-        db.session.add(inst_member)
-    
-    # Department group
-    if user.department_id:
-        dept_group = Conversation.query.filter_by(
-            is_auto_created=True,
-            auto_type='department',
-            linked_id=user.department_id
-        ).first()
-        
-        if not dept_group:
-            department = Department.query.get(user.department_id)
-            dept_group = Conversation(
-                type='group',
-                name=f"{department.name} - Department",
-                is_auto_created=True,
-                auto_type='department',
-                linked_id=user.department_id,
-                institution_id=user.institution_id,
-                avatar='📚'
-            )
-            db.session.add(dept_group)
-            db.session.flush()
-        
-        # Add user to department group if not already a member
-        dept_member = ConversationMember.query.filter_by(
-            conversation_id=dept_group.id,
-            user_id=user.id
-        ).first()
-        
-        if not dept_member:
-            dept_member = ConversationMember(
-                conversation_id=dept_group.id,
-                user_id=user.id,
-                role='admin' if user.role in ['admin', 'faculty'] else 'member'
-            )
-            db.session.add(dept_member)
-    
-    db.session.commit()
-
-
 # ============== AUTO MESSAGES ==============
 
 def create_document_share_message(sender_id, recipient_id, document, message_content=None, permission=None, transaction_hash=None, block_number=None, blockchain_document_id=None):
@@ -1177,6 +941,7 @@ def create_document_share_message(sender_id, recipient_id, document, message_con
         auto_message_type='document_shared'
     )
     db.session.add(message)
+    increment_unread(conversation.id, sender_id)
     
     conversation.last_message_at = datetime.utcnow()
     db.session.commit()
@@ -1223,6 +988,7 @@ def create_approval_request_message(sender_id, recipient_id, approval_request, d
         auto_message_type='approval_requested'
     )
     db.session.add(message)
+    increment_unread(conversation.id, sender_id)
     
     conversation.last_message_at = datetime.utcnow()
     db.session.commit()
@@ -1269,6 +1035,7 @@ def create_digital_signature_request_message(sender_id, recipient_id, approval_r
         auto_message_type='digital_signature_requested'
     )
     db.session.add(message)
+    increment_unread(conversation.id, sender_id)
     
     conversation.last_message_at = datetime.utcnow()
     db.session.commit()
@@ -1314,6 +1081,7 @@ def create_document_generated_message(sender_id, recipient_id, document, generat
         auto_message_type='document_generated'
     )
     db.session.add(message)
+    increment_unread(conversation.id, sender_id)
     
     conversation.last_message_at = datetime.utcnow()
     db.session.commit()
@@ -1370,6 +1138,7 @@ def create_approval_status_message(sender_id, recipient_id, approval_request, do
         auto_message_type=f'approval_{status.lower()}'
     )
     db.session.add(message)
+    increment_unread(conversation.id, sender_id)
     
     conversation.last_message_at = datetime.utcnow()
     db.session.commit()
@@ -1427,28 +1196,36 @@ def get_unread_count():
     if not current_user:
         return jsonify({'error': 'User not found'}), 404
     
-    members = ConversationMember.query.filter_by(user_id=current_user.id).all()
-    
-    total_unread = 0
-    for member in members:
-        if member.last_read_at:
-            count = Message.query.filter(
-                Message.conversation_id == member.conversation_id,
-                Message.created_at > member.last_read_at,
-                Message.sender_id != current_user.id,
-                Message.is_deleted == False
-            ).count()
-        else:
-            count = Message.query.filter(
-                Message.conversation_id == member.conversation_id,
-                Message.sender_id != current_user.id,
-                Message.is_deleted == False
-            ).count()
-        total_unread += count
+    # Single indexed SUM over the user's membership rows
+    total_unread = total_unread_for_user(current_user.id)
     
     return jsonify({'unread': total_unread})
 
 
+@bp.route('/admin/reconcile-unread', methods=['POST'])
+@jwt_required()
+def reconcile_unread():
+    """
+    Repair drifted unread counters for the admin's institution.
+    This endpoint can be called manually by admin or scheduled via cron.
+    """
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    if not current_user:
+        return jsonify({'error': 'User not found'}), 404
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        corrected = reconcile_unread_counters(current_user.institution_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    return jsonify({'success': True, 'corrected': corrected})
+
+
 # ============== LIKES ==============
 
 @bp.route('/messages/<message_id>/like', methods=['POST'])
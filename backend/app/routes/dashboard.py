@@ -10,8 +10,9 @@ from app.models.folder import Folder
 from app.models.approval import ApprovalRequest, ApprovalStep
 from app.models.blockchain_transaction import BlockchainTransaction
 from app.models.activity_log import ActivityLog
+from app.services.dashboard_stats import dashboard_stats_service
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
 import uuid as uuid_module
 
 bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
@@ -67,311 +68,228 @@ def get_dashboard_stats():
 
 def get_admin_stats(institution_id):
     """Get stats for admin dashboard"""
-    # User counts
-    total_students = User.query.filter(
-        User.institution_id == institution_id,
-        User.role == 'student',
-        User.status == 'active'
-    ).count()
-    
-    total_faculty = User.query.filter(
-        User.institution_id == institution_id,
-        User.role == 'faculty',
-        User.status == 'active'
-    ).count()
-    
-    total_admins = User.query.filter(
-        User.institution_id == institution_id,
-        User.role == 'admin',
-        User.status == 'active'
-    ).count()
-    
-    # Get unique departments
-    departments = db.session.query(func.count(func.distinct(User.department_id))).filter(
-        User.institution_id == institution_id,
-        User.department_id.isnot(None)
-    ).scalar() or 0
-    
-    # Document counts - all documents in institution
-    institution_user_ids = [u.id for u in User.query.filter_by(institution_id=institution_id).all()]
-    
-    total_documents = Document.query.filter(
-        Document.owner_id.in_(institution_user_ids),
-        Document.is_active == True
-    ).count()
-    
-    # Approval counts
-    approved_docs = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id.in_(institution_user_ids),
-        ApprovalRequest.status == 'APPROVED'
-    ).count()
-    
-    pending_docs = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id.in_(institution_user_ids),
-        ApprovalRequest.status == 'PENDING'
-    ).count()
-    
-    rejected_docs = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id.in_(institution_user_ids),
-        ApprovalRequest.status == 'REJECTED'
-    ).count()
-    
-    # Blockchain transactions
-    blockchain_txs = BlockchainTransaction.query.filter(
-        BlockchainTransaction.user_id.in_(institution_user_ids),
-        BlockchainTransaction.status == 'confirmed'
-    ).count()
-    
-    # Active users today
-    today = datetime.utcnow().date()
-    active_today = User.query.filter(
-        User.institution_id == institution_id,
-        func.date(User.last_login) == today
-    ).count()
-    
-    # Pending account requests
-    pending_accounts = User.query.filter(
-        User.institution_id == institution_id,
-        User.status == 'pending'
-    ).count()
-    
-    # Total shares
-    total_shares = DocumentShare.query.join(Document).filter(
-        Document.owner_id.in_(institution_user_ids)
-    ).count()
-    
-    # Growth stats (this month vs last month)
-    this_month = datetime.utcnow().replace(day=1)
-    last_month = (this_month - timedelta(days=1)).replace(day=1)
-    
-    new_students_this_month = User.query.filter(
-        User.institution_id == institution_id,
-        User.role == 'student',
-        User.created_at >= this_month
-    ).count()
-    
-    new_docs_this_month = Document.query.filter(
-        Document.owner_id.in_(institution_user_ids),
-        Document.created_at >= this_month
-    ).count()
+    counts = dashboard_stats_service.institution_stats(institution_id) or _live_institution_counts(institution_id)
     
     # Calculate total users
-    total_users = total_students + total_faculty + total_admins
+    total_users = counts['active_students'] + counts['active_faculty'] + counts['active_admins']
     
     return {
         'users': {
             'total': total_users,
-            'students': total_students,
-            'faculty': total_faculty,
-            'admins': total_admins,
-            'totalStudents': total_students,
-            'totalFaculty': total_faculty,
-            'totalAdmins': total_admins,
-            'departments': departments,
-            'activeToday': active_today,
-            'pendingAccounts': pending_accounts,
-            'newStudentsThisMonth': new_students_this_month
+            'students': counts['active_students'],
+            'faculty': counts['active_faculty'],
+            'admins': counts['active_admins'],
+            'totalStudents': counts['active_students'],
+            'totalFaculty': counts['active_faculty'],
+            'totalAdmins': counts['active_admins'],
+            'departments': counts['departments'],
+            'activeToday': counts['active_today'],
+            'pendingAccounts': counts['pending_accounts'],
+            'newStudentsThisMonth': counts['new_students_this_month']
         },
         'documents': {
-            'total': total_documents,
-            'approved': approved_docs,
-            'pending': pending_docs,
-            'rejected': rejected_docs,
-            'newThisMonth': new_docs_this_month
+            'total': counts['active_documents'],
+            'approved': counts['approved_requests'],
+            'pending': counts['pending_requests'],
+            'rejected': counts['rejected_requests'],
+            'newThisMonth': counts['new_documents_this_month']
         },
         'approvals': {
-            'approved': approved_docs,
-            'pending': pending_docs,
-            'rejected': rejected_docs
+            'approved': counts['approved_requests'],
+            'pending': counts['pending_requests'],
+            'rejected': counts['rejected_requests']
         },
         'blockchain': {
-            'totalTransactions': blockchain_txs,
-            'transactions': blockchain_txs,
+            'totalTransactions': counts['confirmed_transactions'],
+            'transactions': counts['confirmed_transactions'],
             'status': 'connected'
         },
         'sharing': {
-            'totalShares': total_shares
+            'totalShares': counts['shares']
         },
         'shares': {
-            'total': total_shares
+            'total': counts['shares']
         }
     }
 
 
 def get_faculty_stats(user_id, institution_id):
     """Get stats for faculty dashboard"""
-    # My documents
-    my_documents = Document.query.filter(
-        Document.owner_id == user_id,
-        Document.is_active == True
-    ).count()
-    
-    # Pending approvals (documents waiting for my approval) - query ApprovalStep
-    pending_approvals = db.session.query(ApprovalStep).join(ApprovalRequest).filter(
-        ApprovalStep.approver_id == user_id,
-        ApprovalStep.has_approved == False,
-        ApprovalStep.has_rejected == False,
-        ApprovalRequest.status == 'PENDING'
-    ).count()
-    
-    # Approved by me - query ApprovalStep
-    approved_by_me = ApprovalStep.query.filter(
-        ApprovalStep.approver_id == user_id,
-        ApprovalStep.has_approved == True
-    ).count()
-    
-    # Rejected by me - query ApprovalStep
-    rejected_by_me = ApprovalStep.query.filter(
-        ApprovalStep.approver_id == user_id,
-        ApprovalStep.has_rejected == True
-    ).count()
+    counts = dashboard_stats_service.user_stats(user_id)
+    if counts is None:
+        counts = _live_user_counts(user_id)
+        # Count students in institution (for faculty)
+        counts['institution_active_students'] = User.query.filter(
+            User.institution_id == institution_id,
+            User.role == 'student',
+            User.status == 'active'
+        ).count()
     
     # Total approvals handled by me
-    total_approvals = approved_by_me + rejected_by_me
-    
-    # My approval requests (as requester)
-    my_pending_requests = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id == user_id,
-        ApprovalRequest.status == 'PENDING'
-    ).count()
-    
-    my_approved_requests = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id == user_id,
-        ApprovalRequest.status == 'APPROVED'
-    ).count()
-    
-    # Documents shared with me
-    shared_with_me = DocumentShare.query.filter(
-        DocumentShare.shared_with_id == user_id
-    ).count()
-    
-    # Documents I shared
-    my_doc_ids = [d.id for d in Document.query.filter_by(owner_id=user_id).all()]
-    shared_by_me = DocumentShare.query.filter(
-        DocumentShare.document_id.in_(my_doc_ids)
-    ).count() if my_doc_ids else 0
-    
-    # Verified on blockchain
-    verified_docs = Document.query.filter(
-        Document.owner_id == user_id,
-        Document.ipfs_hash.isnot(None),
-        Document.is_active == True
-    ).count()
-    
-    # Count students in institution (for faculty)
-    student_count = User.query.filter(
-        User.institution_id == institution_id,
-        User.role == 'student',
-        User.status == 'active'
-    ).count()
-    
-    # Generated documents count (documents generated by faculty, not uploaded)
-    generated_count = Document.query.filter(
-        Document.owner_id == user_id,
-        Document.is_active == True,
-        Document.document_type == 'generated'
-    ).count()
+    total_approvals = counts['approved_by_me'] + counts['rejected_by_me']
     
     return {
         'documents': {
-            'total': my_documents,
-            'myDocuments': my_documents,
-            'shared_with_me': shared_with_me,
-            'verifiedOnBlockchain': verified_docs
+            'total': counts['active_documents'],
+            'myDocuments': counts['active_documents'],
+            'shared_with_me': counts['shared_with_me'],
+            'verifiedOnBlockchain': counts['verified_documents']
         },
         'approvals': {
-            'pending': pending_approvals,
-            'approved': approved_by_me,
-            'rejected': rejected_by_me,
+            'pending': counts['pending_for_me'],
+            'approved': counts['approved_by_me'],
+            'rejected': counts['rejected_by_me'],
             'total': total_approvals,
-            'pendingForMe': pending_approvals,
-            'approvedByMe': approved_by_me,
-            'rejectedByMe': rejected_by_me,
-            'myPendingRequests': my_pending_requests,
-            'myApprovedRequests': my_approved_requests
+            'pendingForMe': counts['pending_for_me'],
+            'approvedByMe': counts['approved_by_me'],
+            'rejectedByMe': counts['rejected_by_me'],
+            'myPendingRequests': counts['pending_requests'],
+            'myApprovedRequests': counts['approved_requests']
         },
         'students': {
-            'count': student_count
+            'count': counts['institution_active_students']
         },
         'generated': {
-            'count': generated_count
+            'count': counts['generated_documents']
         },
         'sharing': {
-            'sharedWithMe': shared_with_me,
-            'sharedByMe': shared_by_me
+            'sharedWithMe': counts['shared_with_me'],
+            'sharedByMe': counts['shared_by_me']
         }
     }
 
 
 def get_student_stats(user_id):
     """Get stats for student dashboard"""
-    # My documents
-    my_documents = Document.query.filter(
-        Document.owner_id == user_id,
-        Document.is_active == True
-    ).count()
-    
-    # Verified on blockchain
-    verified_docs = Document.query.filter(
-        Document.owner_id == user_id,
-        Document.ipfs_hash.isnot(None),
-        Document.is_active == True
-    ).count()
+    counts = dashboard_stats_service.user_stats(user_id) or _live_user_counts(user_id)
     
-    # Generated documents (received certificates, etc.)
-    generated_docs = Document.query.filter(
-        Document.owner_id == user_id,
-        Document.is_active == True,
-        Document.document_type == 'generated'
-    ).count()
-    
-    # My approval requests
-    pending_requests = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id == user_id,
-        ApprovalRequest.status == 'PENDING'
+    return {
+        'documents': {
+            'total': counts['active_documents'],
+            'myDocuments': counts['active_documents'],
+            'shared_with_me': counts['shared_with_me'],
+            'generated': counts['generated_documents'],
+            'verifiedOnBlockchain': counts['verified_documents']
+        },
+        'approvals': {
+            'pending': counts['pending_requests'],
+            'approved': counts['approved_requests'],
+            'rejected': counts['rejected_requests']
+        },
+        'shares': {
+            'count': counts['shared_by_me']
+        },
+        'sharing': {
+            'sharedWithMe': counts['shared_with_me'],
+            'sharedByMe': counts['shared_by_me']
+        }
+    }
+
+
+def _live_institution_counts(institution_id):
+    """
+    Institution counters computed on the fly (rollups disabled or not yet
+    refreshed). Same keys as dashboard_institution_stats; institution
+    membership is a subquery rather than a materialized list of user ids.
+    """
+    today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    this_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    institution_users = select(User.id).where(User.institution_id == institution_id)
+    
+    user_counts = db.session.query(
+        func.count().filter(and_(User.role == 'student', User.status == 'active')),
+        func.count().filter(and_(User.role == 'faculty', User.status == 'active')),
+        func.count().filter(and_(User.role == 'admin', User.status == 'active')),
+        func.count(func.distinct(User.department_id)),
+        func.count().filter(and_(User.last_login >= today_start, User.last_login < today_start + timedelta(days=1))),
+        func.count().filter(User.status == 'pending'),
+        func.count().filter(and_(User.role == 'student', User.created_at >= this_month))
+    ).filter(User.institution_id == institution_id).one()
+    
+    document_counts = db.session.query(
+        func.count().filter(Document.is_active == True),
+        func.count().filter(Document.created_at >= this_month)
+    ).filter(Document.owner_id.in_(institution_users)).one()
+    
+    approval_counts = db.session.query(
+        func.count().filter(ApprovalRequest.status == 'APPROVED'),
+        func.count().filter(ApprovalRequest.status == 'PENDING'),
+        func.count().filter(ApprovalRequest.status == 'REJECTED')
+    ).filter(ApprovalRequest.requester_id.in_(institution_users)).one()
+    
+    confirmed_transactions = BlockchainTransaction.query.filter(
+        BlockchainTransaction.user_id.in_(institution_users),
+        BlockchainTransaction.status == 'confirmed'
     ).count()
     
-    approved_requests = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id == user_id,
-        ApprovalRequest.status == 'APPROVED'
+    shares = DocumentShare.query.join(Document).filter(
+        Document.owner_id.in_(institution_users)
     ).count()
     
-    rejected_requests = ApprovalRequest.query.filter(
-        ApprovalRequest.requester_id == user_id,
-        ApprovalRequest.status == 'REJECTED'
-    ).count()
+    return {
+        'active_students': user_counts[0],
+        'active_faculty': user_counts[1],
+        'active_admins': user_counts[2],
+        'departments': user_counts[3],
+        'active_today': user_counts[4],
+        'pending_accounts': user_counts[5],
+        'new_students_this_month': user_counts[6],
+        'active_documents': document_counts[0],
+        'new_documents_this_month': document_counts[1],
+        'approved_requests': approval_counts[0],
+        'pending_requests': approval_counts[1],
+        'rejected_requests': approval_counts[2],
+        'confirmed_transactions': confirmed_transactions,
+        'shares': shares
+    }
+
+
+def _live_user_counts(user_id):
+    """Per-user counters computed on the fly; same keys as dashboard_user_stats"""
+    document_counts = db.session.query(
+        func.count().filter(Document.is_active == True),
+        func.count().filter(and_(Document.is_active == True, Document.ipfs_hash.isnot(None))),
+        func.count().filter(and_(Document.is_active == True, Document.document_type == 'generated'))
+    ).filter(Document.owner_id == user_id).one()
+    
+    request_counts = db.session.query(
+        func.count().filter(ApprovalRequest.status == 'PENDING'),
+        func.count().filter(ApprovalRequest.status == 'APPROVED'),
+        func.count().filter(ApprovalRequest.status == 'REJECTED')
+    ).filter(ApprovalRequest.requester_id == user_id).one()
+    
+    step_counts = db.session.query(
+        func.count().filter(and_(
+            ApprovalStep.has_approved == False,
+            ApprovalStep.has_rejected == False,
+            ApprovalRequest.status == 'PENDING'
+        )),
+        func.count().filter(ApprovalStep.has_approved == True),
+        func.count().filter(ApprovalStep.has_rejected == True)
+    ).select_from(ApprovalStep).join(
+        ApprovalRequest, ApprovalRequest.id == ApprovalStep.request_id
+    ).filter(ApprovalStep.approver_id == user_id).one()
     
-    # Documents shared with me
     shared_with_me = DocumentShare.query.filter(
         DocumentShare.shared_with_id == user_id
     ).count()
     
-    # Documents I shared
-    my_doc_ids = [d.id for d in Document.query.filter_by(owner_id=user_id).all()]
-    shared_by_me = DocumentShare.query.filter(
-        DocumentShare.document_id.in_(my_doc_ids)
-    ).count() if my_doc_ids else 0
+    shared_by_me = DocumentShare.query.join(Document).filter(
+        Document.owner_id == user_id
+    ).count()
     
     return {
-        'documents': {
-            'total': my_documents,
-            'myDocuments': my_documents,
-            'shared_with_me': shared_with_me,
-            'generated': generated_docs,
-            'verifiedOnBlockchain': verified_docs
-        },
-        'approvals': {
-            'pending': pending_requests,
-            'approved': approved_requests,
-            'rejected': rejected_requests
-        },
-        'shares': {
-            'count': shared_by_me
-        },
-        'sharing': {
-            'sharedWithMe': shared_with_me,
-            'sharedByMe': shared_by_me
-        }
+        'active_documents': document_counts[0],
+        'verified_documents': document_counts[1],
+        'generated_documents': document_counts[2],
+        'pending_requests': request_counts[0],
+        'approved_requests': request_counts[1],
+        'rejected_requests': request_counts[2],
+        'pending_for_me': step_counts[0],
+        'approved_by_me': step_counts[1],
+        'rejected_by_me': step_counts[2],
+        'shared_with_me': shared_with_me,
+        'shared_by_me': shared_by_me
     }
 
 
@@ -398,10 +316,10 @@ def get_recent_activity():
         
         if role == 'admin':
             # Admin sees institution-wide activity
-            institution_user_ids = [u.id for u in User.query.filter_by(institution_id=user.institution_id).all()]
+            institution_users = select(User.id).where(User.institution_id == user.institution_id)
             
             activity_logs = ActivityLog.query.filter(
-                ActivityLog.user_id.in_(institution_user_ids)
+                ActivityLog.user_id.in_(institution_users)
             ).order_by(ActivityLog.created_at.desc()).limit(limit).all()
         else:
             # Regular users see their own activity
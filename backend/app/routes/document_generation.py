@@ -9,6 +9,7 @@ from app.models.user import User
 from app.models.institution import Institution
 from app.models.document_template import DocumentTemplate, GeneratedDocument, generate_request_id
 from app.models.approval import ApprovalRequest, ApprovalStep, ApprovalHistory, generate_verification_code
+from app.performance import invalidate_tags_after_commit
 from datetime import datetime
 import logging
 import uuid
@@ -283,6 +284,7 @@ def generate_document():
                     )
                     
                     db.session.add(file_manager_doc)
+                    invalidate_tags_after_commit(f"user:{user.id}", f"folder:{generated_folder.id}")
                     
                     # Link the file manager document to the generated document
                     doc.pdf_ipfs_hash = f"generated:{file_manager_doc.id}"
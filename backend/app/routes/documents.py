@@ -1,20 +1,162 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from app import db
 from app.models.user import User
-from app.models.document import Document, DocumentShare, DocumentVersion
+from app.models.document import Document, DocumentShare, DocumentVersion, serialize_documents, with_share_count
 from app.models.folder import Folder
 from app.models.blockchain_transaction import BlockchainTransaction
 from app.models.activity_log import log_activity
 from app.routes.auth import token_required
+from app.performance import (
+    cache_response, add_cache_tags, invalidate_tags, encode_keyset_cursor, decode_keyset_cursor
+)
+from app.services.document_search import document_search_service
+from app.services.ipfs_client import ipfs_url
 from flask_jwt_extended import get_jwt_identity
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 import uuid
 
 bp = Blueprint('documents', __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+
+def _encode_cursor(document):
+    """Opaque keyset cursor for the (created_at, id) position of a document"""
+    return encode_keyset_cursor(document.created_at, document.id)
+
+
+def _share_info(share, email, received):
+    """shareInfo of a Received (shared with the user) or Sent (shared by the user) row"""
+    return {
+        'permission': share.permission,
+        'sharedBy' if received else 'sharedWith': email,
+        'sharedAt': share.shared_at.isoformat() if share.shared_at else None,
+        'transactionHash': share.transaction_hash
+    }
+
+
+def _serialize_rows(rows, received=None):
+    """
+    Serialize owned documents, or the (Document, DocumentShare, email) rows
+    of a Received/Sent view (received True/False) with their share info
+    """
+    if received is None:
+        return serialize_documents(rows)
+    
+    # Shared documents can change without touching this user's tag
+    if rows:
+        add_cache_tags(*(f"document:{doc.id}" for doc, _, _ in rows))
+    documents_data = serialize_documents([doc for doc, _, _ in rows])
+    for doc_dict, (doc, share, email) in zip(documents_data, rows):
+        doc_dict['shareInfo'] = _share_info(share, email, received)
+        doc_dict['isShared'] = True
+        doc_dict['permission'] = doc_dict['shareInfo'].get('permission', 'read')
+    return documents_data
+
+
+def _ordered(query, received=None):
+    """Newest first on (created_at, id); owned documents carry their share count"""
+    if received is None:
+        query = with_share_count(query)
+    return query.order_by(None).order_by(Document.created_at.desc(), Document.id.desc())
+
+
+def _keyset_page(query, cursor, limit, received=None):
+    """One page of documents ordered newest first, continuing after cursor"""
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    if cursor:
+        try:
+            created_at, doc_id = decode_keyset_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        query = query.filter(tuple_(Document.created_at, Document.id) < tuple_(created_at, doc_id))
+    
+    # Fetch one extra row to know whether another page exists
+    rows = _ordered(query, received).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    documents_data = _serialize_rows(rows, received)
+    last_document = None
+    if rows:
+        last_document = rows[-1] if received is None else rows[-1][0]
+    
+    return jsonify({
+        'success': True,
+        'documents': documents_data,
+        'nextCursor': _encode_cursor(last_document) if has_more else None,
+        'hasMore': has_more,
+        'message': f'Found {len(documents_data)} documents'
+    }), 200
+
+
+def _stream_documents(query, received=None):
+    """
+    Stream documents as NDJSON (one JSON object per line) straight off a
+    server-side cursor, so memory stays flat regardless of folder size.
+    """
+    query = _ordered(query, received).yield_per(STREAM_BATCH_SIZE)
+    dumps = current_app.json.dumps
+    
+    def generate():
+        batch = []
+        for row in query:
+            batch.append(row)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                for doc_dict in _serialize_rows(batch, received):
+                    yield dumps(doc_dict) + '\n'
+                batch = []
+        for doc_dict in _serialize_rows(batch, received):
+            yield dumps(doc_dict) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def _paged_response(query, received=None):
+    """
+    Opt-in modes that don't materialize the whole listing, or None:
+        ?stream=ndjson          -> streamed NDJSON, one document per line
+        ?limit=N[&cursor=...]   -> keyset pages on (created_at, id)
+    """
+    if request.args.get('stream') == 'ndjson':
+        return _stream_documents(query, received)
+    if request.args.get('limit') or request.args.get('cursor'):
+        return _keyset_page(query, request.args.get('cursor'), request.args.get('limit', type=int), received)
+    return None
+
+
+def latest_shares_query(user_id, received=True):
+    """
+    (Document, DocumentShare, other user's email) rows for the Received
+    (shared WITH user_id) or Sent (shared BY user_id) views, newest documents
+    first. A document shared several times appears once, with its latest
+    share, picked by DISTINCT ON in the database rather than in Python.
+    """
+    user_column = DocumentShare.shared_with_id if received else DocumentShare.shared_by_id
+    other_user_column = DocumentShare.shared_by_id if received else DocumentShare.shared_with_id
+    
+    latest_share_ids = db.session.query(DocumentShare.id).filter(
+        user_column == user_id
+    ).distinct(DocumentShare.document_id).order_by(
+        DocumentShare.document_id,
+        DocumentShare.shared_at.desc().nullslast()
+    ).subquery()
+    
+    return db.session.query(Document, DocumentShare, User.email).join(
+        DocumentShare, Document.id == DocumentShare.document_id
+    ).outerjoin(
+        User, User.id == other_user_column
+    ).filter(
+        DocumentShare.id.in_(db.select(latest_share_ids.c.id)),
+        Document.is_active == True
+    ).order_by(Document.created_at.desc())
+
+
 @bp.route('/', methods=['GET'])
 @token_required
+@cache_response(timeout=60, tags=lambda: [f"folder:{request.args.get('folder_id')}"])
 def list_documents():
     """Get documents for the current user, optionally filtered by folder_id"""
     try:
@@ -40,59 +182,14 @@ def list_documents():
                 elif folder.name == 'Sent' and is_under_shared:
                     is_sent_folder = True
         
-        documents = []
-        share_info_map = {}  # Map document_id to share info
-        
-        # If viewing Shared/Received folder, show documents shared WITH this user
-        if is_received_folder:
-            from app.models.document import DocumentShare
-            # Use distinct to avoid duplicates if document was shared multiple times
-            shared_docs_query = db.session.query(Document, DocumentShare).join(
-                DocumentShare, Document.id == DocumentShare.document_id
-            ).filter(
-                DocumentShare.shared_with_id == current_user_id,
-                Document.is_active == True
-            ).order_by(Document.created_at.desc()).all()
-            
-            # Extract unique documents and build share info map
-            seen_docs = set()
-            for doc, share in shared_docs_query:
-                if doc.id not in seen_docs:
-                    documents.append(doc)
-                    seen_docs.add(doc.id)
-                    # Get shared_by user info
-                    shared_by_user = User.query.get(share.shared_by_id)
-                    share_info_map[str(doc.id)] = {
-                        'permission': share.permission,
-                        'sharedBy': shared_by_user.email if shared_by_user else None,
-                        'sharedAt': share.shared_at.isoformat() if share.shared_at else None,
-                        'transactionHash': share.transaction_hash
-                    }
-        
-        # If viewing Shared/Sent folder, show documents shared BY this user
-        elif is_sent_folder:
-            from app.models.document import DocumentShare
-            sent_docs_query = db.session.query(Document, DocumentShare).join(
-                DocumentShare, Document.id == DocumentShare.document_id
-            ).filter(
-                DocumentShare.shared_by_id == current_user_id,
-                Document.is_active == True
-            ).order_by(Document.created_at.desc()).all()
-            
-            # Extract unique documents and build share info map
-            seen_docs = set()
-            for doc, share in sent_docs_query:
-                if doc.id not in seen_docs:
-                    documents.append(doc)
-                    seen_docs.add(doc.id)
-                    # Get shared_with user info
-                    shared_with_user = User.query.get(share.shared_with_id)
-                    share_info_map[str(doc.id)] = {
-                        'permission': share.permission,
-                        'sharedWith': shared_with_user.email if shared_with_user else None,
-                        'sharedAt': share.shared_at.isoformat() if share.shared_at else None,
-                        'transactionHash': share.transaction_hash
-                    }
+        # Received (shared WITH this user) / Sent (shared BY this user) views
+        if is_received_folder or is_sent_folder:
+            received = is_received_folder
+            query = latest_shares_query(current_user_id, received=received)
+            paged = _paged_response(query, received)
+            if paged is not None:
+                return paged
+            documents_data = _serialize_rows(query.all(), received)
         
         else:
             # Build query for active documents owned by current user
@@ -112,19 +209,12 @@ def list_documents():
                 # If no folder_id specified, show root level documents (folder_id is None)
                 query = query.filter(Document.folder_id.is_(None))
             
-            documents = query.order_by(Document.created_at.desc()).all()
-        
-        # Convert to dict format using model's to_dict() method
-        documents_data = []
-        for doc in documents:
-            doc_dict = doc.to_dict()
-            # Add share info if available (for Received/Sent folders)
-            doc_id_str = str(doc.id)
-            if doc_id_str in share_info_map:
-                doc_dict['shareInfo'] = share_info_map[doc_id_str]
-                doc_dict['isShared'] = True
-                doc_dict['permission'] = share_info_map[doc_id_str].get('permission', 'read')
-            documents_data.append(doc_dict)
+            paged = _paged_response(query)
+            if paged is not None:
+                return paged
+            
+            # Convert to dict format (same shape as to_dict(), one share query per page)
+            documents_data = _serialize_rows(with_share_count(query).order_by(Document.created_at.desc()).all())
         
         return jsonify({
             'success': True,
@@ -139,6 +229,96 @@ def list_documents():
         }), 500
 
 
+def _type_bucket(mime_type):
+    """Quick Access bucket of a MIME type (mirrors getFileTypeFromMime in the file manager)"""
+    mime = (mime_type or '').lower()
+    if any(t in mime for t in ('pdf', 'word', 'doc', 'excel', 'spreadsheet', 'sheet')):
+        return 'documents'
+    if 'image' in mime or any(t in mime for t in ('jpg', 'jpeg', 'png', 'gif', 'svg', 'bmp', 'webp', 'ico')):
+        return 'images'
+    if 'video' in mime or any(t in mime for t in ('mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv', 'mpeg')):
+        return 'videos'
+    if 'audio' in mime or any(t in mime for t in ('mp3', 'wav', 'ogg')):
+        return 'audio'
+    return 'other'
+
+
+@bp.route('/counts', methods=['GET'])
+@token_required
+@cache_response(timeout=60)
+def get_document_counts():
+    """
+    Lightweight document counts for the file manager, computed with
+    aggregate queries instead of listing every document (all=true).
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        
+        # Active documents per folder (None = root) in one grouped query
+        folder_rows = db.session.query(Document.folder_id, func.count(Document.id)).filter(
+            Document.owner_id == current_user_id,
+            Document.is_active == True,
+            Document.is_in_trash == False
+        ).group_by(Document.folder_id).all()
+        by_folder = {str(folder_id): count for folder_id, count in folder_rows if folder_id}
+        
+        starred = db.session.query(func.count(Document.id)).filter(
+            Document.owner_id == current_user_id,
+            Document.is_active == True,
+            Document.is_in_trash == False,
+            Document.is_starred == True
+        ).scalar() or 0
+        
+        # Per MIME type, bucketed the way the file manager's Quick Access cards are
+        type_rows = db.session.query(Document.document_type, func.count(Document.id)).filter(
+            Document.owner_id == current_user_id,
+            Document.is_active == True,
+            Document.is_in_trash == False
+        ).group_by(Document.document_type).all()
+        by_type = {'documents': 0, 'images': 0, 'videos': 0, 'audio': 0, 'other': 0}
+        for mime_type, count in type_rows:
+            by_type[_type_bucket(mime_type)] += count
+        
+        trash = db.session.query(func.count(Document.id)).filter(
+            Document.owner_id == current_user_id,
+            Document.is_in_trash == True
+        ).scalar() or 0
+        
+        received = db.session.query(func.count(func.distinct(DocumentShare.document_id))).join(
+            Document, Document.id == DocumentShare.document_id
+        ).filter(
+            DocumentShare.shared_with_id == current_user_id,
+            Document.is_active == True
+        ).scalar() or 0
+        
+        sent = db.session.query(func.count(func.distinct(DocumentShare.document_id))).join(
+            Document, Document.id == DocumentShare.document_id
+        ).filter(
+            DocumentShare.shared_by_id == current_user_id,
+            Document.is_active == True
+        ).scalar() or 0
+        
+        return jsonify({
+            'success': True,
+            'counts': {
+                'total': sum(count for _, count in folder_rows),
+                'root': next((count for folder_id, count in folder_rows if folder_id is None), 0),
+                'starred': starred,
+                'trash': trash,
+                'received': received,
+                'sent': sent,
+                'byFolder': by_folder,
+                'byType': by_type
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @bp.route('/search', methods=['GET'])
 @token_required
 def search_documents():
@@ -163,72 +343,27 @@ def search_documents():
                 'message': 'Query must be at least 2 characters'
             }), 200
         
-        # Search pattern for ILIKE (case-insensitive)
-        search_pattern = f'%{query}%'
+        # One ranked full-text/trigram query over owned and shared documents
+        documents = document_search_service.search(current_user_id, query, limit)
         
-        from sqlalchemy import or_
-        
-        # Build base query - search user's own documents
-        doc_query = Document.query.filter(
-            Document.owner_id == current_user_id,
-            Document.is_active == True,
-            Document.is_in_trash == False,
-            or_(
-                Document.name.ilike(search_pattern),
-                Document.file_name.ilike(search_pattern),
-                Document.document_type.ilike(search_pattern)
-            )
-        )
-        
-        # Also search in documents shared WITH the current user
-        from app.models.document import DocumentShare
-        shared_doc_ids = db.session.query(DocumentShare.document_id).filter(
-            DocumentShare.shared_with_id == current_user_id
-        ).subquery()
-        
-        shared_docs_query = Document.query.filter(
-            Document.id.in_(shared_doc_ids),
-            Document.is_active == True,
-            Document.is_in_trash == False,
-            or_(
-                Document.name.ilike(search_pattern),
-                Document.file_name.ilike(search_pattern),
-                Document.document_type.ilike(search_pattern)
-            )
-        )
-        
-        # Combine queries using union
-        combined_query = doc_query.union(shared_docs_query).limit(limit)
-        documents = combined_query.all()
+        # Owners of shared results, fetched together
+        owner_ids = {doc.owner_id for doc in documents if str(doc.owner_id) != str(current_user_id)}
+        owners = {owner.id: owner for owner in User.query.filter(User.id.in_(owner_ids)).all()} if owner_ids else {}
         
         # Format documents with folder path info
+        # All breadcrumbs come from the materialized folder ancestry in one query
+        breadcrumbs = Folder.breadcrumbs_for(doc.folder_id for doc in documents)
+        
         documents_data = []
-        for doc in documents:
-            doc_dict = doc.to_dict()
-            
+        for doc, doc_dict in zip(documents, serialize_documents(documents)):
             # Add name field explicitly for frontend compatibility
             doc_dict['name'] = doc.name or doc.file_name
             doc_dict['filename'] = doc.file_name
             doc_dict['folder_name'] = None
             
             # Get folder path for navigation
-            folder_path = []
-            folder_name = None
-            if doc.folder_id:
-                folder = Folder.query.get(doc.folder_id)
-                if folder:
-                    folder_name = folder.name
-                    # Build full path
-                    current_folder = folder
-                    while current_folder:
-                        folder_path.insert(0, {
-                            'id': str(current_folder.id),
-                            'name': current_folder.name
-                        })
-                        if current_folder.parent_id:
-                            current_folder = Folder.query.get(current_folder.parent_id)
-                        else:
-                            current_folder = None
+            folder_path = breadcrumbs.get(str(doc.folder_id), []) if doc.folder_id else []
+            folder_name = folder_path[-1]['name'] if folder_path else None
             
             # Determine if it's a shared document
             is_shared = str(doc.owner_id) != str(current_user_id)
@@ -240,7 +375,7 @@ def search_documents():
             
             # Get owner info for shared documents
             if is_shared:
-                owner = User.query.get(doc.owner_id)
+                owner = owners.get(doc.owner_id)
                 if owner:
                     doc_dict['ownerName'] = f"{owner.first_name} {owner.last_name}"
                     doc_dict['ownerEmail'] = owner.email
@@ -315,6 +450,8 @@ def upload_document():
                 folder.updated_at = datetime.utcnow()
                 db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"folder:{document.folder_id}")
+        
         # Log the upload activity
         log_activity(
             user_id=current_user_id,
@@ -416,6 +553,8 @@ def delete_document(document_id):
                 folder.updated_at = datetime.utcnow()
                 db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"document:{document_id}", f"folder:{folder_id}")
+        
         return jsonify({
             'success': True,
             'message': 'Document moved to trash successfully'
@@ -539,6 +678,7 @@ def update_document(document_id):
             db.session.commit()
         
         # If this is a content update, update ALL copies (all documents with same blockchain document_id)
+        all_copies = []
         if is_content_update and blockchain_document_id:
             # Find all documents (copies) with the same blockchain document_id
             # Note: document.id is UUID, document_id parameter is string
@@ -577,6 +717,15 @@ def update_document(document_id):
         
         db.session.commit()
         
+        invalidate_tags(
+            f"user:{document.owner_id}",
+            f"user:{current_user_id}",
+            f"document:{document.id}",
+            f"folder:{old_folder_id}",
+            f"folder:{document.folder_id}",
+            *[f"document:{copy.id}" for copy in all_copies]
+        )
+        
         # Record blockchain transaction for monitoring (if transaction_hash is provided)
         if data.get('transaction_hash'):
             try:
@@ -624,14 +773,14 @@ def get_trash_documents():
         current_user_id = get_jwt_identity()
         
         # Get all trashed documents
-        trashed_docs = Document.query.filter_by(
+        trashed_docs = with_share_count(Document.query.filter_by(
             owner_id=current_user_id,
             is_in_trash=True
-        ).order_by(Document.trash_date.desc()).all()
+        )).order_by(Document.trash_date.desc()).all()
         
         return jsonify({
             'success': True,
-            'documents': [doc.to_dict() for doc in trashed_docs]
+            'documents': serialize_documents(trashed_docs)
         }), 200
         
     except Exception as e:
@@ -694,6 +843,8 @@ def copy_document(document_id):
                 folder.updated_at = datetime.utcnow()
                 db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"folder:{new_document.folder_id}")
+        
         return jsonify({
             'success': True,
             'message': 'Document reference created successfully (same blockchain file, different folder)',
@@ -732,6 +883,8 @@ def toggle_star_document(document_id):
         document.updated_at = datetime.utcnow()
         db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"document:{document.id}")
+        
         return jsonify({
             'success': True,
             'isStarred': document.is_starred,
@@ -753,14 +906,14 @@ def list_starred_documents():
         current_user_id = get_jwt_identity()
         
         # Query for starred documents
-        documents = Document.query.filter_by(
+        documents = with_share_count(Document.query.filter_by(
             owner_id=current_user_id,
             is_active=True,
             is_in_trash=False,
             is_starred=True
-        ).order_by(Document.updated_at.desc()).all()
+        )).order_by(Document.updated_at.desc()).all()
         
-        documents_data = [doc.to_dict() for doc in documents]
+        documents_data = serialize_documents(documents)
         
         return jsonify({
             'success': True,
@@ -827,7 +980,7 @@ def get_document_versions(document_id):
                 'transactionId': document.transaction_hash,
                 'description': 'Current version',
                 'createdAt': document.created_at.isoformat() if document.created_at else None,
-                'ipfsUrl': f"https://gateway.pinata.cloud/ipfs/{document.ipfs_hash}",
+                'ipfsUrl': ipfs_url(document.ipfs_hash),
                 'isCurrent': True
             }
             
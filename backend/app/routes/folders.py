@@ -4,6 +4,7 @@ from app.models.user import User
 from app.models.folder import Folder
 from app.models.activity_log import log_activity
 from app.routes.auth import token_required
+from app.performance import cache_response, invalidate_tags
 from flask_jwt_extended import get_jwt_identity
 from datetime import datetime
 import uuid
@@ -116,6 +117,8 @@ def create_folder_flexible():
                 parent_folder.updated_at = datetime.utcnow()
                 db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"folder:{parent_id}")
+        
         # Use safe folder dict creation
         try:
             folder_dict = new_folder.to_dict()
@@ -200,6 +203,7 @@ def test_folders():
 
 @bp.route('/', methods=['GET'])
 @token_required
+@cache_response(timeout=60, tags=lambda: [f"folder:{request.args.get('parent_id')}"])
 def list_folders_flexible():
     """Get folders for the current user"""
     try:
@@ -333,6 +337,13 @@ def update_folder(folder_id):
                             'error': 'New parent folder not found'
                         }), 404
                     
+                    # A folder cannot be moved into itself or one of its descendants
+                    if folder.id in new_parent.get_ancestor_ids():
+                        return jsonify({
+                            'success': False,
+                            'error': 'Cannot move a folder into itself or its subfolders'
+                        }), 400
+                    
                     folder.parent_id = new_parent_id
                     folder.path = f"{new_parent.path}/{folder.name}"
                     folder.level = new_parent.level + 1
@@ -342,6 +353,10 @@ def update_folder(folder_id):
                     folder.path = f"/{folder.name}"
                     folder.level = 0
         
+        # Keep paths, levels and materialized ancestry of the subtree in sync
+        if 'name' in data or 'parent_id' in data:
+            folder.update_children_paths()
+        
         folder.updated_at = datetime.utcnow()
         db.session.commit()
         
@@ -359,6 +374,13 @@ def update_folder(folder_id):
         
         db.session.commit()
         
+        invalidate_tags(
+            f"user:{current_user_id}",
+            f"folder:{folder.id}",
+            f"folder:{old_parent_id}",
+            f"folder:{folder.parent_id}"
+        )
+        
         return jsonify({
             'success': True,
             'message': 'Folder updated successfully',
@@ -414,6 +436,8 @@ def delete_folder(folder_id):
                 parent_folder.updated_at = datetime.utcnow()
                 db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"folder:{folder.id}", f"folder:{parent_id}")
+        
         return jsonify({
             'success': True,
             'message': f'Folder "{folder.name}" deleted successfully!'
@@ -475,6 +499,8 @@ def toggle_star_folder(folder_id):
         folder.updated_at = datetime.utcnow()
         db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"folder:{folder.id}")
+        
         return jsonify({
             'success': True,
             'isStarred': folder.is_starred,
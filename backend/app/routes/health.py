@@ -3,7 +3,7 @@ Health Check Routes for DocuChain
 Monitors critical services including email connectivity
 """
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, current_app
 import socket
 import requests
 import os
@@ -122,6 +122,88 @@ def detailed_health_check():
     }), 200 if overall_healthy else 503
 
 
+@bp.route('/cache', methods=['GET'])
+def cache_health_check():
+    """Response cache statistics (fleet-wide when the Redis backend is active)"""
+    from app.performance import cache_stats
+    stats = cache_stats()
+    lookups = stats.get('hits', 0) + stats.get('misses', 0)
+    stats['hitRate'] = round(stats.get('hits', 0) / lookups, 4) if lookups else None
+    return jsonify({
+        'status': 'unhealthy' if 'error' in stats else 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'cache': stats
+    }), 200
+
+
+@bp.route('/presence', methods=['GET'])
+def presence_health_check():
+    """WebSocket connection registry statistics"""
+    from app.presence import presence_stats
+    try:
+        stats = presence_stats()
+        status = 'healthy'
+    except Exception as e:
+        stats = {'error': str(e)}
+        status = 'unhealthy'
+    return jsonify({
+        'status': status,
+        'timestamp': datetime.utcnow().isoformat(),
+        'presence': stats
+    }), 200
+
+
+@bp.route('/activity-log', methods=['GET'])
+def activity_log_health_check():
+    """Buffered activity log writer: queue depth, backpressure and drops"""
+    from app.services.activity_log_writer import activity_log_writer
+    stats = activity_log_writer.get_stats()
+    if stats['dropped']:
+        status = 'degraded'
+    elif stats['depth'] >= stats['capacity']:
+        status = 'saturated'
+    else:
+        status = 'healthy'
+    
+    partitions = None
+    if current_app.config.get('ACTIVITY_LOG_PARTITIONING'):
+        from app.services.activity_log_partitions import activity_log_partitions
+        try:
+            partitions = [{
+                'name': p['name'],
+                'from': p['lower'].isoformat() if p['lower'] else None,
+                'to': p['upper'].isoformat() if p['upper'] else None,
+                'default': p['default'],
+                'estimatedRows': p['estimated_rows']
+            } for p in activity_log_partitions.list_partitions()]
+        except Exception as e:
+            partitions = {'error': str(e)}
+    
+    return jsonify({
+        'status': status,
+        'timestamp': datetime.utcnow().isoformat(),
+        'activity_log': stats,
+        'partitions': partitions
+    }), 200
+
+
+@bp.route('/ipfs-cache', methods=['GET'])
+def ipfs_cache_health_check():
+    """Local IPFS blob cache (hit rate, size, evictions) and IPFS client retries/failures"""
+    from app.services.ipfs_cache import ipfs_blob_cache
+    from app.services.ipfs_client import ipfs_client
+    stats = ipfs_blob_cache.get_stats()
+    lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+    stats['hit_rate'] = round((stats['hits'] + stats['coalesced']) / lookups, 3) if lookups else None
+    
+    return jsonify({
+        'status': 'healthy' if stats['enabled'] else 'disabled',
+        'timestamp': datetime.utcnow().isoformat(),
+        'ipfs_cache': stats,
+        'ipfs_client': ipfs_client.get_stats()
+    }), 200
+
+
 @bp.route('/email', methods=['GET'])
 def email_health_check():
     """Specific email service health check"""
@@ -4,6 +4,7 @@ from app import db
 from app.models.institution import Institution
 from app.models.user import User
 from app.routes.auth import token_required
+from app.services.auto_group_service import auto_group_service
 from sqlalchemy import text
 from werkzeug.security import generate_password_hash
 
@@ -205,6 +206,9 @@ def create_institution_with_admin():
         db.session.add(admin_user)
         db.session.commit()
         
+        # Create the institution's "All Members" group in the background
+        auto_group_service.schedule_sync(user_ids=[admin_user.id])
+        
         return jsonify({
             'success': True,
             'message': 'Institution and admin account created successfully. Awaiting approval.',
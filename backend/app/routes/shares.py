@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models.document import Document, DocumentShare
+from app.models.document import Document, DocumentShare, serialize_documents, adjust_share_count
 from app.models.user import User
 from app.models.folder import Folder
 from app.models.blockchain_transaction import BlockchainTransaction
 from app.models.activity_log import log_activity
-from app.models.notification import create_notification
+from app.services.notification_fanout import notification_fanout
+from app.performance import cache_response, add_cache_tags, invalidate_tags
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from sqlalchemy import or_
@@ -80,6 +81,8 @@ def share_document(document_id):
             }), 400
         
         shares_created = []
+        new_share_count = 0
+        notified_user_ids = []
         
         # NOTE: We do NOT move the document - it stays in its original folder
         # The Sent/Received folders will show documents by querying DocumentShare table
@@ -116,6 +119,7 @@ def share_document(document_id):
                     block_number=block_number
                 )
                 db.session.add(new_share)
+                new_share_count += 1
                 
                 # Send auto-generated chat message with blockchain info
                 send_share_chat_message(
@@ -127,23 +131,7 @@ def share_document(document_id):
                     block_number=block_number
                 )
                 
-                # Create notification for recipient
-                sender = User.query.get(current_user_id)
-                sender_name = f"{sender.first_name} {sender.last_name}" if sender else "Someone"
-                create_notification(
-                    user_id=user_id,
-                    notification_type='document_shared',
-                    title='Document Shared with You',
-                    message=f'{sender_name} shared "{document.name}" with you',
-                    sender_id=current_user_id,
-                    sender_name=sender_name,
-                    extra_data={
-                        'document_id': str(document.id),
-                        'document_name': document.name,
-                        'shared_by': current_user_id,
-                        'permission': permission
-                    }
-                )
+                notified_user_ids.append(user_id)
                 
                 # Move document to "Received" folder for recipient
                 received_folder = Folder.query.filter_by(
@@ -163,8 +151,34 @@ def share_document(document_id):
                 'permission': permission
             })
         
+        adjust_share_count(document.id, new_share_count)
         db.session.commit()
         
+        # One fan-out event notifies every new recipient
+        if notified_user_ids:
+            sender = User.query.get(current_user_id)
+            sender_name = f"{sender.first_name} {sender.last_name}" if sender else "Someone"
+            notification_fanout.publish(
+                user_ids=notified_user_ids,
+                notification_type='document_shared',
+                title='Document Shared with You',
+                message=f'{sender_name} shared "{document.name}" with you',
+                sender_id=current_user_id,
+                sender_name=sender_name,
+                extra_data={
+                    'document_id': str(document.id),
+                    'document_name': document.name,
+                    'shared_by': current_user_id,
+                    'permission': permission
+                }
+            )
+        
+        invalidate_tags(
+            f"user:{current_user_id}",
+            f"document:{document.id}",
+            *[f"user:{s['user_id']}" for s in shares_created]
+        )
+        
         # Log the share activity
         recipient_names = [s['username'] for s in shares_created]
         log_activity(
@@ -292,37 +306,37 @@ def get_document_shares(document_id):
 
 @bp.route('/shared-with-me', methods=['GET'])
 @token_required
+@cache_response(timeout=60)
 def get_shared_with_me():
     """Get all documents shared with the current user"""
     try:
         current_user_id = get_jwt_identity()
         
-        # Get all shares where user is recipient
-        shares = DocumentShare.query.filter_by(
-            shared_with_id=current_user_id
+        # Get all shares where user is recipient, with the document and the
+        # user who shared it (not necessarily the owner) in the same query
+        rows = db.session.query(DocumentShare, Document, User).join(
+            Document, Document.id == DocumentShare.document_id
+        ).outerjoin(
+            User, User.id == DocumentShare.shared_by_id
+        ).filter(
+            DocumentShare.shared_with_id == current_user_id,
+            Document.is_active == True
         ).all()
         
+        documents_data = serialize_documents([document for _, document, _ in rows])
+        
         shared_documents = []
-        for share in shares:
-            document = Document.query.filter_by(
-                id=share.document_id,
-                is_active=True
-            ).first()
+        for (share, document, shared_by_user), doc_data in zip(rows, documents_data):
+            doc_data['shared_by'] = {
+                'id': str(share.shared_by_id),
+                'username': f"{shared_by_user.first_name} {shared_by_user.last_name}" if shared_by_user else 'Unknown',
+                'email': shared_by_user.email if shared_by_user else ''
+            }
+            doc_data['permission'] = share.permission
+            doc_data['shared_at'] = share.shared_at.isoformat() if share.shared_at else None
             
-            if document:
-                # Get the user who shared (not necessarily the owner)
-                shared_by_user = User.query.get(share.shared_by_id)
-                
-                doc_data = document.to_dict()
-                doc_data['shared_by'] = {
-                    'id': str(share.shared_by_id),
-                    'username': f"{shared_by_user.first_name} {shared_by_user.last_name}" if shared_by_user else 'Unknown',
-                    'email': shared_by_user.email if shared_by_user else ''
-                }
-                doc_data['permission'] = share.permission
-                doc_data['shared_at'] = share.shared_at.isoformat() if share.shared_at else None
-                
-                shared_documents.append(doc_data)
+            shared_documents.append(doc_data)
+            add_cache_tags(f"document:{document.id}")
         
         return jsonify({
             'success': True,
@@ -370,8 +384,11 @@ def revoke_share(document_id, user_id):
             }), 404
         
         db.session.delete(share)
+        adjust_share_count(document.id, -1)
         db.session.commit()
         
+        invalidate_tags(f"user:{current_user_id}", f"user:{user_id}", f"document:{document.id}")
+        
         return jsonify({
             'success': True,
             'message': 'Share revoked successfully'
@@ -6,6 +6,9 @@ from app.models.institution import Department, Section
 from app.models.chat import Conversation, ConversationMember
 from app.models.activity_log import log_activity
 from app.routes.auth import token_required
+from app.services.auto_group_service import auto_group_service
+from app.websocket_events import invalidate_membership
+from app.exports import ExportColumn, select_columns, stream_csv_response, format_datetime
 from werkzeug.exceptions import BadRequest
 from datetime import datetime, timedelta
 import logging
@@ -651,6 +654,7 @@ def admin_update_user(user_id):
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
         department_changed = False
+        role_changed = False
         old_department_name = None
         new_department_name = None
         
@@ -671,6 +675,7 @@ def admin_update_user(user_id):
                 ).count()
                 if admin_count == 0:
                     return jsonify({'success': False, 'error': 'Cannot demote the last admin'}), 400
+            role_changed = user.role != data['role']
             user.role = data['role']
         
         # Handle department change
@@ -706,30 +711,6 @@ def admin_update_user(user_id):
                 if new_dept_id:
                     new_dept = Department.query.get(new_dept_id)
                     new_department_name = new_dept.name if new_dept else None
-                    
-                    # Add user to new department group immediately
-                    new_dept_group = Conversation.query.filter_by(
-                        type='group',
-                        is_auto_created=True,
-                        auto_type='department',
-                        linked_id=new_dept_id
-                    ).first()
-                    
-                    if new_dept_group:
-                        # Check if not already a member
-                        existing_member = ConversationMember.query.filter_by(
-                            conversation_id=new_dept_group.id,
-                            user_id=user.id
-                        ).first()
-                        
-                        if not existing_member:
-                            new_member = ConversationMember(
-                                conversation_id=new_dept_group.id,
-                                user_id=user.id,
-                                role='admin' if user.role in ['admin', 'faculty'] else 'member'
-                            )
-                            db.session.add(new_member)
-                            logger.info(f"User {user.email} added to new department group: {new_dept.name}")
                 
                 department_changed = True
                 logger.info(f"User {user.email} department changed from {old_department_name} to {new_department_name}")
@@ -758,6 +739,10 @@ def admin_update_user(user_id):
         db.session.commit()
         logger.info(f"Admin {current_user.email} updated user {user.email}")
         
+        # Join the new department group / admin groups in the background
+        if role_changed or department_changed:
+            auto_group_service.schedule_sync(user_ids=[user.id])
+        
         # Get updated department and section names for response
         department_name = None
         section_name = None
@@ -834,6 +819,10 @@ def admin_update_user_status(user_id):
         user.status = new_status
         db.session.commit()
         
+        # Newly approved users join their institution/department groups
+        if new_status == 'active' and old_status != 'active':
+            auto_group_service.schedule_sync(user_ids=[user.id])
+        
         logger.info(f"Admin {current_user.email} changed user {user.email} status from {old_status} to {new_status}")
         
         return jsonify({
@@ -899,11 +888,31 @@ def admin_delete_user(user_id):
         return jsonify({'success': False, 'error': 'Failed to delete user'}), 500
 
 
+USER_EXPORT_COLUMNS = [
+    ExportColumn('id', 'id', lambda row: str(row.id)),
+    ExportColumn('email', 'email', lambda row: row.email),
+    ExportColumn('firstName', 'firstName', lambda row: row.first_name),
+    ExportColumn('lastName', 'lastName', lambda row: row.last_name),
+    ExportColumn('fullName', 'fullName', lambda row: f"{row.first_name} {row.last_name}"),
+    ExportColumn('uniqueId', 'uniqueId', lambda row: row.unique_id or ''),
+    ExportColumn('role', 'role', lambda row: row.role),
+    ExportColumn('status', 'status', lambda row: row.status or 'active'),
+    ExportColumn('phone', 'phone', lambda row: row.phone or ''),
+    ExportColumn('department', 'department', lambda row: row.department_name or ''),
+    ExportColumn('section', 'section', lambda row: row.section_name or ''),
+    ExportColumn('createdAt', 'createdAt', lambda row: format_datetime(row.created_at))
+]
+
+
 @bp.route('/admin/export', methods=['GET'])
 @token_required
 @admin_required
 def admin_export_users():
-    """Export users data - admin only"""
+    """
+    Export users data - admin only
+    ?format=csv streams a CSV download (optional ?columns=... and ?gzip=true);
+    the default returns JSON
+    """
     try:
         current_user_id = get_jwt_identity()
         current_user = User.query.get(current_user_id)
@@ -935,59 +944,41 @@ def admin_export_users():
                 )
             )
         
-        users = query.order_by(User.created_at.desc()).all()
-        
-        # Format data for export
-        export_data = []
-        for user in users:
-            # Get department and section names
-            department_name = None
-            section_name = None
-            if user.department_id:
-                dept = Department.query.get(user.department_id)
-                department_name = dept.name if dept else None
-            if user.section_id:
-                sect = Section.query.get(user.section_id)
-                section_name = sect.name if sect else None
-                
-            export_data.append({
-                'id': str(user.id),
-                'email': user.email,
-                'firstName': user.first_name,
-                'lastName': user.last_name,
-                'fullName': f"{user.first_name} {user.last_name}",
-                'uniqueId': user.unique_id or '',
-                'role': user.role,
-                'status': user.status or 'active',
-                'phone': user.phone or '',
-                'department': department_name or '',
-                'section': section_name or '',
-                'createdAt': user.created_at.strftime('%Y-%m-%d %H:%M:%S') if user.created_at else ''
-            })
+        # Department/section names come from one joined query instead of
+        # two lookups per user
+        query = query.outerjoin(
+            Department, Department.id == User.department_id
+        ).outerjoin(
+            Section, Section.id == User.section_id
+        ).with_entities(
+            User.id,
+            User.email,
+            User.first_name,
+            User.last_name,
+            User.unique_id,
+            User.role,
+            User.status,
+            User.phone,
+            User.created_at,
+            Department.name.label('department_name'),
+            Section.name.label('section_name')
+        ).order_by(User.created_at.desc())
         
         if format_type == 'csv':
-            import io
-            import csv
-            
-            output = io.StringIO()
-            if export_data:
-                writer = csv.DictWriter(output, fieldnames=export_data[0].keys())
-                writer.writeheader()
-                writer.writerows(export_data)
-            
-            return jsonify({
-                'success': True,
-                'format': 'csv',
-                'data': output.getvalue(),
-                'count': len(export_data)
-            }), 200
-        else:
-            return jsonify({
-                'success': True,
-                'format': 'json',
-                'data': export_data,
-                'count': len(export_data)
-            }), 200
+            columns = select_columns(USER_EXPORT_COLUMNS)
+            filename = f'users_export_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}'
+            return stream_csv_response(query, columns, filename)
+        
+        export_data = [
+            {column.key: column.value(row) for column in USER_EXPORT_COLUMNS}
+            for row in query.all()
+        ]
+        return jsonify({
+            'success': True,
+            'format': 'json',
+            'data': export_data,
+            'count': len(export_data)
+        }), 200
         
     except Exception as e:
         logger.error(f"Error exporting users: {str(e)}")
@@ -1016,6 +1007,7 @@ def cleanup_department_transitions():
         ).all()
         
         cleanup_count = 0
+        removed_user_ids = []
         for user in users_to_cleanup:
             old_dept_id = user.previous_department_id
             
@@ -1038,12 +1030,14 @@ def cleanup_department_transitions():
                     db.session.delete(member)
                     logger.info(f"Removed user {user.email} from old department group")
                     cleanup_count += 1
+                    removed_user_ids.append(user.id)
             
             # Clear the transition tracking fields
             user.previous_department_id = None
             user.department_changed_at = None
         
         db.session.commit()
+        invalidate_membership(*removed_user_ids)
         
         return jsonify({
             'success': True,
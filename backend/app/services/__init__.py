@@ -1,5 +1,24 @@
 # Services package
 from app.services.pdf_stamping import PDFStampingService, pdf_stamping_service
 from app.services.approval_folder_service import ApprovalFolderService, approval_folder_service
+from app.services.document_search import DocumentSearchService, document_search_service
+from app.services.auto_group_service import AutoGroupService, auto_group_service
+from app.services.notification_fanout import NotificationFanoutService, notification_fanout
+from app.services.activity_log_writer import ActivityLogWriter, activity_log_writer
+from app.services.activity_log_partitions import ActivityLogPartitionService, activity_log_partitions
+from app.services.dashboard_stats import DashboardStatsService, dashboard_stats_service
+from app.services.unread_reconciler import UnreadCounterReconciler, unread_reconciler
+from app.services.stamp_queue import StampJobQueue, stamp_job_queue
+from app.services.stamp_engine import PDFStampEngine, stamp_engine
+from app.services.ipfs_client import IPFSClient, ipfs_client
+from app.services.ipfs_cache import IPFSBlobCache, ipfs_blob_cache
+from app.services.verification_extractor import VerificationCodeExtractor, verification_extractor
 
-__all__ = ['PDFStampingService', 'pdf_stamping_service', 'ApprovalFolderService', 'approval_folder_service']
\ No newline at end of file
+__all__ = ['PDFStampingService', 'pdf_stamping_service', 'ApprovalFolderService', 'approval_folder_service',
+           'DocumentSearchService', 'document_search_service', 'AutoGroupService', 'auto_group_service',
+           'NotificationFanoutService', 'notification_fanout', 'ActivityLogWriter', 'activity_log_writer',
+           'ActivityLogPartitionService', 'activity_log_partitions', 'DashboardStatsService', 'dashboard_stats_service',
+           'UnreadCounterReconciler', 'unread_reconciler',
+           'StampJobQueue', 'stamp_job_queue', 'PDFStampEngine', 'stamp_engine',
+           'IPFSClient', 'ipfs_client', 'IPFSBlobCache', 'ipfs_blob_cache',
+           'VerificationCodeExtractor', 'verification_extractor']
\ No newline at end of file
@@ -0,0 +1,312 @@
+"""
+Activity Log Partition Service
+Manages the monthly partitions of activity_logs (see
+database/partition_activity_logs.sql):
+- hot: attached monthly partitions, created a few months ahead
+- detached: partitions older than the retention window, no longer scanned
+  by queries on activity_logs but still in the database
+- archived: detached partitions exported to gzip-compressed CSV files
+  (with a JSON manifest) and then dropped
+
+Maintenance runs in a background task per worker; a Postgres advisory lock
+makes sure only one worker does the work at a time.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import text
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+PARENT_TABLE = 'activity_logs'
+PARTITION_PREFIX = 'activity_logs_p'
+MANAGED_TABLE_PATTERN = re.compile(r'^activity_logs_(p\d{4}_\d{2}|legacy)$')
+MAINTENANCE_LOCK_SQL = "hashtext('docuchain:activity_log_partitions')"
+MAINTENANCE_INTERVAL = 6 * 3600  # seconds between maintenance runs
+
+LIST_PARTITIONS_SQL = text("""
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound, c.reltuples::bigint
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = :parent
+    ORDER BY c.relname
+""")
+
+LIST_DETACHED_SQL = text("""
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema()
+      AND c.relkind = 'r'
+      AND c.relname LIKE 'activity\\_logs\\_%'
+      AND NOT c.relispartition
+    ORDER BY c.relname
+""")
+
+_BOUND_PATTERN = re.compile(r"FROM \((MINVALUE|'[^']+')\) TO \((MAXVALUE|'[^']+')\)")
+
+
+def month_start(value, offset=0):
+    """First day of the month `offset` months after value's month"""
+    month_index = value.year * 12 + (value.month - 1) + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+def _parse_bound(bound):
+    """(lower, upper) datetimes from a partition bound; None for MINVALUE/MAXVALUE/DEFAULT"""
+    match = _BOUND_PATTERN.search(bound or '')
+    if not match:
+        return None, None
+
+    def parse(value):
+        if value in ('MINVALUE', 'MAXVALUE'):
+            return None
+        return datetime.fromisoformat(value.strip("'"))
+    return parse(match.group(1)), parse(match.group(2))
+
+
+class ActivityLogPartitionService:
+    """Create-ahead, detach and archive jobs for the partitioned activity log"""
+
+    def __init__(self):
+        self._maintenance_pid = None
+
+    def is_partitioned(self):
+        relkind = db.session.execute(
+            text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+            {'name': PARENT_TABLE}
+        ).scalar()
+        return relkind == 'p'
+
+    def list_partitions(self):
+        """Attached partitions with their bounds and estimated row counts"""
+        partitions = []
+        for name, bound, estimated_rows in db.session.execute(LIST_PARTITIONS_SQL, {'parent': PARENT_TABLE}):
+            lower, upper = _parse_bound(bound)
+            partitions.append({
+                'name': name,
+                'lower': lower,
+                'upper': upper,
+                'default': bound == 'DEFAULT',
+                'estimated_rows': max(estimated_rows, 0)
+            })
+        return partitions
+
+    def ensure_partitions(self, months_ahead=3):
+        """
+        Create monthly partitions from the current month to months_ahead
+        months ahead. Rows that already landed in the default partition for a
+        new month are moved into it, since Postgres refuses to create a
+        partition whose range the default partition already holds.
+
+        Returns:
+            Names of the partitions created
+        """
+        existing = {p['name'] for p in self.list_partitions()}
+        today = datetime.utcnow().date()
+        created = []
+        for offset in range(months_ahead + 1):
+            lower = month_start(today, offset)
+            upper = month_start(today, offset + 1)
+            name = partition_name(lower)
+            if name in existing:
+                continue
+            params = {'lower': lower, 'upper': upper}
+            try:
+                db.session.execute(text(
+                    f'CREATE TABLE "{name}" (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+                ))
+                db.session.execute(text(f"""
+                    WITH moved AS (
+                        DELETE FROM {PARENT_TABLE}_default
+                        WHERE created_at >= :lower AND created_at < :upper
+                        RETURNING *
+                    )
+                    INSERT INTO "{name}" SELECT * FROM moved
+                """), params)
+                db.session.execute(text(
+                    f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION "{name}" '
+                    f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+                ))
+                db.session.commit()
+                created.append(name)
+            except Exception:
+                db.session.rollback()
+                raise
+        return created
+
+    def detach_old_partitions(self, retain_months=12):
+        """
+        Detach partitions that end before the retention window. Their rows
+        stay in the database (as plain tables) until archived.
+
+        Returns:
+            Names of the partitions detached
+        """
+        cutoff = datetime.combine(month_start(datetime.utcnow().date(), -retain_months), datetime.min.time())
+        detached = []
+        for partition in self.list_partitions():
+            upper = partition['upper']
+            if partition['default'] or upper is None or upper > cutoff:
+                continue
+            if not MANAGED_TABLE_PATTERN.match(partition['name']):
+                continue
+            try:
+                db.session.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{partition["name"]}"'))
+                db.session.commit()
+                detached.append(partition['name'])
+            except Exception:
+                db.session.rollback()
+                raise
+        return detached
+
+    def archive_detached_partitions(self, archive_dir):
+        """
+        Export every detached partition to <archive_dir>/<name>.csv.gz plus a
+        <name>.manifest.json (row count, SHA-256, time range), then drop it.
+        A table is only dropped once its file is complete and its row count
+        matches the table.
+
+        Returns:
+            List of manifests for the archived partitions
+        """
+        os.makedirs(archive_dir, exist_ok=True)
+        names = [row[0] for row in db.session.execute(LIST_DETACHED_SQL)]
+        db.session.commit()
+        archived = []
+        for name in names:
+            if not MANAGED_TABLE_PATTERN.match(name):
+                continue
+            archived.append(self._archive_table(name, archive_dir))
+        return archived
+
+    def _archive_table(self, name, archive_dir):
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        tmp_path = f"{path}.tmp"
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f'SELECT count(*), min(created_at), max(created_at) FROM "{name}"')
+            row_count, first_at, last_at = cursor.fetchone()
+
+            with open(tmp_path, 'wb') as raw_file:
+                with gzip.GzipFile(filename=f"{name}.csv", mode='wb', fileobj=raw_file) as gz:
+                    cursor.copy_expert(
+                        f'COPY (SELECT * FROM "{name}" ORDER BY created_at, id) TO STDOUT WITH (FORMAT csv, HEADER)',
+                        gz
+                    )
+                    copied = cursor.rowcount
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+
+            if copied not in (-1, row_count):
+                raise RuntimeError(f"Archive of {name} copied {copied} rows, expected {row_count}")
+
+            digest = hashlib.sha256()
+            with open(tmp_path, 'rb') as archived_file:
+                for chunk in iter(lambda: archived_file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            os.replace(tmp_path, path)
+
+            manifest = {
+                'table': name,
+                'file': os.path.basename(path),
+                'rows': row_count,
+                'sha256': digest.hexdigest(),
+                'firstCreatedAt': first_at.isoformat() if first_at else None,
+                'lastCreatedAt': last_at.isoformat() if last_at else None,
+                'archivedAt': datetime.utcnow().isoformat() + 'Z'
+            }
+            with open(os.path.join(archive_dir, f"{name}.manifest.json"), 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+
+            cursor.execute(f'DROP TABLE "{name}"')
+            connection.commit()
+            logger.info(f"Archived {row_count} activity log rows from {name} to {path}")
+            return manifest
+        except Exception:
+            connection.rollback()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            connection.close()
+
+    def run_maintenance(self, months_ahead=3, retain_months=12, archive_dir=None):
+        """
+        One maintenance pass: create-ahead, detach, then archive (when an
+        archive directory is configured). Skipped if another worker holds the
+        maintenance lock or the table is not partitioned yet.
+        """
+        # Session-level lock on a dedicated connection: the steps below commit
+        # several times and must not hand the lock back to the pool
+        with db.engine.connect() as lock_connection:
+            if not lock_connection.execute(text(f"SELECT pg_try_advisory_lock({MAINTENANCE_LOCK_SQL})")).scalar():
+                return {'skipped': 'locked'}
+            try:
+                if not self.is_partitioned():
+                    return {'skipped': 'not partitioned'}
+                result = {
+                    'created': self.ensure_partitions(months_ahead),
+                    'detached': self.detach_old_partitions(retain_months),
+                    'archived': []
+                }
+                if archive_dir:
+                    result['archived'] = [m['table'] for m in self.archive_detached_partitions(archive_dir)]
+                return result
+            finally:
+                lock_connection.execute(text(f"SELECT pg_advisory_unlock({MAINTENANCE_LOCK_SQL})"))
+
+    def start_maintenance(self):
+        """Start this worker's periodic maintenance loop (once per process)"""
+        app = current_app._get_current_object()
+        if not app.config.get('ACTIVITY_LOG_PARTITIONING'):
+            return
+        pid = os.getpid()
+        if self._maintenance_pid == pid:
+            return
+        self._maintenance_pid = pid
+        socketio.start_background_task(self._maintenance_loop, app)
+
+    def _maintenance_loop(self, app):
+        interval = app.config.get('ACTIVITY_LOG_MAINTENANCE_INTERVAL', MAINTENANCE_INTERVAL)
+        while True:
+            with app.app_context():
+                try:
+                    result = self.run_maintenance(
+                        months_ahead=app.config.get('ACTIVITY_LOG_PARTITIONS_AHEAD', 3),
+                        retain_months=app.config.get('ACTIVITY_LOG_RETENTION_MONTHS', 12),
+                        archive_dir=app.config.get('ACTIVITY_LOG_ARCHIVE_DIR')
+                    )
+                    if any(result.get(key) for key in ('created', 'detached', 'archived')):
+                        logger.info(f"Activity log partition maintenance: {result}")
+                except Exception as e:
+                    logger.error(f"Activity log partition maintenance failed: {e}")
+                finally:
+                    db.session.remove()
+            socketio.sleep(interval)
+
+
+def init_activity_log_partitions(app):
+    """Kick off partition maintenance lazily in each worker once it serves a request"""
+    @app.before_request
+    def start_activity_log_partition_maintenance():
+        activity_log_partitions.start_maintenance()
+
+
+# Singleton instance
+activity_log_partitions = ActivityLogPartitionService()
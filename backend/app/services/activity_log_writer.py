@@ -0,0 +1,200 @@
+"""
+Activity Log Writer
+Buffers audit entries from log_activity() in a bounded in-process queue and
+writes them in bulk from a background task, in its own connection and
+transaction, so hot requests (login, upload, view/download, approve) never
+pay for an audit INSERT/COMMIT and never commit unrelated pending session
+state. Entries are only ever inserted - the audit trail stays immutable.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_SIZE = 10000      # buffered entries per worker
+BATCH_SIZE = 500        # flush as soon as this many entries are waiting
+FLUSH_INTERVAL = 1.0    # ...or after this many seconds
+ENQUEUE_TIMEOUT = 0.05  # seconds a caller blocks on a full queue before writing inline
+MAX_RETRIES = 3         # bulk insert attempts before falling back to row-by-row
+
+
+class ActivityLogWriter:
+    """Bounded, batched writer for activity_logs"""
+
+    def __init__(self):
+        self._queue = None
+        self._worker_pid = None
+        self._app = None
+        self._worker_done = None
+        self._stopped = False
+        self.enabled = True
+        self.batch_size = BATCH_SIZE
+        self.flush_interval = FLUSH_INTERVAL
+        self.queue_size = QUEUE_SIZE
+        self.stats = {
+            'enqueued': 0,      # entries accepted into the buffer
+            'written': 0,       # entries persisted
+            'batches': 0,       # bulk INSERTs executed
+            'blocked': 0,       # callers that waited on a full queue (backpressure)
+            'inline': 0,        # entries written on the caller's time because the queue stayed full
+            'retried': 0,       # failed bulk INSERT attempts
+            'dropped': 0,       # entries the database rejected even one at a time
+            'max_depth': 0      # high-water mark of the queue
+        }
+
+    def configure(self, app):
+        self._app = app
+        self.enabled = app.config.get('ACTIVITY_LOG_ASYNC', True)
+        self.batch_size = app.config.get('ACTIVITY_LOG_BATCH_SIZE', BATCH_SIZE)
+        self.flush_interval = app.config.get('ACTIVITY_LOG_FLUSH_INTERVAL', FLUSH_INTERVAL)
+        self.queue_size = app.config.get('ACTIVITY_LOG_QUEUE_SIZE', QUEUE_SIZE)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+
+    def write(self, entry):
+        """
+        Accept one activity_logs row (a dict with every column set).
+
+        With the writer disabled (ACTIVITY_LOG_ASYNC=false) the row is
+        written immediately, still in its own transaction. When the queue is
+        full the caller waits briefly, then writes the row itself rather than
+        losing it.
+        """
+        if not self.enabled or self._stopped:
+            self._insert([entry])
+            return
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.stats['blocked'] += 1
+            try:
+                self._queue.put(entry, timeout=ENQUEUE_TIMEOUT)
+            except queue.Full:
+                self.stats['inline'] += 1
+                self._insert([entry])
+                return
+        self.stats['enqueued'] += 1
+        depth = self._queue.qsize()
+        if depth > self.stats['max_depth']:
+            self.stats['max_depth'] = depth
+
+    def _ensure_worker(self):
+        # Started lazily per process: the app is preloaded before gunicorn forks
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        if self._app is None:
+            self.configure(current_app._get_current_object())
+        if self._queue is None:
+            self._queue = queue.Queue(maxsize=self.queue_size)
+        self._worker_done = threading.Event()
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        try:
+            self._consume()
+        finally:
+            self._worker_done.set()
+
+    def _consume(self):
+        while not self._stopped:
+            # Wait for the first entry, then collect until the batch is full
+            # or the flush interval has passed
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self._app.app_context():
+                self._insert(batch)
+
+    def _insert(self, rows):
+        """Bulk INSERT with retries; a batch that keeps failing is written row by row"""
+        from app.models.activity_log import ActivityLog
+        table = ActivityLog.__table__
+        for attempt in range(MAX_RETRIES):
+            try:
+                # Own connection and transaction: never touches the request's session
+                with db.engine.begin() as connection:
+                    connection.execute(table.insert(), rows)
+                self.stats['written'] += len(rows)
+                self.stats['batches'] += 1
+                return
+            except Exception as e:
+                self.stats['retried'] += 1
+                logger.warning(f"Activity log batch insert failed (attempt {attempt + 1}, {len(rows)} rows): {e}")
+                time.sleep(0.1 * (2 ** attempt))
+
+        # Isolate the offending rows so one bad entry cannot sink the batch
+        for row in rows:
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(table.insert(), [row])
+                self.stats['written'] += 1
+            except Exception as e:
+                self.stats['dropped'] += 1
+                logger.error(f"Dropped activity log entry {row.get('action_type')} for {row.get('user_id')}: {e}")
+
+    def flush(self):
+        """Write everything still buffered (shutdown, tests, management scripts)"""
+        if self._queue is None:
+            return
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._insert(batch)
+
+    def shutdown(self):
+        """Stop buffering and flush; later entries are written synchronously"""
+        self._stopped = True
+        app = self._app
+        if app is None:
+            return
+        if self._worker_pid == os.getpid() and self._worker_done is not None:
+            # Let the worker finish the batch it is holding
+            self._worker_done.wait(timeout=self.flush_interval + 5)
+        with app.app_context():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Could not flush buffered activity logs at exit: {e}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['capacity'] = self.queue_size
+        stats['async'] = self.enabled
+        return stats
+
+
+def init_activity_log_writer(app):
+    """Configure the writer from app config and flush the buffer at exit"""
+    activity_log_writer.configure(app)
+    atexit.register(activity_log_writer.shutdown)
+
+
+# Singleton instance
+activity_log_writer = ActivityLogWriter()
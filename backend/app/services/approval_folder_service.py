@@ -7,6 +7,7 @@ from app import db
 from app.models.folder import Folder
 from app.models.document import Document
 from app.models.approval import ApprovalRequest
+from app.performance import invalidate_tags_after_commit
 from datetime import datetime
 import uuid
 import logging
@@ -118,6 +119,7 @@ class ApprovalFolderService:
         
         if doc:
             db.session.delete(doc)
+            invalidate_tags_after_commit(f"user:{user_id}", f"folder:{folder.id}", f"document:{doc.id}")
             logger.info(f"🗑️ Deleted document from {folder_type.capitalize()}/{status.capitalize()}")
             return True
         
@@ -173,6 +175,7 @@ class ApprovalFolderService:
         )
         
         db.session.add(doc)
+        invalidate_tags_after_commit(f"user:{user_id}", f"folder:{folder.id}")
         logger.info(f"✅ Created document in {folder_type.capitalize()}/{status.capitalize()} for user {user_id}")
         return doc
     
@@ -287,6 +290,50 @@ class ApprovalFolderService:
         except Exception as e:
             logger.error(f"❌ Error on approval: {str(e)}")
     
+    @staticmethod
+    def on_stamped(approval_request):
+        """
+        Called when the stamped PDF of a fully approved request is ready.
+        Stamp jobs finish after on_approved() has filed the document, so the
+        Approved folders of the requester and every approver still point at
+        the original; switch them to the stamped version.
+
+        Returns:
+            Number of folder documents updated
+        """
+        from app.models.approval import ApprovalStep
+
+        original_hash = approval_request.document_ipfs_hash
+        stamped_hash = approval_request.stamped_document_ipfs_hash
+        if not stamped_hash or stamped_hash == original_hash:
+            return 0
+
+        approver_ids = {step.approver_id for step in ApprovalStep.query.filter(
+            (ApprovalStep.blockchain_request_id == approval_request.request_id) |
+            (ApprovalStep.request_id == approval_request.id)
+        ).all()}
+        owners = [(approval_request.requester_id, 'sent')] + [(approver_id, 'received') for approver_id in approver_ids]
+
+        updated = 0
+        for user_id, folder_type in owners:
+            folder = ApprovalFolderService.get_approval_folder(user_id, folder_type, 'approved')
+            if not folder:
+                continue
+            doc = ApprovalFolderService.find_document_by_ipfs_hash(folder.id, original_hash)
+            if not doc:
+                continue
+            if ApprovalFolderService.find_document_by_ipfs_hash(folder.id, stamped_hash):
+                # Already filed with the stamped version (stamping won the race)
+                db.session.delete(doc)
+            else:
+                doc.ipfs_hash = stamped_hash
+            invalidate_tags_after_commit(f"user:{user_id}", f"folder:{folder.id}", f"document:{doc.id}")
+            updated += 1
+
+        if updated:
+            logger.info(f"🔏 Switched {updated} Approved folder document(s) to the stamped PDF")
+        return updated
+
     @staticmethod
     def on_rejected(approval_request, approver_id):
         """
@@ -0,0 +1,182 @@
+"""
+Auto Group Service
+Keeps the auto-created institution and department chat groups in sync with
+user accounts. Membership is reconciled with set-based statements in a
+background task triggered by account events (creation, approval, role or
+department change), so reading the conversation list never writes.
+"""
+
+import logging
+import uuid
+from flask import current_app
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import UUID
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+# Serializes group creation across workers so two concurrent syncs cannot
+# both create the same institution/department group
+AUTO_GROUP_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext('docuchain:auto_groups'))")
+
+CREATE_INSTITUTION_GROUPS_SQL = text("""
+    INSERT INTO conversations (
+        id, type, name, description, is_auto_created, auto_type, linked_id,
+        institution_id, avatar, is_muted, is_pinned, created_at, updated_at, last_message_at
+    )
+    SELECT uuid_generate_v4(), 'group', i.name || ' - All Members',
+           'Official group for all members of ' || i.name,
+           TRUE, 'institution', i.id, i.id, '🏛️', FALSE, FALSE,
+           timezone('utc', now()), timezone('utc', now()), timezone('utc', now())
+    FROM institutions i
+    WHERE i.id IN (SELECT u.institution_id FROM users u WHERE u.id = ANY(:user_ids))
+      AND NOT EXISTS (
+          SELECT 1 FROM conversations c
+          WHERE c.is_auto_created AND c.auto_type = 'institution' AND c.linked_id = i.id
+      )
+    RETURNING institution_id
+""").bindparams(bindparam('user_ids', type_=db.ARRAY(UUID(as_uuid=True))))
+
+CREATE_DEPARTMENT_GROUPS_SQL = text("""
+    INSERT INTO conversations (
+        id, type, name, description, is_auto_created, auto_type, linked_id,
+        institution_id, avatar, is_muted, is_pinned, created_at, updated_at, last_message_at
+    )
+    SELECT uuid_generate_v4(), 'group', d.name || ' Department',
+           'Official group for ' || d.name || ' department members',
+           TRUE, 'department', d.id, d.institution_id, '📚', FALSE, FALSE,
+           timezone('utc', now()), timezone('utc', now()), timezone('utc', now())
+    FROM departments d
+    WHERE d.id IN (SELECT u.department_id FROM users u WHERE u.id = ANY(:user_ids))
+      AND NOT EXISTS (
+          SELECT 1 FROM conversations c
+          WHERE c.is_auto_created AND c.auto_type = 'department' AND c.linked_id = d.id
+      )
+    RETURNING institution_id
+""").bindparams(bindparam('user_ids', type_=db.ARRAY(UUID(as_uuid=True))))
+
+# One row per (group, user) the users should belong to: their institution
+# group, their department group, and for admins every group in the
+# institution. Admins of `admin_institution_ids` are re-synced as well so a
+# newly created group reaches them without waiting for their own event.
+ADD_MEMBERS_SQL = text("""
+    INSERT INTO conversation_members (
+        id, conversation_id, user_id, role, is_muted, is_pinned, is_blocked, joined_at
+    )
+    SELECT uuid_generate_v4(), t.conversation_id, t.user_id,
+           CASE WHEN bool_or(t.is_group_admin) THEN 'admin' ELSE 'member' END,
+           FALSE, FALSE, FALSE, timezone('utc', now())
+    FROM (
+        SELECT c.id AS conversation_id, u.id AS user_id,
+               CASE
+                   WHEN c.auto_type = 'department' THEN u.role IN ('admin', 'faculty')
+                   ELSE u.role = 'admin'
+               END AS is_group_admin
+        FROM users u
+        JOIN conversations c
+          ON c.type = 'group'
+         AND c.is_auto_created
+         AND (
+             (c.auto_type = 'institution' AND c.linked_id = u.institution_id)
+             OR (c.auto_type = 'department' AND c.linked_id = u.department_id)
+         )
+        WHERE u.id = ANY(:user_ids)
+
+        UNION ALL
+
+        SELECT c.id, u.id, TRUE
+        FROM users u
+        JOIN conversations c
+          ON c.type = 'group'
+         AND c.institution_id = u.institution_id
+        WHERE u.role = 'admin'
+          AND (u.id = ANY(:user_ids) OR u.institution_id = ANY(:admin_institution_ids))
+    ) t
+    GROUP BY t.conversation_id, t.user_id
+    ON CONFLICT (conversation_id, user_id) DO NOTHING
+    RETURNING user_id
+""").bindparams(
+    bindparam('user_ids', type_=db.ARRAY(UUID(as_uuid=True))),
+    bindparam('admin_institution_ids', type_=db.ARRAY(UUID(as_uuid=True)))
+)
+
+
+class AutoGroupService:
+    """Idempotent reconciliation of auto-created group membership"""
+
+    def sync(self, user_ids=(), institution_ids=()):
+        """
+        Create missing auto groups and memberships for the given users.
+
+        Args:
+            user_ids: Users whose institution/department groups to reconcile
+            institution_ids: Institutions whose admins should be added to any
+                group they are not yet a member of (e.g. after a group is created)
+
+        Returns:
+            Number of memberships inserted
+        """
+        from app.websocket_events import invalidate_membership
+
+        user_ids = list({_as_uuid(u) for u in user_ids if u})
+        institution_ids = {_as_uuid(i) for i in institution_ids if i}
+        if not user_ids and not institution_ids:
+            return 0
+
+        try:
+            db.session.execute(AUTO_GROUP_LOCK_SQL)
+
+            if user_ids:
+                params = {'user_ids': user_ids}
+                for statement in (CREATE_INSTITUTION_GROUPS_SQL, CREATE_DEPARTMENT_GROUPS_SQL):
+                    # New groups must also reach the institution's admins
+                    institution_ids.update(row[0] for row in db.session.execute(statement, params))
+
+            added_user_ids = [row[0] for row in db.session.execute(ADD_MEMBERS_SQL, {
+                'user_ids': user_ids,
+                'admin_institution_ids': list(institution_ids)
+            })]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if added_user_ids:
+            # Sockets of the added users must join the new rooms
+            invalidate_membership(*set(added_user_ids))
+        return len(added_user_ids)
+
+    def schedule_sync(self, user_ids=(), institution_ids=()):
+        """
+        Run sync() in a background task once the current request is done.
+
+        Call after the triggering change is committed; the task uses its
+        own app context and session, and failures are only logged.
+        """
+        user_ids = [str(u) for u in user_ids if u]
+        institution_ids = [str(i) for i in institution_ids if i]
+        if not user_ids and not institution_ids:
+            return
+
+        app = current_app._get_current_object()
+        socketio.start_background_task(self._run_sync, app, user_ids, institution_ids)
+
+    def _run_sync(self, app, user_ids, institution_ids):
+        with app.app_context():
+            try:
+                added = self.sync(user_ids, institution_ids)
+                if added:
+                    logger.info(f"Auto group sync added {added} membership(s)")
+            except Exception as e:
+                logger.error(f"Auto group sync failed for users {user_ids}: {e}")
+            finally:
+                db.session.remove()
+
+
+def _as_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+# Singleton instance
+auto_group_service = AutoGroupService()
@@ -0,0 +1,124 @@
+"""
+Dashboard Stats Service
+Serves dashboard counters from the materialized views created by
+database/add_dashboard_rollups.sql (one row per institution, one row per
+user) and refreshes them on a schedule. Routes fall back to live queries
+while rollups are disabled or a row is missing (e.g. a user created since the
+last refresh).
+"""
+
+import logging
+import os
+import time
+from flask import current_app
+from sqlalchemy import text
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+REFRESH_INTERVAL = 60  # seconds between refreshes
+
+# Only one worker refreshes at a time; the lock is released with the transaction
+REFRESH_LOCK_SQL = text("SELECT pg_try_advisory_xact_lock(hashtext('docuchain:dashboard_rollups'))")
+
+INSTITUTION_STATS_SQL = text("""
+    SELECT * FROM dashboard_institution_stats WHERE institution_id = :institution_id
+""")
+
+# The per-user row plus the institution's active student count (faculty dashboard)
+USER_STATS_SQL = text("""
+    SELECT us.*, COALESCE(ins.active_students, 0) AS institution_active_students
+    FROM dashboard_user_stats us
+    LEFT JOIN dashboard_institution_stats ins ON ins.institution_id = us.institution_id
+    WHERE us.user_id = :user_id
+""")
+
+
+class DashboardStatsService:
+    """Read and refresh the dashboard rollup views"""
+
+    def __init__(self):
+        self._refresh_pid = None
+        self.stats = {'refreshes': 0, 'skipped': 0, 'failed': 0, 'last_duration_ms': None}
+
+    def enabled(self):
+        return current_app.config.get('USE_DASHBOARD_ROLLUPS', False)
+
+    def institution_stats(self, institution_id):
+        """Rollup row for an institution as a dict, or None"""
+        if not self.enabled() or not institution_id:
+            return None
+        row = db.session.execute(INSTITUTION_STATS_SQL, {'institution_id': institution_id}).mappings().first()
+        return dict(row) if row else None
+
+    def user_stats(self, user_id):
+        """Rollup row for a user as a dict, or None"""
+        if not self.enabled():
+            return None
+        row = db.session.execute(USER_STATS_SQL, {'user_id': user_id}).mappings().first()
+        return dict(row) if row else None
+
+    def refresh(self, min_age=None):
+        """
+        Refresh both views without blocking readers.
+
+        Args:
+            min_age: Skip the refresh if another worker refreshed less than
+                this many seconds ago
+
+        Returns:
+            True if this worker refreshed, False if it was skipped
+        """
+        started = time.monotonic()
+        with db.engine.begin() as connection:
+            if not connection.execute(REFRESH_LOCK_SQL).scalar():
+                self.stats['skipped'] += 1
+                return False
+            if min_age:
+                age = connection.execute(text(
+                    "SELECT EXTRACT(EPOCH FROM timezone('utc', now()) - refreshed_at) FROM dashboard_rollup_refreshes"
+                )).scalar()
+                if age is not None and age < min_age:
+                    self.stats['skipped'] += 1
+                    return False
+            connection.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY dashboard_institution_stats"))
+            connection.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY dashboard_user_stats"))
+            connection.execute(text("UPDATE dashboard_rollup_refreshes SET refreshed_at = timezone('utc', now())"))
+        self.stats['refreshes'] += 1
+        self.stats['last_duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return True
+
+    def start_refresh(self):
+        """Start this worker's refresh loop (once per process)"""
+        app = current_app._get_current_object()
+        if not app.config.get('USE_DASHBOARD_ROLLUPS'):
+            return
+        pid = os.getpid()
+        if self._refresh_pid == pid:
+            return
+        self._refresh_pid = pid
+        socketio.start_background_task(self._refresh_loop, app)
+
+    def _refresh_loop(self, app):
+        interval = app.config.get('DASHBOARD_ROLLUP_REFRESH_INTERVAL', REFRESH_INTERVAL)
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    # Every worker runs this loop; only one refresh per interval is needed
+                    self.refresh(min_age=interval * 0.9)
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    logger.error(f"Dashboard rollup refresh failed: {e}")
+
+
+def init_dashboard_stats(app):
+    """Kick off the rollup refresh lazily in each worker once it serves a request"""
+    @app.before_request
+    def start_dashboard_rollup_refresh():
+        dashboard_stats_service.start_refresh()
+
+
+# Singleton instance
+dashboard_stats_service = DashboardStatsService()
@@ -0,0 +1,103 @@
+"""
+Document Search Service - ranked full-text and trigram search over documents
+a user owns or has been shared, in a single query.
+
+Ranking relies on the generated documents.search_vector column and the
+pg_trgm GIN indexes created by database/add_document_search.sql; until
+USE_DOCUMENT_SEARCH is enabled, search falls back to plain ILIKE matching.
+"""
+import re
+from flask import current_app
+from sqlalchemy import or_, and_, exists, func, literal
+from app.models.document import Document, DocumentShare
+
+
+class DocumentSearchService:
+    """Ranked document search with prefix matching for type-ahead"""
+    
+    MIN_QUERY_LENGTH = 2
+    MAX_TERMS = 8
+    
+    @staticmethod
+    def build_prefix_tsquery(query: str):
+        """
+        Turn free text into a prefix tsquery ("annual rep" -> "annual:* & rep:*")
+        so results appear while the user is still typing. Returns None when the
+        text has no searchable words.
+        """
+        terms = re.findall(r'[^\W_]+', query.lower())[:DocumentSearchService.MAX_TERMS]
+        if not terms:
+            return None
+        return ' & '.join(f"{term}:*" for term in terms)
+    
+    @staticmethod
+    def _escape_like(query: str) -> str:
+        return query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    
+    def enabled(self):
+        return current_app.config.get('USE_DOCUMENT_SEARCH', False)
+    
+    def search_query(self, user_id, query: str, limit: int = 20):
+        """
+        Build the search query: active, non-trashed documents owned by or
+        shared with user_id that match query, best matches first.
+        
+        Full-text prefix matches are ranked by ts_rank; substring matches
+        (e.g. "port" in "report.pdf") are still found through the trigram
+        indexes and ranked by similarity, preserving the old ILIKE behaviour.
+        With USE_DOCUMENT_SEARCH off only the ILIKE match runs, newest first.
+        """
+        pattern = f"%{self._escape_like(query)}%"
+        substring_match = or_(
+            Document.name.ilike(pattern, escape='\\'),
+            Document.file_name.ilike(pattern, escape='\\'),
+            Document.document_type.ilike(pattern, escape='\\')
+        )
+        
+        is_visible = or_(
+            Document.owner_id == user_id,
+            exists().where(and_(
+                DocumentShare.document_id == Document.id,
+                DocumentShare.shared_with_id == user_id
+            ))
+        )
+        
+        visible_documents = Document.query.filter(
+            Document.is_active == True,
+            Document.is_in_trash == False,
+            is_visible
+        )
+        
+        if not self.enabled():
+            return visible_documents.filter(substring_match).order_by(
+                Document.created_at.desc()
+            ).limit(limit)
+        
+        prefix_tsquery = self.build_prefix_tsquery(query)
+        if prefix_tsquery:
+            tsquery = func.to_tsquery('simple', prefix_tsquery)
+            text_match = or_(Document.search_vector.op('@@')(tsquery), substring_match)
+            text_rank = func.ts_rank(Document.search_vector, tsquery)
+        else:
+            text_match = substring_match
+            text_rank = literal(0.0)
+        
+        return visible_documents.filter(text_match).order_by(
+            text_rank.desc(),
+            func.greatest(
+                func.similarity(Document.name, query),
+                func.similarity(Document.file_name, query)
+            ).desc(),
+            Document.created_at.desc()
+        ).limit(limit)
+    
+    def search(self, user_id, query: str, limit: int = 20):
+        """Return up to limit matching Document rows, best matches first"""
+        query = (query or '').strip()
+        if len(query) < self.MIN_QUERY_LENGTH:
+            return []
+        return self.search_query(user_id, query, limit).all()
+
+
+# Singleton instance
+document_search_service = DocumentSearchService()
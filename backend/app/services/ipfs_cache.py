@@ -0,0 +1,196 @@
+"""
+IPFS Blob Cache
+Content-addressed, on-disk cache of IPFS downloads keyed by CID. Content
+behind a CID never changes, so a cached file never goes stale: stamping or
+re-stamping the same document reads it from disk instead of the gateway.
+Downloads stream straight to disk through the IPFS client (pooled keep-alive
+session, timeouts, retries), callers
+asking for the same CID at the same time share one download (single-flight,
+per process), and the least recently used files are evicted once the cache
+grows past IPFS_CACHE_MAX_BYTES. Worker processes may share the directory:
+files are published with an atomic rename.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import uuid
+from app.services.ipfs_client import ipfs_client
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'docuchain-ipfs-cache')
+MAX_BYTES = 1024 * 1024 * 1024   # 1 GB
+EVICT_TO = 0.9                   # evict down to this fraction of MAX_BYTES
+
+# CIDv0 (Qm..., base58) and CIDv1 (base32/base36) are alphanumeric; anything
+# else is rejected so a CID can never escape the cache directory
+CID_PATTERN = re.compile(r'^[A-Za-z0-9]{32,128}$')
+
+
+class IPFSBlobCache:
+    """Size-bounded LRU cache of IPFS content on local disk"""
+
+    def __init__(self):
+        self.enabled = True
+        self.directory = CACHE_DIR
+        self.max_bytes = MAX_BYTES
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._inflight = {}     # cid -> lock held by the thread downloading it
+        self._size = None       # bytes on disk, estimated; rescanned on eviction
+        self.stats = {
+            'hits': 0,          # served from disk
+            'misses': 0,        # downloaded
+            'coalesced': 0,     # waited for another caller's download of the same CID
+            'evicted': 0,       # files removed by LRU eviction
+            'bytes_downloaded': 0
+        }
+
+    def configure(self, app):
+        self.enabled = app.config.get('IPFS_CACHE_ENABLED', True)
+        self.directory = app.config.get('IPFS_CACHE_DIR') or CACHE_DIR
+        self.max_bytes = app.config.get('IPFS_CACHE_MAX_BYTES', MAX_BYTES)
+
+    def path_for(self, cid):
+        """Where a CID is stored (two-character shard directories keep listings short)"""
+        if not cid or not CID_PATTERN.match(cid):
+            raise ValueError(f"Invalid IPFS CID: {cid!r}")
+        return os.path.join(self.directory, cid[:2], cid)
+
+    def get_path(self, cid):
+        """Path of the cached file for cid, or None if it isn't cached"""
+        path = self.path_for(cid)
+        try:
+            # mtime doubles as the LRU clock
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, cid):
+        """
+        Return the path of the cached file for cid, downloading it first if
+        needed. Concurrent callers for the same CID share one download.
+        """
+        path = self.get_path(cid)
+        if path:
+            self.stats['hits'] += 1
+            return path
+
+        with self._lock:
+            flight = self._inflight.get(cid)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[cid] = threading.Lock()
+                flight.acquire()
+
+        if not leader:
+            # Someone else is downloading it; wait for them and use their file
+            self.stats['coalesced'] += 1
+            with flight:
+                pass
+            path = self.get_path(cid)
+            if path:
+                return path
+            # Their download failed - try ourselves
+            return self.fetch(cid)
+
+        try:
+            return self._download(cid)
+        finally:
+            with self._lock:
+                del self._inflight[cid]
+            flight.release()
+
+    def read(self, cid):
+        """Content of cid as bytes (from disk when cached)"""
+        if not self.enabled:
+            return ipfs_client.cat(cid)
+        with open(self.fetch(cid), 'rb') as f:
+            return f.read()
+
+    def _download(self, cid):
+        path = self.path_for(cid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(temp_path, 'wb') as f:
+                size = ipfs_client.download_to(cid, f)
+            # Atomic: other processes see the whole file or nothing
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        self.stats['misses'] += 1
+        self.stats['bytes_downloaded'] += size
+        self._added(size)
+        return path
+
+    def _added(self, size):
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every cached file"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.part'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete least recently used files until the cache is under EVICT_TO of its limit"""
+        with self._evict_lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * EVICT_TO
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # another process evicted it already
+                total -= size
+                self.stats['evicted'] += 1
+            self._size = total
+
+    def get_stats(self):
+        if self._size is None and self.enabled:
+            self._size = self._scan_size()
+        return dict(self.stats, enabled=self.enabled, directory=self.directory,
+                    size_bytes=self._size, max_bytes=self.max_bytes)
+
+
+def init_ipfs_cache(app):
+    """Point the blob cache at IPFS_CACHE_DIR"""
+    ipfs_blob_cache.configure(app)
+
+
+# Singleton instance
+ipfs_blob_cache = IPFSBlobCache()
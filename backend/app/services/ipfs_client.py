@@ -0,0 +1,351 @@
+"""
+IPFS Client
+The one way the backend talks to IPFS: pinning files on Pinata, reading
+content through the gateway and building public gateway URLs from
+PINATA_GATEWAY. Requests share a pooled keep-alive session, always carry a
+timeout, and are retried with jittered exponential backoff on connection
+errors, timeouts, 429 and 5xx. Uploads are streamed as multipart bodies from
+a file, path, bytes or memoryview - never assembled in memory.
+
+IPFS_BACKEND=local swaps Pinata for a directory on disk (IPFS_LOCAL_DIR)
+that hands out content-derived CIDs, for tests and offline development.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import time
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+API_URL = 'https://api.pinata.cloud'
+GATEWAY = 'https://gateway.pinata.cloud/ipfs/'
+CONNECT_TIMEOUT = 5       # seconds
+READ_TIMEOUT = 60         # seconds between bytes, downloads
+UPLOAD_TIMEOUT = 120      # seconds between bytes, uploads
+MAX_RETRIES = 3           # attempts after the first
+BACKOFF_BASE = 0.5        # seconds before the first retry
+BACKOFF_MAX = 8
+CHUNK_SIZE = 64 * 1024
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class IPFSError(Exception):
+    """An IPFS request failed (after retries)"""
+
+
+class MultipartStream:
+    """
+    A multipart/form-data body read lazily, chunk by chunk, from its parts.
+    Has a length so requests sends Content-Length instead of chunked
+    encoding, and can be rewound so a retry sends the same body again.
+    """
+
+    def __init__(self, fields, file_field, filename, source, content_type):
+        self.boundary = uuid.uuid4().hex
+        self._source = source
+        head = io.BytesIO()
+        for name, value in fields.items():
+            head.write(f"--{self.boundary}\r\n".encode())
+            head.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+            head.write(value.encode() if isinstance(value, str) else value)
+            head.write(b"\r\n")
+        safe_name = filename.replace('"', '_').replace('\r', '_').replace('\n', '_')
+        head.write(f"--{self.boundary}\r\n".encode())
+        head.write(f'Content-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'.encode())
+        head.write(f"Content-Type: {content_type}\r\n\r\n".encode())
+        self._head = head.getvalue()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.rewind()
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def rewind(self):
+        self._source.rewind()
+        self._parts = [io.BytesIO(self._head), self._source, io.BytesIO(self._tail)]
+
+    def __len__(self):
+        return len(self._head) + len(self._source) + len(self._tail)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b"".join(part.read() for part in self._parts)
+        chunks = []
+        while size > 0 and self._parts:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _Source:
+    """Uniform, rewindable reader over a path, a binary file, bytes or a memoryview"""
+
+    def __init__(self, source):
+        self._file = None
+        self._view = None
+        if isinstance(source, (str, os.PathLike)):
+            self._file = open(source, 'rb')
+            self._owns_file = True
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            self._view = memoryview(source).cast('B')
+        else:
+            self._file = source
+            self._owns_file = False
+        if self._file is not None:
+            self._start = self._file.tell()
+            self._file.seek(0, os.SEEK_END)
+            self._length = self._file.tell() - self._start
+            self._file.seek(self._start)
+        else:
+            self._length = len(self._view)
+        self._pos = 0
+
+    def rewind(self):
+        self._pos = 0
+        if self._file is not None:
+            self._file.seek(self._start)
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if self._file is not None:
+            return self._file.read(size)
+        end = self._length if size is None or size < 0 else min(self._pos + size, self._length)
+        # Copy one chunk at a time, not the whole buffer
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return chunk
+
+    def close(self):
+        if self._file is not None and self._owns_file:
+            self._file.close()
+
+
+class PinataBackend:
+    """Pin with the Pinata API, read through the gateway"""
+
+    name = 'pinata'
+
+    def __init__(self, client):
+        self.client = client
+
+    def pin(self, reader, filename, content_type, metadata):
+        if not self.client.jwt:
+            raise IPFSError('Pinata JWT not configured')
+        body = MultipartStream(
+            {'pinataMetadata': json.dumps(metadata or {'name': filename})},
+            'file', filename, reader, content_type
+        )
+        response = self.client.request(
+            'POST', f"{self.client.api_url}/pinning/pinFileToIPFS",
+            data=body,
+            headers={'Authorization': f"Bearer {self.client.jwt}", 'Content-Type': body.content_type},
+            timeout=(self.client.connect_timeout, self.client.upload_timeout),
+            before_attempt=body.rewind
+        )
+        cid = response.json().get('IpfsHash')
+        if not cid:
+            raise IPFSError(f"Pinata returned no IpfsHash: {response.text[:200]}")
+        return cid
+
+    def iter_content(self, cid):
+        response = self.client.request(
+            'GET', self.client.gateway_url(cid), stream=True,
+            timeout=(self.client.connect_timeout, self.client.read_timeout)
+        )
+        with response:
+            yield from response.iter_content(chunk_size=CHUNK_SIZE)
+
+
+class LocalBackend:
+    """Stand-in for Pinata: files in IPFS_LOCAL_DIR, named by a CID of their content"""
+
+    name = 'local'
+
+    def __init__(self, client):
+        self.client = client
+
+    def pin(self, reader, filename, content_type, metadata):
+        os.makedirs(self.client.local_dir, exist_ok=True)
+        temp_path = os.path.join(self.client.local_dir, f".{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        with open(temp_path, 'wb') as f:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        # CIDv1, raw codec, sha2-256 multihash, base32 multibase ("bafkrei...")
+        cid = 'b' + base64.b32encode(bytes([0x01, 0x55, 0x12, 0x20]) + digest.digest()).decode().lower().rstrip('=')
+        os.replace(temp_path, os.path.join(self.client.local_dir, cid))
+        return cid
+
+    def iter_content(self, cid):
+        path = os.path.join(self.client.local_dir, os.path.basename(cid))
+        if not os.path.isfile(path):
+            raise IPFSError(f"{cid} not found in local IPFS store")
+        with open(path, 'rb') as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+
+
+class IPFSClient:
+    """Pooled, retrying client for Pinata and the IPFS gateway"""
+
+    BACKENDS = {'pinata': PinataBackend, 'local': LocalBackend}
+
+    def __init__(self):
+        self.jwt = None
+        self.api_url = API_URL
+        self.gateway = GATEWAY
+        self.connect_timeout = CONNECT_TIMEOUT
+        self.read_timeout = READ_TIMEOUT
+        self.upload_timeout = UPLOAD_TIMEOUT
+        self.max_retries = MAX_RETRIES
+        self.local_dir = None
+        self.backend = PinataBackend(self)
+        self._session = None
+        self._session_pid = None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'uploads': 0, 'bytes_uploaded': 0}
+
+    def configure(self, app):
+        self.jwt = app.config.get('PINATA_JWT')
+        self.api_url = app.config.get('PINATA_API_URL', API_URL).rstrip('/')
+        self.gateway = app.config.get('PINATA_GATEWAY') or GATEWAY
+        self.connect_timeout = app.config.get('IPFS_CONNECT_TIMEOUT', CONNECT_TIMEOUT)
+        self.read_timeout = app.config.get('IPFS_READ_TIMEOUT', READ_TIMEOUT)
+        self.upload_timeout = app.config.get('IPFS_UPLOAD_TIMEOUT', UPLOAD_TIMEOUT)
+        self.max_retries = app.config.get('IPFS_MAX_RETRIES', MAX_RETRIES)
+        self.local_dir = app.config.get('IPFS_LOCAL_DIR') or os.path.join(app.instance_path, 'ipfs')
+        backend = app.config.get('IPFS_BACKEND', 'pinata')
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown IPFS_BACKEND {backend!r} (expected one of {', '.join(self.BACKENDS)})")
+        self.backend = self.BACKENDS[backend](self)
+
+    @property
+    def session(self):
+        """Keep-alive session, one per process (sockets must not be shared across a fork)"""
+        if self._session is None or self._session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+            self._session_pid = os.getpid()
+        return self._session
+
+    def gateway_url(self, cid):
+        """Public gateway URL of a CID (None for a missing CID)"""
+        if not cid:
+            return None
+        return f"{self.gateway.rstrip('/')}/{cid}"
+
+    def request(self, method, url, before_attempt=None, **kwargs):
+        """
+        Send a request, retrying connection errors, timeouts, 429 and 5xx
+        with jittered exponential backoff. Returns the response; raises
+        IPFSError once retries are exhausted or on any other error status.
+        """
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        for attempt in range(self.max_retries + 1):
+            if before_attempt:
+                before_attempt()
+            self.stats['requests'] += 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code < 400:
+                    return response
+                error = IPFSError(f"{method} {url} returned {response.status_code}: {response.text[:200]}")
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    self.stats['failures'] += 1
+                    raise error
+
+            if attempt == self.max_retries:
+                break
+            delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+            delay = delay * (0.5 + random.random())  # jitter so concurrent retries spread out
+            self.stats['retries'] += 1
+            logger.warning(f"IPFS {method} attempt {attempt + 1} failed, retrying in {delay:.1f}s: {error}")
+            time.sleep(delay)
+
+        self.stats['failures'] += 1
+        if isinstance(error, IPFSError):
+            raise error
+        raise IPFSError(f"{method} {url} failed: {error}") from error
+
+    def pin_file(self, source, filename, content_type='application/octet-stream', metadata=None):
+        """
+        Pin a file and return its CID.
+
+        Args:
+            source: Path, binary file object (read from its current
+                position), bytes or memoryview - streamed, never copied whole
+            filename: Name shown on Pinata
+            content_type: MIME type of the file part
+            metadata: pinataMetadata dict (name, keyvalues)
+        """
+        reader = _Source(source)
+        try:
+            cid = self.backend.pin(reader, filename, content_type, metadata)
+        finally:
+            reader.close()
+        self.stats['uploads'] += 1
+        self.stats['bytes_uploaded'] += len(reader)
+        return cid
+
+    def iter_content(self, cid):
+        """Content of a CID in chunks"""
+        return self.backend.iter_content(cid)
+
+    def cat(self, cid):
+        """Content of a CID as bytes"""
+        return b"".join(self.iter_content(cid))
+
+    def download_to(self, cid, fileobj):
+        """Stream the content of a CID into a binary file object; returns the byte count"""
+        size = 0
+        for chunk in self.iter_content(cid):
+            fileobj.write(chunk)
+            size += len(chunk)
+        return size
+
+    def get_stats(self):
+        return dict(self.stats, backend=self.backend.name)
+
+
+def ipfs_url(cid):
+    """Public gateway URL of a CID, built from PINATA_GATEWAY"""
+    return ipfs_client.gateway_url(cid)
+
+
+def init_ipfs_client(app):
+    """Configure the IPFS client from PINATA_* / IPFS_* settings"""
+    ipfs_client.configure(app)
+
+
+# Singleton instance
+ipfs_client = IPFSClient()
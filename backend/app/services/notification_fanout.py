@@ -0,0 +1,195 @@
+"""
+Notification Fan-out Service
+Turns "notify these users" into a single queued event. A background worker
+per process resolves recipients, bulk-inserts the notification rows with one
+executemany per batch, and pushes them to connected users over WebSocket in
+one event per user, so the request that triggered the fan-out never waits on
+per-recipient INSERT/COMMIT round trips.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import uuid
+from datetime import datetime
+from flask import current_app
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_SIZE = 10000     # pending fan-out events per worker before publishing falls back to inline
+INSERT_BATCH_SIZE = 1000  # notification rows per executemany
+PUSH_BATCH_SIZE = 500  # recipients pushed between cooperative yields
+
+
+class NotificationFanoutService:
+    """Queue-backed bulk notification writer"""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._worker_pid = None
+        self._app = None
+        self.stats = {'events': 0, 'notifications': 0, 'inline': 0, 'failed': 0}  # failed: events not delivered
+
+    def publish(self, notification_type, title, message=None, user_ids=None,
+                conversation_id=None, exclude_user_id=None, reference_id=None,
+                reference_type=None, sender_id=None, sender_name=None, extra_data=None):
+        """
+        Enqueue one notification event for many recipients.
+
+        Recipients are either explicit user_ids or every unmuted member of
+        conversation_id (resolved by the worker); exclude_user_id (usually
+        the sender) is skipped either way. Call after the triggering change
+        is committed.
+        """
+        event = {
+            'type': notification_type,
+            'title': title,
+            'message': message,
+            'user_ids': [str(u) for u in (user_ids or []) if u],
+            'conversation_id': str(conversation_id) if conversation_id else None,
+            'exclude_user_id': str(exclude_user_id) if exclude_user_id else None,
+            'reference_id': str(reference_id) if reference_id else None,
+            'reference_type': reference_type,
+            'sender_id': str(sender_id) if sender_id else None,
+            'sender_name': sender_name,
+            'extra_data': extra_data or {}
+        }
+        if not event['user_ids'] and not event['conversation_id']:
+            return
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Never drop notifications: write this event on the caller's time
+            self.stats['inline'] += 1
+            self._process([event])
+
+    def _ensure_worker(self):
+        # Started lazily per process: the app is preloaded before gunicorn forks
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        self._app = current_app._get_current_object()
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            # Block for the first event, then drain whatever else is waiting
+            events = [self._queue.get()]
+            while len(events) < 100:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._app.app_context():
+                try:
+                    self._process(events)
+                except Exception as e:
+                    # Keep the worker alive: one bad batch must not stop the fan-out
+                    self.stats['failed'] += len(events)
+                    logger.exception(f"Notification fan-out failed ({len(events)} events): {e}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def _process(self, events):
+        rows = []
+        for event in events:
+            recipients = self._resolve_recipients(event)
+            now = datetime.utcnow()
+            for user_id in recipients:
+                rows.append({
+                    'id': str(uuid.uuid4()),
+                    'user_id': user_id,
+                    'type': event['type'],
+                    'title': event['title'],
+                    'message': event['message'],
+                    'reference_id': event['reference_id'],
+                    'reference_type': event['reference_type'],
+                    'sender_id': event['sender_id'],
+                    'sender_name': event['sender_name'],
+                    'is_read': False,
+                    'extra_data': event['extra_data'],
+                    'created_at': now
+                })
+        if not rows:
+            return
+
+        from app.models.notification import Notification
+        try:
+            table = Notification.__table__
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                db.session.execute(table.insert(), rows[start:start + INSERT_BATCH_SIZE])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.stats['failed'] += len(events)
+            logger.error(f"Notification fan-out insert failed ({len(rows)} rows): {e}")
+            return
+
+        self.stats['events'] += len(events)
+        self.stats['notifications'] += len(rows)
+        self._push(rows)
+
+    def _resolve_recipients(self, event):
+        recipients = list(event['user_ids'])
+        if event['conversation_id']:
+            result = db.session.execute(db.text("""
+                SELECT user_id FROM conversation_members
+                WHERE conversation_id = CAST(:conversation_id AS uuid)
+                  AND is_muted IS NOT TRUE
+            """), {'conversation_id': event['conversation_id']})
+            recipients.extend(str(row[0]) for row in result)
+        exclude = event['exclude_user_id']
+        return list(dict.fromkeys(u for u in recipients if u != exclude))
+
+    def _push(self, rows):
+        """One 'notifications' event per connected recipient with all of their new rows"""
+        from app.presence import get_presence_store
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row['user_id'], []).append(_serialize(row))
+        try:
+            online = list(get_presence_store().online_users(by_user))
+        except Exception:
+            online = []
+        for start in range(0, len(online), PUSH_BATCH_SIZE):
+            for user_id in online[start:start + PUSH_BATCH_SIZE]:
+                socketio.emit('notifications', {'notifications': by_user[user_id]}, room=f"user_{user_id}")
+            socketio.sleep(0)
+
+    def flush_pending(self):
+        """Process everything still queued (used on shutdown and by tests)"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if events:
+            self._process(events)
+
+
+def _serialize(row):
+    from app.models.notification import Notification
+    # Transient instance (never added to the session) so pushes match the REST shape
+    return Notification(**row).to_dict()
+
+
+def init_notification_fanout(app):
+    """Drain the notification queue at exit"""
+    def drain():
+        with app.app_context():
+            try:
+                notification_fanout.flush_pending()
+            except Exception as e:
+                logger.error(f"Could not flush queued notifications at exit: {e}")
+    atexit.register(drain)
+
+
+# Singleton instance
+notification_fanout = NotificationFanoutService()
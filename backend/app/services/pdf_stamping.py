@@ -6,13 +6,16 @@ import os
 import qrcode
 from datetime import datetime
 from PIL import Image
-from reportlab.lib.pagesizes import letter
+from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.colors import HexColor, black, white
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from PyPDF2 import PdfReader, PdfWriter
 import tempfile
-import requests
+
+
+# Page sizes warm() draws a throwaway overlay for
+WARM_PAGE_SIZES = (letter, A4)
 
 
 class PDFStampingService:
@@ -223,15 +226,16 @@ class PDFStampingService:
         """
         packet = io.BytesIO()
         can = canvas.Canvas(packet, pagesize=(page_width, page_height))
-        
-        # Generate QR code
+        self._draw_qr_code(can, verification_code, page_width, page_height)
+        can.save()
+        packet.seek(0)
+        return packet
+    
+    def _draw_qr_code(self, can, verification_code, page_width, page_height):
+        """Draw the framed QR code and its label in the top-right corner"""
+        # Generate QR code; reportlab reads the PIL image directly
         qr_image = self.generate_qr_code(verification_code)
         
-        # Save QR to temp file for reportlab
-        qr_buffer = io.BytesIO()
-        qr_image.save(qr_buffer, format='PNG')
-        qr_buffer.seek(0)
-        
         # Position: top-right corner
         qr_x = page_width - self.QR_SIZE - self.QR_MARGIN
         qr_y = page_height - self.QR_SIZE - self.QR_MARGIN
@@ -246,17 +250,56 @@ class PDFStampingService:
         can.rect(qr_x - 5, qr_y - 5, self.QR_SIZE + 10, self.QR_SIZE + 10, fill=0, stroke=1)
         
         # Draw QR code
-        can.drawImage(ImageReader(qr_buffer), qr_x, qr_y, width=self.QR_SIZE, height=self.QR_SIZE)
+        can.drawImage(ImageReader(qr_image), qr_x, qr_y, width=self.QR_SIZE, height=self.QR_SIZE)
         
         # Add small label below QR
         can.setFont("Helvetica", 6)
         can.setFillColor(HexColor('#6b7280'))
         label_width = can.stringWidth(verification_code, "Helvetica", 6)
         can.drawString(qr_x + (self.QR_SIZE - label_width) / 2, qr_y - 10, verification_code)
+    
+    def create_first_page_overlay(self, page_width: float, page_height: float,
+                                  verification_code: str, approver_name: str,
+                                  approval_date: datetime, approval_type: str = "STANDARD",
+                                  signature_hash: str = None, tx_hash: str = None,
+                                  signer_address: str = None):
+        """
+        Build the QR code and the approval stamp as one overlay, so each is
+        drawn once and the first page is merged once
+        
+        Returns:
+            PyPDF2 page object to merge onto the first page
+        """
+        packet = io.BytesIO()
+        can = canvas.Canvas(packet, pagesize=(page_width, page_height))
+        self._draw_qr_code(can, verification_code, page_width, page_height)
+        
+        # Stamp position (bottom center, above margin)
+        stamp_x = (page_width - self.STAMP_WIDTH) / 2
+        stamp_y = 50
+        if approval_type == "DIGITAL_SIGNATURE":
+            self._draw_digital_signature_stamp(can, stamp_x, stamp_y, approver_name, 
+                                               approval_date, verification_code,
+                                               signature_hash, tx_hash, signer_address)
+        else:
+            self._draw_approval_stamp(can, stamp_x, stamp_y, approver_name, 
+                                      approval_date, verification_code)
         
         can.save()
         packet.seek(0)
-        return packet
+        return PdfReader(packet).pages[0]
+    
+    def warm(self, page_sizes=WARM_PAGE_SIZES):
+        """
+        Draw a throwaway overlay per page size so fonts, the QR encoder and
+        the reportlab/PyPDF2 code paths are loaded before the first real job
+        """
+        for page_width, page_height in page_sizes:
+            self.create_first_page_overlay(page_width, page_height, "DCH-WARMUP", "Warmup",
+                                           datetime.utcnow(), "DIGITAL_SIGNATURE",
+                                           "0x", "0x", "0x0000000000000000000000000000000000000000")
+            self.create_first_page_overlay(page_width, page_height, "DCH-WARMUP", "Warmup",
+                                           datetime.utcnow())
     
     def stamp_pdf(self, pdf_content: bytes, verification_code: str, 
                   approver_name: str, approval_date: datetime,
@@ -284,72 +327,95 @@ class PDFStampingService:
             original_pdf = PdfReader(io.BytesIO(pdf_content))
             output_pdf = PdfWriter()
             
-            # Process each page
+            # Only the first page is stamped; the rest are copied as they are
             for page_num, page in enumerate(original_pdf.pages):
-                # Get page dimensions
-                page_box = page.mediabox
-                page_width = float(page_box.width)
-                page_height = float(page_box.height)
-                
-                # Create QR overlay for first page only
                 if page_num == 0:
-                    # Create QR overlay
-                    qr_overlay = self.create_qr_overlay(verification_code, page_width, page_height)
-                    qr_pdf = PdfReader(qr_overlay)
-                    page.merge_page(qr_pdf.pages[0])
-                    
-                    # Create stamp overlay
-                    stamp_overlay = self.create_approval_stamp(
-                        approver_name, approval_date, verification_code, approval_type
+                    page_box = page.mediabox
+                    overlay = self.create_first_page_overlay(
+                        float(page_box.width), float(page_box.height),
+                        verification_code, approver_name, approval_date, approval_type,
+                        signature_hash, tx_hash, signer_address
                     )
-                    
-                    # For digital signature, update the stamp creation
-                    if approval_type == "DIGITAL_SIGNATURE":
-                        stamp_overlay = self._create_digital_stamp_overlay(
-                            page_width, page_height, approver_name, approval_date,
-                            verification_code, signature_hash, tx_hash, signer_address
-                        )
-                    
-                    stamp_pdf = PdfReader(stamp_overlay)
-                    page.merge_page(stamp_pdf.pages[0])
+                    page.merge_page(overlay)
                 
                 output_pdf.add_page(page)
             
             # Write output
             output_buffer = io.BytesIO()
             output_pdf.write(output_buffer)
-            output_buffer.seek(0)
-            
-            result = output_buffer.read()
-            return result
+            return output_buffer.getvalue()
         except Exception as e:
             import traceback
             traceback.print_exc()
             raise
     
-    def _create_digital_stamp_overlay(self, page_width, page_height, approver_name, 
-                                       approval_date, verification_code, 
-                                       signature_hash=None, tx_hash=None,
-                                       signer_address=None) -> io.BytesIO:
-        """Create digital signature stamp overlay"""
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=(page_width, page_height))
+    def download_pdf(self, ipfs_hash: str):
+        """
+        Get a document from IPFS (through the local blob cache, so stamping
+        the same document again doesn't hit the gateway)
         
-        stamp_x = (page_width - self.STAMP_WIDTH) / 2
-        stamp_y = 50
+        Returns:
+            PDF content as bytes, or None if the CID is an HTML page
+        """
+        from app.services.ipfs_cache import ipfs_blob_cache
+        content = ipfs_blob_cache.read(ipfs_hash)
         
-        self._draw_digital_signature_stamp(can, stamp_x, stamp_y, approver_name, 
-                                           approval_date, verification_code,
-                                           signature_hash, tx_hash, signer_address)
+        # Verify it's a PDF
+        if not content[:4] == b'%PDF':
+            # Check if it's HTML (directory listing)
+            if b'<!DOCTYPE' in content[:100] or b'<html' in content[:100]:
+                return None
         
-        can.save()
-        packet.seek(0)
-        return packet
+        return content
+    
+    def stamp_arguments(self, approval_details: dict, approval_type: str = "STANDARD") -> dict:
+        """
+        Turn approval details (see stamp_pdf_from_url) into keyword arguments
+        for stamp_pdf
+        """
+        # Extract details
+        verification_code = approval_details.get('verification_code', 'N/A')
+        approvers = approval_details.get('approvers', [])
+        approved_at = approval_details.get('approved_at', datetime.utcnow().isoformat())
+        tx_hash = approval_details.get('blockchain_tx')
+        is_digital_signature = approval_details.get('is_digital_signature', False)
+        digital_signature = approval_details.get('digital_signature')
+        
+        # Get first approver name or use generic
+        approver_name = approvers[0]['name'] if approvers else 'Authorized Signatory'
+        
+        # For digital signature, get signer wallet address
+        signature_hash = None
+        signer_address = None
+        if is_digital_signature and digital_signature:
+            signature_hash = digital_signature.get('signature', '')[:42] + '...'  # Truncate for display
+            signer_address = digital_signature.get('signer_address')
+        elif approvers and approvers[0].get('signature_hash'):
+            signature_hash = approvers[0]['signature_hash'][:42] + '...'
+            signer_address = approvers[0].get('wallet_address')
+        
+        # Parse approval date
+        if isinstance(approved_at, str):
+            approval_date = datetime.fromisoformat(approved_at.replace('Z', '+00:00'))
+        else:
+            approval_date = approved_at
+        
+        return {
+            'verification_code': verification_code,
+            'approver_name': approver_name,
+            'approval_date': approval_date,
+            # Use DIGITAL_SIGNATURE type if digital signature data is present
+            'approval_type': "DIGITAL_SIGNATURE" if is_digital_signature else approval_type,
+            'signature_hash': signature_hash,
+            'tx_hash': tx_hash,
+            'signer_address': signer_address
+        }
     
     def stamp_pdf_from_url(self, ipfs_hash: str, approval_details: dict,
                            approval_type: str = "STANDARD") -> bytes:
         """
-        Download PDF from IPFS and stamp it
+        Download PDF from IPFS and stamp it in this process (the stamp queue
+        uses stamp_engine.stamp_from_url, which stamps in a worker process)
         
         Args:
             ipfs_hash: IPFS hash of the document
@@ -366,56 +432,10 @@ class PDFStampingService:
             Stamped PDF content as bytes, or None if failed
         """
         try:
-            # Build IPFS gateway URL
-            pdf_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}"
-            
-            # Download PDF
-            response = requests.get(pdf_url, timeout=60)
-            response.raise_for_status()
-            
-            # Verify it's a PDF
-            content_type = response.headers.get('content-type', '')
-            if 'pdf' not in content_type.lower() and not response.content[:4] == b'%PDF':
-                # Check if it's HTML (directory listing)
-                if b'<!DOCTYPE' in response.content[:100] or b'<html' in response.content[:100]:
-                    return None
-            
-            # Extract details
-            verification_code = approval_details.get('verification_code', 'N/A')
-            approvers = approval_details.get('approvers', [])
-            approved_at = approval_details.get('approved_at', datetime.utcnow().isoformat())
-            tx_hash = approval_details.get('blockchain_tx')
-            is_digital_signature = approval_details.get('is_digital_signature', False)
-            digital_signature = approval_details.get('digital_signature')
-            
-            # Get first approver name or use generic
-            approver_name = approvers[0]['name'] if approvers else 'Authorized Signatory'
-            
-            # For digital signature, get signer wallet address
-            signature_hash = None
-            signer_address = None
-            if is_digital_signature and digital_signature:
-                signature_hash = digital_signature.get('signature', '')[:42] + '...'  # Truncate for display
-                signer_address = digital_signature.get('signer_address')
-            elif approvers and approvers[0].get('signature_hash'):
-                signature_hash = approvers[0]['signature_hash'][:42] + '...'
-                signer_address = approvers[0].get('wallet_address')
-            
-            # Parse approval date
-            if isinstance(approved_at, str):
-                approval_date = datetime.fromisoformat(approved_at.replace('Z', '+00:00'))
-            else:
-                approval_date = approved_at
-            
-            # Use DIGITAL_SIGNATURE type if digital signature data is present
-            effective_approval_type = "DIGITAL_SIGNATURE" if is_digital_signature else approval_type
-            
-            stamped_result = self.stamp_pdf(
-                response.content, verification_code, approver_name, approval_date,
-                effective_approval_type, signature_hash, tx_hash, signer_address
-            )
-            
-            return stamped_result
+            pdf_content = self.download_pdf(ipfs_hash)
+            if pdf_content is None:
+                return None
+            return self.stamp_pdf(pdf_content, **self.stamp_arguments(approval_details, approval_type))
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -0,0 +1,187 @@
+"""
+PDF Stamp Engine
+Runs PDFStampingService.stamp_pdf in a pool of worker processes, so PyPDF2
+parsing, reportlab drawing and page merges never hold the GIL of a web or
+stamp-queue process. Workers are spawned and warmed (libraries imported,
+fonts and QR encoder loaded, a throwaway overlay drawn for the common page
+sizes) before the first job and then reused for every job. Downloads stay
+in the calling process; only the bytes cross into the pool.
+STAMP_ENGINE_PROCESSES=0 stamps in the calling process.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+PROCESSES = 2           # worker processes per engine
+START_METHOD = 'spawn'  # don't fork a process that runs threads/greenlets
+TIMEOUT = 120           # seconds to wait for one document
+
+# Set in each pool worker by _init_worker
+_worker_service = None
+
+
+def _init_worker(base_url):
+    """Pool initializer: build this worker's stamping service and warm it"""
+    global _worker_service
+    from app.services.pdf_stamping import PDFStampingService
+    _worker_service = PDFStampingService(base_url)
+    _worker_service.warm()
+
+
+def _stamp_in_worker(pdf_content, stamp_args):
+    return _worker_service.stamp_pdf(pdf_content, **stamp_args)
+
+
+def _ready():
+    return os.getpid()
+
+
+class PDFStampEngine:
+    """Process pool for stamping PDFs, one document or a batch at a time"""
+
+    def __init__(self, processes=PROCESSES, start_method=START_METHOD, timeout=TIMEOUT, base_url=None):
+        self.processes = processes
+        self.start_method = start_method
+        self.timeout = timeout
+        self.base_url = base_url
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'stamped': 0,           # documents stamped
+            'failed': 0,            # documents that raised or timed out
+            'pool_restarts': 0      # pools replaced after a worker died
+        }
+
+    def configure(self, app):
+        self.processes = app.config.get('STAMP_ENGINE_PROCESSES', PROCESSES)
+        self.start_method = app.config.get('STAMP_ENGINE_START_METHOD', START_METHOD)
+        self.timeout = app.config.get('STAMP_ENGINE_TIMEOUT', TIMEOUT)
+        self.base_url = app.config.get('FRONTEND_URL') or self.base_url
+
+    def start(self):
+        """
+        Start and warm this process's pool. Called by stamp workers before
+        their first job; otherwise the pool starts with the first document.
+        """
+        if self.processes <= 0:
+            return None
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                return self._executor
+            from app.services.pdf_stamping import pdf_stamping_service
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.base_url or pdf_stamping_service.base_url,)
+            )
+            self._executor_pid = os.getpid()
+            executor = self._executor
+
+        # One no-op per worker so every process is spawned and initialized now
+        for future in [executor.submit(_ready) for _ in range(self.processes)]:
+            future.result()
+        logger.info(f"Stamp engine started {self.processes} worker processes")
+        return executor
+
+    def submit(self, pdf_content, **stamp_args):
+        """Queue one document; returns a Future of the stamped PDF bytes"""
+        executor = self.start()
+        if executor is None:
+            future = Future()
+            try:
+                from app.services.pdf_stamping import pdf_stamping_service
+                future.set_result(pdf_stamping_service.stamp_pdf(pdf_content, **stamp_args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return executor.submit(_stamp_in_worker, pdf_content, stamp_args)
+
+    def stamp(self, pdf_content, **stamp_args):
+        """Stamp one document (keyword arguments as for stamp_pdf) and return the bytes"""
+        return self._result(self.submit(pdf_content, **stamp_args))
+
+    def stamp_batch(self, documents):
+        """
+        Stamp several documents in parallel.
+
+        Args:
+            documents: Iterable of (pdf_content, stamp_args) pairs
+
+        Returns:
+            Stamped PDF bytes per document, in order; None for a document
+            that failed (the error is logged)
+        """
+        futures = [self.submit(pdf_content, **stamp_args) for pdf_content, stamp_args in documents]
+        results = []
+        for index, future in enumerate(futures):
+            try:
+                results.append(self._result(future))
+            except Exception as e:
+                logger.error(f"Stamping document {index} of the batch failed: {e}")
+                results.append(None)
+        return results
+
+    def stamp_from_url(self, ipfs_hash, approval_details, approval_type='STANDARD'):
+        """
+        Download a document from IPFS here and stamp it in the pool.
+        Returns None if the gateway didn't return a PDF; raises on errors.
+        """
+        from app.services.pdf_stamping import pdf_stamping_service
+        pdf_content = pdf_stamping_service.download_pdf(ipfs_hash)
+        if pdf_content is None:
+            return None
+        return self.stamp(pdf_content, **pdf_stamping_service.stamp_arguments(approval_details, approval_type))
+
+    def _result(self, future):
+        try:
+            result = future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge PDF); start a fresh pool next time
+            self.stats['failed'] += 1
+            self._reset()
+            raise
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        self.stats['stamped'] += 1
+        return result
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor, self._executor_pid = self._executor, None, None
+        if executor is not None:
+            self.stats['pool_restarts'] += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop this process's workers (pools inherited from a parent are left alone)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            owned = self._executor_pid == os.getpid()
+            self._executor_pid = None
+        if executor is not None and owned:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_stats(self):
+        return dict(self.stats, processes=self.processes,
+                    running=self._executor is not None and self._executor_pid == os.getpid())
+
+
+def init_stamp_engine(app):
+    """Configure the stamp engine; its pool starts with the first stamp job"""
+    stamp_engine.configure(app)
+    atexit.register(stamp_engine.shutdown)
+
+
+# Singleton instance
+stamp_engine = PDFStampEngine()
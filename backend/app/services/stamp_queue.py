@@ -0,0 +1,306 @@
+"""
+Stamp Job Queue
+Durable, Postgres-backed queue for stamping approved PDFs. Approving a
+document only inserts a stamp_jobs row in the approval's transaction; stamp
+workers (stamp_worker.py, or an embedded worker in development) claim jobs
+with FOR UPDATE SKIP LOCKED, so any number of worker processes can run side by
+side without claiming the same job. Failed attempts are retried with
+exponential backoff, a running job renews its lease with a heartbeat (so a
+slow download/stamp/upload is never handed to a second worker), a job whose
+worker died is reclaimed once its lease expires, and the requester and approver get a WebSocket event when the
+stamped PDF is ready. Until USE_STAMP_QUEUE is enabled (after
+database/add_stamp_jobs.sql), approvals stamp in the request as before.
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+POLL_INTERVAL = 1.0      # seconds an idle worker waits before polling again
+LEASE_SECONDS = 300      # a running job whose lease isn't renewed within this is reclaimed
+BACKOFF_BASE = 10        # seconds before the first retry
+BACKOFF_MAX = 600        # cap on the retry delay
+
+CLAIM_SQL = text("""
+    UPDATE stamp_jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        locked_by = :worker_id,
+        locked_at = timezone('utc', now()),
+        updated_at = timezone('utc', now())
+    WHERE id = (
+        SELECT id FROM stamp_jobs
+        WHERE (status = 'queued' AND run_after <= timezone('utc', now()))
+           OR (status = 'running' AND locked_at < timezone('utc', now()) - make_interval(secs => :lease))
+        ORDER BY run_after
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id
+""")
+
+# Renews the lease of a job this worker still holds
+HEARTBEAT_SQL = text("""
+    UPDATE stamp_jobs
+    SET locked_at = timezone('utc', now())
+    WHERE id = CAST(:job_id AS uuid) AND status = 'running' AND locked_by = :worker_id
+""")
+
+
+class StampJobQueue:
+    """Enqueue, claim and run stamp jobs"""
+
+    def __init__(self):
+        self._embedded_pid = None
+
+    @property
+    def worker_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def enabled(self):
+        return current_app.config.get('USE_STAMP_QUEUE', False)
+
+    def enqueue(self, approval_request, approval_details, approval_type, requested_by=None):
+        """
+        Add a stamp job to the current session; it becomes visible to workers
+        when the caller commits (together with the approval itself).
+        """
+        from app.models.stamp_job import StampJob
+        job = StampJob(
+            approval_request_id=approval_request.id,
+            requested_by=requested_by,
+            max_attempts=current_app.config.get('STAMP_JOB_MAX_ATTEMPTS', 5),
+            payload=self._payload(approval_request, approval_details, approval_type)
+        )
+        db.session.add(job)
+        return job
+
+    def stamp_inline(self, approval_request, approval_details, approval_type):
+        """Stamp and upload in the calling request (no stamp_jobs table yet)"""
+        ipfs_hash = self._stamp_and_upload(
+            self._payload(approval_request, approval_details, approval_type), approval_request
+        )
+        approval_request.stamped_document_ipfs_hash = ipfs_hash
+        approval_request.stamped_at = datetime.utcnow()
+        return ipfs_hash
+
+    def _payload(self, approval_request, approval_details, approval_type):
+        return {
+            'ipfs_hash': approval_request.document_ipfs_hash,
+            'approval_type': approval_type,
+            # Round-trip through JSON so datetimes etc. are stored as strings
+            'approval_details': json.loads(json.dumps(approval_details, default=str))
+        }
+
+    def latest_for_request(self, approval_request_id):
+        if not self.enabled():
+            return None
+        from app.models.stamp_job import StampJob
+        return StampJob.query.filter_by(
+            approval_request_id=approval_request_id
+        ).order_by(StampJob.created_at.desc()).first()
+
+    def claim(self):
+        """Claim the next runnable job, or return None"""
+        from app.models.stamp_job import StampJob
+        lease = current_app.config.get('STAMP_JOB_LEASE_SECONDS', LEASE_SECONDS)
+        try:
+            job_id = db.session.execute(CLAIM_SQL, {'worker_id': self.worker_id, 'lease': lease}).scalar()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return StampJob.query.get(job_id) if job_id else None
+
+    def run_once(self):
+        """Claim and process one job. Returns True if a job was processed."""
+        job = self.claim()
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def process(self, job):
+        from app.models.approval import ApprovalRequest
+        approval_request = ApprovalRequest.query.get(job.approval_request_id)
+        if approval_request is None:
+            self._finish(job, 'failed', error='Approval request no longer exists')
+            return
+
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its worker died on the last allowed attempt
+            self._finish(job, 'failed', error=job.last_error or 'Stamp worker lost the job')
+            self._notify(job, approval_request)
+            return
+
+        stop_heartbeat = self._start_heartbeat(job)
+        try:
+            ipfs_hash = self._stamp_and_upload(job.payload, approval_request)
+        except Exception as e:
+            db.session.rollback()
+            self._retry_or_fail(job, approval_request, str(e))
+            return
+        finally:
+            stop_heartbeat.set()
+
+        approval_request.stamped_document_ipfs_hash = ipfs_hash
+        approval_request.stamped_at = datetime.utcnow()
+        self._finish(job, 'succeeded', result_ipfs_hash=ipfs_hash)
+        logger.info(f"Stamp job {job.id} done: {ipfs_hash}")
+        self._update_approved_folders(approval_request)
+        self._notify(job, approval_request)
+
+    def _start_heartbeat(self, job):
+        """
+        Renew the job's lease every third of STAMP_JOB_LEASE_SECONDS until the
+        returned event is set. Network timeouts bound each read, not a whole
+        transfer, so no fixed lease is guaranteed to outlast a run.
+        """
+        app = current_app._get_current_object()
+        stop = threading.Event()
+        socketio.start_background_task(self._heartbeat, app, str(job.id), stop)
+        return stop
+
+    def _heartbeat(self, app, job_id, stop):
+        interval = app.config.get('STAMP_JOB_LEASE_SECONDS', LEASE_SECONDS) / 3
+        params = {'job_id': job_id, 'worker_id': self.worker_id}
+        with app.app_context():
+            while not stop.wait(interval):
+                try:
+                    # Own connection: the job's session is busy in the worker
+                    with db.engine.begin() as connection:
+                        connection.execute(HEARTBEAT_SQL, params)
+                except Exception as e:
+                    logger.warning(f"Stamp job {job_id} heartbeat failed: {e}")
+
+    def _stamp_and_upload(self, payload, approval_request):
+        from app.services.stamp_engine import stamp_engine
+        stamped_pdf = stamp_engine.stamp_from_url(
+            payload['ipfs_hash'],
+            payload['approval_details'],
+            payload['approval_type']
+        )
+        if not stamped_pdf:
+            raise RuntimeError('Failed to generate stamped PDF')
+        return upload_stamped_pdf(stamped_pdf, approval_request)
+
+    def _retry_or_fail(self, job, approval_request, error):
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Stamp job {job.id} failed after {job.attempts} attempts: {error}")
+            self._finish(job, 'failed', error=error)
+            self._notify(job, approval_request)
+            return
+
+        delay = min(BACKOFF_BASE * (2 ** (job.attempts - 1)), BACKOFF_MAX)
+        delay = delay * (0.5 + random.random())  # jitter so retries of a burst spread out
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        job.locked_by = None
+        job.locked_at = None
+        job.last_error = error
+        db.session.commit()
+        logger.warning(f"Stamp job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+
+    def _finish(self, job, status, result_ipfs_hash=None, error=None):
+        job.status = status
+        job.result_ipfs_hash = result_ipfs_hash
+        if error:
+            job.last_error = error
+        job.locked_by = None
+        job.locked_at = None
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+
+    def _update_approved_folders(self, approval_request):
+        """Point the Approved-folder copies filed at approval time at the stamped PDF"""
+        from app.services.approval_folder_service import approval_folder_service
+        try:
+            approval_folder_service.on_stamped(approval_request)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to update Approved folders for {approval_request.id}: {e}")
+
+    def _notify(self, job, approval_request):
+        """Tell the requester and the approver who triggered the job"""
+        event = 'stamp_job_completed' if job.status == 'succeeded' else 'stamp_job_failed'
+        payload = job.to_dict()
+        payload['approvalRequest'] = approval_request.to_dict()
+        recipients = {str(approval_request.requester_id)}
+        if job.requested_by:
+            recipients.add(str(job.requested_by))
+        for user_id in recipients:
+            socketio.emit(event, payload, room=f"user_{user_id}")
+
+    def work(self, app, stop=None):
+        """
+        Worker loop: process jobs back to back while there are any, otherwise
+        poll every STAMP_QUEUE_POLL_INTERVAL seconds. `stop` is an optional
+        callable checked between jobs for graceful shutdown.
+        """
+        from app.services.stamp_engine import stamp_engine
+        poll_interval = app.config.get('STAMP_QUEUE_POLL_INTERVAL', POLL_INTERVAL)
+        try:
+            # Spawn and warm the stamping processes before the first job arrives
+            stamp_engine.start()
+        except Exception as e:
+            logger.error(f"Stamp engine failed to start (retrying with the first job): {e}")
+        while not (stop and stop()):
+            processed = False
+            with app.app_context():
+                try:
+                    processed = self.run_once()
+                except Exception as e:
+                    logger.error(f"Stamp worker error: {e}")
+                finally:
+                    db.session.remove()
+            if not processed:
+                socketio.sleep(poll_interval)
+
+    def start_embedded_worker(self):
+        """Run a worker inside this web process (development; once per process)"""
+        app = current_app._get_current_object()
+        if not (app.config.get('USE_STAMP_QUEUE') and app.config.get('STAMP_WORKER_EMBEDDED')):
+            return
+        if self._embedded_pid == os.getpid():
+            return
+        self._embedded_pid = os.getpid()
+        socketio.start_background_task(self.work, app)
+
+
+def upload_stamped_pdf(stamped_pdf, approval_request):
+    """Pin the stamped PDF on IPFS and return its hash"""
+    from app.services.ipfs_client import ipfs_client
+    pinata_metadata = {
+        "name": f"Stamped_{approval_request.document_name}",
+        "keyvalues": {
+            "verification_code": approval_request.verification_code,
+            "original_hash": approval_request.document_ipfs_hash,
+            "type": "stamped_document"
+        }
+    }
+    return ipfs_client.pin_file(
+        stamped_pdf, f"stamped_{approval_request.document_name}",
+        content_type='application/pdf', metadata=pinata_metadata
+    )
+
+
+def init_stamp_queue(app):
+    """Start the embedded stamp worker lazily in each web worker (USE_STAMP_QUEUE and STAMP_WORKER_EMBEDDED)"""
+    @app.before_request
+    def start_embedded_stamp_worker():
+        stamp_job_queue.start_embedded_worker()
+
+
+# Singleton instance
+stamp_job_queue = StampJobQueue()
@@ -0,0 +1,110 @@
+"""
+Unread Counter Reconciler
+Periodically recomputes conversation_members.unread_count from messages and
+fixes rows that drifted (deleted messages, auto-generated messages,
+concurrent read/send races). Runs in the background of every worker while
+USE_UNREAD_COUNTERS is enabled; an advisory lock and the shared cache keep it
+to one run per interval across workers.
+"""
+
+import logging
+import os
+import time
+from flask import current_app
+from sqlalchemy import text
+from app import db, socketio
+
+logger = logging.getLogger(__name__)
+
+
+RECONCILE_INTERVAL = 900  # seconds between runs
+
+# Only one worker reconciles at a time; the lock is released with the transaction
+RECONCILE_LOCK_SQL = text("SELECT pg_try_advisory_xact_lock(hashtext('docuchain:unread_reconcile'))")
+
+LAST_RUN_CACHE_KEY = 'unread-reconcile:last-run'
+
+
+class UnreadCounterReconciler:
+    """Scheduled reconciliation of per-member unread counters"""
+
+    def __init__(self):
+        self._loop_pid = None
+        self.stats = {'runs': 0, 'skipped': 0, 'corrected': 0, 'failed': 0, 'last_duration_ms': None}
+
+    def reconcile(self, min_age=None):
+        """
+        Reconcile every member's counter.
+
+        Args:
+            min_age: Skip the run if a worker reconciled less than this many
+                seconds ago (as recorded in the shared cache)
+
+        Returns:
+            Number of member rows corrected, or None if the run was skipped
+        """
+        from app.models.chat import reconcile_unread_counters
+        from app.performance import get_cache_backend
+
+        cache = get_cache_backend()
+        if min_age:
+            last_run = cache.get(LAST_RUN_CACHE_KEY)
+            if last_run and time.time() - last_run.get('at', 0) < min_age:
+                self.stats['skipped'] += 1
+                return None
+
+        started = time.monotonic()
+        try:
+            if not db.session.execute(RECONCILE_LOCK_SQL).scalar():
+                db.session.rollback()
+                self.stats['skipped'] += 1
+                return None
+            corrected = reconcile_unread_counters()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        cache.set(LAST_RUN_CACHE_KEY, {'at': time.time()}, min_age or RECONCILE_INTERVAL)
+        self.stats['runs'] += 1
+        self.stats['corrected'] += corrected
+        self.stats['last_duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        if corrected:
+            logger.info(f"Unread counter reconciliation corrected {corrected} member rows")
+        return corrected
+
+    def start(self):
+        """Start this worker's reconciliation loop (once per process)"""
+        app = current_app._get_current_object()
+        interval = app.config.get('UNREAD_RECONCILE_INTERVAL', RECONCILE_INTERVAL)
+        if not app.config.get('USE_UNREAD_COUNTERS') or interval <= 0:
+            return
+        pid = os.getpid()
+        if self._loop_pid == pid:
+            return
+        self._loop_pid = pid
+        socketio.start_background_task(self._loop, app, interval)
+
+    def _loop(self, app, interval):
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    # Every worker runs this loop; only one run per interval is needed
+                    self.reconcile(min_age=interval * 0.9)
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    logger.error(f"Unread counter reconciliation failed: {e}")
+                finally:
+                    db.session.remove()
+
+
+def init_unread_reconciler(app):
+    """Kick off the reconciliation loop lazily in each worker once it serves a request"""
+    @app.before_request
+    def start_unread_reconciler():
+        unread_reconciler.start()
+
+
+# Singleton instance
+unread_reconciler = UnreadCounterReconciler()
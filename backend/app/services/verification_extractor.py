@@ -0,0 +1,297 @@
+"""
+Verification Code Extractor
+Finds the DCH-YYYY-XXXXXX code in a PDF uploaded to the public /verify-file
+endpoint without letting one upload burn seconds of a web worker's CPU:
+
+- the upload is spooled to a temp file in chunks (and hashed on the way)
+  instead of being read into memory;
+- results are cached by the file's SHA-256, so re-verifying the same file
+  costs one hash;
+- extraction runs in a small process pool, metadata and the first page
+  first (the stamp's QR label and "Ref:" line are on page one), then later
+  pages only while the per-request CPU budget and page cap allow;
+- at most VERIFY_EXTRACT_MAX_PENDING uploads are extracted at a time per
+  web worker, beyond that callers get ExtractorBusy.
+"""
+
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # Windows: no RLIMIT_CPU, the cooperative budget still applies
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+CODE_PATTERN = re.compile(r'DCH-\d{4}-[A-Z0-9]{6}')
+
+PROCESSES = 1           # extraction processes per web worker (0 = extract in the request)
+CPU_BUDGET = 2.0        # CPU seconds one upload may use
+MAX_PAGES = 50          # pages searched after the first one
+MAX_PENDING = 8         # uploads extracted or waiting per web worker
+TIMEOUT = 15            # seconds a request waits for its result
+CACHE_TTL = 86400       # seconds a result stays cached by SHA-256
+CHUNK_SIZE = 64 * 1024
+START_METHOD = 'spawn'
+
+
+class ExtractorBusy(Exception):
+    """Too many uploads are being verified right now"""
+
+
+class CPUBudgetExceeded(Exception):
+    """The extraction used up its CPU budget"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPUBudgetExceeded()
+
+
+def _init_worker():
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+
+def _cpu_seconds():
+    return time.process_time()
+
+
+def _set_cpu_limit(budget):
+    """
+    Hard backstop for a worker process: SIGXCPU (raised as CPUBudgetExceeded)
+    once this task has used its budget plus a second of grace, even if a
+    single page never returns to the cooperative check
+    """
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(_cpu_seconds() + budget) + 2
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def _clear_cpu_limit():
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def extract_verification_code(path, cpu_budget=CPU_BUDGET, max_pages=MAX_PAGES, hard_limit=False):
+    """
+    Look for a verification code in the PDF at path.
+
+    Returns:
+        dict with code (or None), source ('metadata', 'first_page' or
+        'page'), pages_scanned and budget_exceeded
+    """
+    from PyPDF2 import PdfReader
+
+    started = _cpu_seconds()
+    result = {'code': None, 'source': None, 'pages_scanned': 0, 'budget_exceeded': False}
+    if hard_limit:
+        _set_cpu_limit(cpu_budget)
+    try:
+        with open(path, 'rb') as f:
+            # Objects are parsed lazily from the file, so untouched pages cost nothing
+            reader = PdfReader(f)
+
+            # 1. Document metadata
+            metadata = reader.metadata
+            if metadata:
+                for value in metadata.values():
+                    if isinstance(value, str):
+                        match = CODE_PATTERN.search(value)
+                        if match:
+                            result.update(code=match.group(), source='metadata')
+                            return result
+
+            # 2. First page, then later pages while the budget lasts
+            for page_num, page in enumerate(reader.pages):
+                if page_num > max_pages:
+                    break
+                if page_num > 0 and _cpu_seconds() - started > cpu_budget:
+                    result['budget_exceeded'] = True
+                    break
+                text = page.extract_text()
+                result['pages_scanned'] += 1
+                if text:
+                    match = CODE_PATTERN.search(text)
+                    if match:
+                        result.update(code=match.group(), source='first_page' if page_num == 0 else 'page')
+                        return result
+    except CPUBudgetExceeded:
+        result['budget_exceeded'] = True
+    except Exception as e:
+        logger.warning(f"Error reading PDF: {e}")
+        result['error'] = str(e)
+    finally:
+        if hard_limit:
+            _clear_cpu_limit()
+    return result
+
+
+class VerificationCodeExtractor:
+    """Spool, hash, cache and extract verification codes from uploaded PDFs"""
+
+    def __init__(self):
+        self.processes = PROCESSES
+        self.cpu_budget = CPU_BUDGET
+        self.max_pages = MAX_PAGES
+        self.timeout = TIMEOUT
+        self.cache_ttl = CACHE_TTL
+        self.start_method = START_METHOD
+        self._pending = threading.BoundedSemaphore(MAX_PENDING)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.stats = {'extracted': 0, 'cached': 0, 'busy': 0, 'budget_exceeded': 0, 'timeouts': 0}
+
+    def configure(self, app):
+        self.processes = app.config.get('VERIFY_EXTRACT_PROCESSES', PROCESSES)
+        self.cpu_budget = app.config.get('VERIFY_EXTRACT_CPU_BUDGET', CPU_BUDGET)
+        self.max_pages = app.config.get('VERIFY_EXTRACT_MAX_PAGES', MAX_PAGES)
+        self.timeout = app.config.get('VERIFY_EXTRACT_TIMEOUT', TIMEOUT)
+        self.cache_ttl = app.config.get('VERIFY_EXTRACT_CACHE_TTL', CACHE_TTL)
+        self._pending = threading.BoundedSemaphore(app.config.get('VERIFY_EXTRACT_MAX_PENDING', MAX_PENDING))
+
+    def extract_upload(self, stream):
+        """
+        Find the verification code in an uploaded PDF.
+
+        Args:
+            stream: Binary file-like object (e.g. request.files['file'].stream)
+
+        Returns:
+            dict with code (or None), sha256 and cached, plus the extraction
+            details from extract_verification_code on a cache miss
+
+        Raises:
+            ExtractorBusy: too many uploads are being extracted already
+        """
+        from app.performance import get_cache_backend
+
+        path, sha256, looks_like_pdf = self._spool(stream)
+        try:
+            cache_key = f"verify-file:{sha256}"
+            cached = get_cache_backend().get(cache_key)
+            if cached is not None:
+                self.stats['cached'] += 1
+                return {'code': cached.get('code'), 'sha256': sha256, 'cached': True}
+
+            if not looks_like_pdf:
+                result = {'code': None, 'source': None, 'pages_scanned': 0, 'budget_exceeded': False}
+            else:
+                result = self._extract(path)
+            if result.get('budget_exceeded'):
+                self.stats['budget_exceeded'] += 1
+                logger.info(f"Verification code search stopped at the CPU budget ({sha256[:12]}, "
+                            f"{result['pages_scanned']} pages)")
+
+            # Cache misses too, so re-uploading a large code-less PDF stays cheap
+            if 'error' not in result:
+                get_cache_backend().set(cache_key, {'code': result['code']}, self.cache_ttl)
+            self.stats['extracted'] += 1
+            return dict(result, sha256=sha256, cached=False)
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _spool(self, stream):
+        """Copy the upload to a temp file in chunks; returns (path, sha256, looks_like_pdf)"""
+        digest = hashlib.sha256()
+        head = b''
+        spooled = tempfile.NamedTemporaryFile(prefix='docuchain-verify-', suffix='.pdf', delete=False)
+        try:
+            with spooled:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    if len(head) < 1024:
+                        head += chunk[:1024 - len(head)]
+                    digest.update(chunk)
+                    spooled.write(chunk)
+        except Exception:
+            os.remove(spooled.name)
+            raise
+        # The PDF header must appear within the first 1024 bytes
+        return spooled.name, digest.hexdigest(), b'%PDF' in head
+
+    def _extract(self, path):
+        if not self._pending.acquire(blocking=False):
+            self.stats['busy'] += 1
+            raise ExtractorBusy()
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return extract_verification_code(path, self.cpu_budget, self.max_pages)
+            future = executor.submit(extract_verification_code, path, self.cpu_budget, self.max_pages, True)
+            try:
+                return future.result(timeout=self.timeout)
+            except CPUBudgetExceeded:
+                # The limit fired just outside the extraction's own handler
+                return {'code': None, 'source': None, 'pages_scanned': 0, 'budget_exceeded': True}
+            except FutureTimeout:
+                # Still queued behind other uploads, or stuck; the CPU limit ends a stuck one
+                self.stats['timeouts'] += 1
+                future.cancel()
+                raise ExtractorBusy()
+            except BrokenProcessPool:
+                self._reset()
+                raise
+        finally:
+            self._pending.release()
+
+    def _get_executor(self):
+        if self.processes <= 0:
+            return None
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor, self._executor_pid = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop this process's extraction workers"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            owned = self._executor_pid == os.getpid()
+            self._executor_pid = None
+        if executor is not None and owned:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        return dict(self.stats, processes=self.processes, cpu_budget=self.cpu_budget)
+
+
+def init_verification_extractor(app):
+    """Configure /verify-file extraction; its pool starts with the first upload"""
+    verification_extractor.configure(app)
+    atexit.register(verification_extractor.shutdown)
+
+
+# Singleton instance
+verification_extractor = VerificationCodeExtractor()
@@ -6,26 +6,118 @@ from flask_socketio import emit, join_room, leave_room
 from flask import request
 from app import socketio, db
 from app.models import User
-from app.models.chat import Conversation, ConversationMember, Message, UserOnlineStatus
-from app.models.notification import create_notification
+from app.models.chat import (
+    Conversation, ConversationMember, Message, increment_unread, mark_conversation_read,
+    bulk_upsert_online_status, presence_peers
+)
+from app.services.notification_fanout import notification_fanout
+from app.performance import get_cache_backend, invalidate_tags, LocalCacheBackend
+from app.presence import get_presence_store, get_presence_aggregator, start_presence_maintenance
+from collections import namedtuple
 from datetime import datetime
+from functools import partial
 import jwt
+import time
 from flask import current_app
 
-# Store connected users: {user_id: [socket_id1, socket_id2, ...]}
-connected_users = {}
+MEMBERSHIP_CACHE_TIMEOUT = 300  # seconds a user's cached conversation list is trusted
+PROFILE_CACHE_TIMEOUT = 60      # seconds cached name/role fields are trusted
+
+# Identity fields event handlers need, cached instead of loading User rows
+SocketUser = namedtuple('SocketUser', ['id', 'first_name', 'last_name', 'role', 'institution_id'])
+_profile_cache = LocalCacheBackend(max_entries=4096)
+
+# sid -> (user_id, token expiry) for sockets held by this worker, bound at connect
+_socket_identities = {}
+
+# Connected sockets live in the presence registry (see app/presence.py),
+# shared by all workers when PRESENCE_TYPE=redis
+
+def decode_token(token):
+    """Decode a JWT issued by Flask-JWT-Extended, returning its claims or None"""
+    try:
+        return jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    except Exception:
+        return None
+
 
 def get_user_from_token(token):
     """Decode JWT token and get user - compatible with Flask-JWT-Extended"""
-    try:
-        # Flask-JWT-Extended uses 'sub' field for identity, not 'user_id'
-        data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-        user_id = data.get('sub')  # Flask-JWT-Extended stores identity in 'sub'
-        if user_id:
-            return User.query.get(user_id)
+    data = decode_token(token)
+    # Flask-JWT-Extended stores identity in 'sub'
+    user_id = data.get('sub') if data else None
+    return User.query.get(user_id) if user_id else None
+
+
+def _profile_from_user(user):
+    return SocketUser(user.id, user.first_name, user.last_name, user.role, user.institution_id)
+
+
+def get_user_profile(user_id):
+    """Name/role fields for a user from a short-lived per-worker cache"""
+    key = str(user_id)
+    profile = _profile_cache.get(key)
+    if profile is None:
+        user = User.query.get(user_id)
+        if not user:
+            return None
+        profile = _profile_from_user(user)
+        _profile_cache.set(key, profile, PROFILE_CACHE_TIMEOUT)
+    return profile
+
+
+def get_socket_user():
+    """
+    The user bound to this socket at connect time. Events never re-decode
+    the JWT or query the user; the token's expiry is still enforced.
+    """
+    identity = _socket_identities.get(request.sid)
+    if not identity:
         return None
-    except Exception as e:
+    user_id, expires_at = identity
+    if expires_at and expires_at < time.time():
         return None
+    return get_user_profile(user_id)
+
+
+def get_member_conversation_ids(user_id, refresh=False):
+    """
+    Conversation ids the user belongs to, from the shared cache (Redis with
+    near-cache when configured). Routes that add or remove members call
+    invalidate_membership() so every worker drops its copy.
+    """
+    key = f"ws_membership:{user_id}"
+    backend = get_cache_backend()
+    entry = None
+    if not refresh:
+        try:
+            entry = backend.get(key)
+        except Exception:
+            entry = None
+    
+    if entry is None:
+        rows = db.session.query(ConversationMember.conversation_id).filter(
+            ConversationMember.user_id == user_id
+        ).all()
+        entry = {'conversations': [str(row[0]) for row in rows]}
+        try:
+            backend.set(key, entry, MEMBERSHIP_CACHE_TIMEOUT, tags=(f"membership:{user_id}",))
+        except Exception:
+            pass
+    return set(entry['conversations'])
+
+
+def is_conversation_member(user_id, conversation_id):
+    """Membership check served from the cache; only an uncached id hits the database"""
+    if str(conversation_id) in get_member_conversation_ids(user_id):
+        return True
+    # Possibly added since the cache was filled (e.g. by the auto-group job)
+    return str(conversation_id) in get_member_conversation_ids(user_id, refresh=True)
+
+
+def invalidate_membership(*user_ids):
+    """Drop cached conversation membership for users, in every worker"""
+    invalidate_tags(*(f"membership:{user_id}" for user_id in user_ids if user_id))
 
 
 @socketio.on('connect')
@@ -37,41 +129,32 @@ def handle_connect(auth=None):
             print("No token provided in WebSocket connection")
             return False
         
-        user = get_user_from_token(token)
+        # The only JWT decode and user query for the socket's lifetime
+        claims = decode_token(token)
+        user = User.query.get(claims['sub']) if claims and claims.get('sub') else None
         if not user:
             print("Invalid token in WebSocket connection")
             return False
         
         user_id = str(user.id)
         print(f"User {user_id} connecting via WebSocket")
+        _socket_identities[request.sid] = (user.id, claims.get('exp'))
+        _profile_cache.set(user_id, _profile_from_user(user), PROFILE_CACHE_TIMEOUT)
         
-        # Add user to connected users
-        if user_id not in connected_users:
-            connected_users[user_id] = []
-        connected_users[user_id].append(request.sid)
+        # Register the connection; the status write and the broadcast to
+        # peers happen in the next batched presence flush
+        if get_presence_store().add_connection(user_id, request.sid):
+            get_presence_aggregator().connected(user_id)
+        start_presence_maintenance(
+            socketio, partial(_publish_presence, current_app._get_current_object())
+        )
         
-        # Update online status
-        status = UserOnlineStatus.query.get(user.id)
-        if not status:
-            status = UserOnlineStatus(user_id=user.id, is_online=True, last_seen=datetime.utcnow())
-            db.session.add(status)
-        else:
-            status.is_online = True
-            status.last_seen = datetime.utcnow()
-        db.session.commit()
-        
-        # Join user's conversation rooms
-        conversations = ConversationMember.query.filter_by(user_id=user.id).all()
-        for conv_member in conversations:
-            join_room(f"conversation_{conv_member.conversation_id}")
+        # Personal room for events addressed to this user (presence updates)
+        join_room(f"user_{user_id}")
         
-        # Broadcast online status to all user's conversations
-        for conv_member in conversations:
-            emit('user_online', {
-                'userId': user_id,
-                'online': True,
-                'lastSeen': datetime.utcnow().isoformat()
-            }, room=f"conversation_{conv_member.conversation_id}", include_self=False)
+        # Join user's conversation rooms (refreshes the membership cache)
+        for conversation_id in get_member_conversation_ids(user_id, refresh=True):
+            join_room(f"conversation_{conversation_id}")
         
         print(f"User {user_id} connected successfully")
         return True
@@ -85,36 +168,43 @@ def handle_connect(auth=None):
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle socket disconnection"""
-    # Find and remove user from connected users
-    user_id = None
-    for uid, sids in connected_users.items():
-        if request.sid in sids:
-            user_id = uid
-            sids.remove(request.sid)
-            if not sids:
-                del connected_users[uid]
-            break
+    _socket_identities.pop(request.sid, None)
     
-    if user_id:
-        # Check if user still has other connections
-        if user_id not in connected_users or not connected_users[user_id]:
-            # User fully disconnected, update status
-            user = User.query.get(user_id)
-            if user:
-                status = UserOnlineStatus.query.get(user.id)
-                if status:
-                    status.is_online = False
-                    status.last_seen = datetime.utcnow()
-                    db.session.commit()
-                
-                # Broadcast offline status
-                conversations = ConversationMember.query.filter_by(user_id=user.id).all()
-                for conv_member in conversations:
-                    emit('user_offline', {
-                        'userId': user_id,
-                        'online': False,
-                        'lastSeen': datetime.utcnow().isoformat()
-                    }, room=f"conversation_{conv_member.conversation_id}")
+    # O(1) lookup through the sid -> user reverse index
+    user_id, remaining = get_presence_store().remove_connection(request.sid)
+    
+    # User fully disconnected (no sockets left on any worker); goes offline
+    # after a grace period unless they reconnect
+    if user_id and not remaining:
+        get_presence_aggregator().disconnected(user_id)
+
+
+def _publish_presence(app, changes):
+    """
+    Apply one batch of presence transitions: a single bulk UPSERT of
+    user_online_status, then one presence_update event per online peer
+    carrying every change relevant to them.
+    """
+    with app.app_context():
+        try:
+            bulk_upsert_online_status(changes)
+            db.session.commit()
+            
+            peers_by_user = presence_peers([user_id for user_id, _, _ in changes])
+            updates_by_peer = {}
+            for user_id, is_online, last_seen in changes:
+                update = {'userId': user_id, 'online': is_online, 'lastSeen': last_seen.isoformat()}
+                for peer_id in peers_by_user.get(user_id, ()):
+                    updates_by_peer.setdefault(peer_id, []).append(update)
+            
+            # Offline peers have no socket to deliver to
+            for peer_id in get_presence_store().online_users(updates_by_peer):
+                socketio.emit('presence_update', {'users': updates_by_peer[peer_id]}, room=f"user_{peer_id}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error publishing presence: {str(e)}")
+        finally:
+            db.session.remove()
 
 
 @socketio.on('join_conversation')
@@ -136,8 +226,7 @@ def handle_leave_conversation(data):
 @socketio.on('send_message')
 def handle_send_message(data):
     """Handle sending a new message via WebSocket"""
-    token = request.args.get('token')
-    user = get_user_from_token(token)
+    user = get_socket_user()
     
     if not user:
         emit('error', {'message': 'Unauthorized'})
@@ -151,13 +240,8 @@ def handle_send_message(data):
         emit('error', {'message': 'Missing required fields'})
         return
     
-    # Verify user is member of conversation
-    member = ConversationMember.query.filter_by(
-        conversation_id=conversation_id,
-        user_id=user.id
-    ).first()
-    
-    if not member:
+    # Verify user is member of conversation (cached, no query on the hot path)
+    if not is_conversation_member(user.id, conversation_id):
         emit('error', {'message': 'Access denied'})
         return
     
@@ -174,6 +258,7 @@ def handle_send_message(data):
         status='sent'
     )
     db.session.add(message)
+    increment_unread(conversation_id, user.id)
     
     # Update conversation
     conversation = Conversation.query.get(conversation_id)
@@ -182,50 +267,36 @@ def handle_send_message(data):
     
     db.session.commit()
     
-    # Create notifications for other members
+    # Notify other members: one queued fan-out event, written in bulk off the event loop
     try:
+        sender_name = f'{user.first_name} {user.last_name}'
+        extra_data = {
+            'conversation_id': str(conversation_id),
+            'message_id': str(message.id),
+            'sender_id': str(user.id)
+        }
         if conversation.type == 'direct':
-            # For direct messages, notify the other person
-            other_member = ConversationMember.query.filter(
-                ConversationMember.conversation_id == conversation_id,
-                ConversationMember.user_id != user.id
-            ).first()
-            if other_member:
-                create_notification(
-                    user_id=str(other_member.user_id),
-                    notification_type='message',
-                    title='New Message',
-                    message=f'{user.first_name} {user.last_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
-                    sender_id=str(user.id),
-                    sender_name=f'{user.first_name} {user.last_name}',
-                    extra_data={
-                        'conversation_id': str(conversation_id),
-                        'message_id': str(message.id),
-                        'sender_id': str(user.id)
-                    }
-                )
+            notification_fanout.publish(
+                notification_type='message',
+                title='New Message',
+                message=f'{sender_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
+                user_ids=[conversation.get_other_user(user.id)],
+                sender_id=user.id,
+                sender_name=sender_name,
+                extra_data=extra_data
+            )
         elif conversation.type == 'group':
-            # For groups, notify all members except sender
-            members = ConversationMember.query.filter(
-                ConversationMember.conversation_id == conversation_id,
-                ConversationMember.user_id != user.id,
-                ConversationMember.is_muted == False
-            ).limit(50).all()
-            for m in members:
-                create_notification(
-                    user_id=str(m.user_id),
-                    notification_type='group_message',
-                    title=f'New Message in {conversation.name or "Group"}',
-                    message=f'{user.first_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
-                    sender_id=str(user.id),
-                    sender_name=f'{user.first_name} {user.last_name}',
-                    extra_data={
-                        'conversation_id': str(conversation_id),
-                        'message_id': str(message.id),
-                        'sender_id': str(user.id),
-                        'group_name': conversation.name
-                    }
-                )
+            # Every unmuted member except the sender, resolved by the worker
+            notification_fanout.publish(
+                notification_type='group_message',
+                title=f'New Message in {conversation.name or "Group"}',
+                message=f'{user.first_name}: {content[:50]}{"..." if len(content) > 50 else ""}',
+                conversation_id=conversation_id,
+                exclude_user_id=user.id,
+                sender_id=user.id,
+                sender_name=sender_name,
+                extra_data=dict(extra_data, group_name=conversation.name)
+            )
     except Exception as notif_error:
         pass  # Don't fail the message send if notification fails
     
@@ -251,8 +322,7 @@ def handle_send_message(data):
 @socketio.on('typing_start')
 def handle_typing_start(data):
     """Handle typing indicator start"""
-    token = request.args.get('token')
-    user = get_user_from_token(token)
+    user = get_socket_user()
     
     if not user:
         return
@@ -269,8 +339,7 @@ def handle_typing_start(data):
 @socketio.on('typing_stop')
 def handle_typing_stop(data):
     """Handle typing indicator stop"""
-    token = request.args.get('token')
-    user = get_user_from_token(token)
+    user = get_socket_user()
     
     if not user:
         return
@@ -287,8 +356,7 @@ def handle_typing_stop(data):
 @socketio.on('mark_read')
 def handle_mark_read(data):
     """Mark messages as read"""
-    token = request.args.get('token')
-    user = get_user_from_token(token)
+    user = get_socket_user()
     
     if not user:
         return
@@ -306,7 +374,7 @@ def handle_mark_read(data):
     ).first()
     
     if member:
-        member.last_read_at = datetime.utcnow()
+        mark_conversation_read(member)
         db.session.commit()
     
     # Notify sender that messages were read
@@ -0,0 +1 @@
+# Benchmarks - run against a disposable PostgreSQL database (DATABASE_URL)
@@ -0,0 +1,103 @@
+"""
+Document search benchmark on a synthetic documents table.
+
+Seeds N documents (default 1,000,000) spread over a few hundred owners with
+generate_series, then compares the old ILIKE/UNION search against
+document_search_service for a handful of type-ahead and substring queries,
+and prints the plan of the new query.
+
+Requires database/add_document_search.sql to have been applied.
+
+    python -m benchmarks.bench_document_search [N]
+"""
+
+import sys
+from sqlalchemy import or_, text
+
+from benchmarks.common import create_bench_app, measure, rolled_back, seed_users, print_table
+from app import db
+from app.models.document import Document, DocumentShare
+
+QUERIES = ['an', 'annual rep', 'report', 'port', 'transcript 20', 'application/pdf']
+
+WORDS = ['annual', 'report', 'transcript', 'certificate', 'invoice', 'syllabus',
+         'minutes', 'circular', 'admission', 'marksheet', 'budget', 'timetable']
+
+
+def seed_documents(count, owners):
+    """Bulk insert count documents with generate_series, owners round-robin"""
+    owner_ids = '{' + ','.join(str(u.id) for u in owners) + '}'
+    words = '{' + ','.join(WORDS) + '}'
+    db.session.execute(text("""
+        INSERT INTO documents (id, name, file_name, file_size, document_type, owner_id,
+                               owner_address, transaction_hash, timestamp, is_active,
+                               is_in_trash, is_starred, created_at, updated_at)
+        SELECT gen_random_uuid(),
+               w1 || ' ' || w2 || ' ' || (2000 + i % 25),
+               w1 || '_' || w2 || '-' || i || '.pdf',
+               1024,
+               CASE WHEN i % 5 = 0 THEN 'image/png' ELSE 'application/pdf' END,
+               (CAST(:owners AS uuid[]))[1 + i % cardinality(CAST(:owners AS uuid[]))],
+               '0x0000000000000000000000000000000000000000',
+               '0x0',
+               extract(epoch FROM now())::bigint,
+               true, false, false,
+               now() - (i || ' seconds')::interval,
+               now()
+        FROM generate_series(1, :count) AS i,
+             LATERAL (SELECT (CAST(:words AS text[]))[1 + i % 12] AS w1,
+                             (CAST(:words AS text[]))[1 + (i / 12) % 12] AS w2) AS names
+    """), {'owners': owner_ids, 'words': words, 'count': count})
+    db.session.execute(text("ANALYZE documents"))
+
+
+def legacy_search(user_id, query, limit=20):
+    """The pre-full-text implementation, kept here for comparison"""
+    pattern = f'%{query}%'
+    matches = or_(
+        Document.name.ilike(pattern),
+        Document.file_name.ilike(pattern),
+        Document.document_type.ilike(pattern)
+    )
+    own = Document.query.filter(Document.owner_id == user_id, Document.is_active == True,
+                                Document.is_in_trash == False, matches)
+    shared_ids = db.session.query(DocumentShare.document_id).filter(
+        DocumentShare.shared_with_id == user_id).subquery()
+    shared = Document.query.filter(Document.id.in_(shared_ids), Document.is_active == True,
+                                   Document.is_in_trash == False, matches)
+    return own.union(shared).limit(limit).all()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    app = create_bench_app()
+    from app.services.document_search import document_search_service
+
+    # The benchmark measures the ranked search
+    app.config['USE_DOCUMENT_SEARCH'] = True
+
+    with app.app_context():
+        with rolled_back():
+            _, owners = seed_users(200)
+            print(f"Seeding {count:,} documents...")
+            seed_documents(count, owners)
+            user_id = str(owners[0].id)
+
+            results = []
+            for query in QUERIES:
+                _, legacy_ms, legacy_p95 = measure(lambda: legacy_search(user_id, query))
+                _, new_ms, new_p95 = measure(lambda: document_search_service.search(user_id, query))
+                results.append((query, f"{legacy_ms:.1f}", f"{legacy_p95:.1f}", f"{new_ms:.1f}", f"{new_p95:.1f}"))
+
+            print_table(['query', 'legacy ms', 'legacy p95', 'new ms', 'new p95'], results)
+
+            compiled = document_search_service.search_query(user_id, 'annual rep').statement.compile(
+                dialect=db.engine.dialect)
+            print("\nPlan for 'annual rep':")
+            plan = db.session.connection().exec_driver_sql(f"EXPLAIN ANALYZE {compiled}", compiled.params)
+            for (line,) in plan:
+                print(f"  {line}")
+
+
+if __name__ == '__main__':
+    main()
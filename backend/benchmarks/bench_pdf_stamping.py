@@ -0,0 +1,156 @@
+"""
+PDF stamping benchmark: the old two-overlay stamp_pdf vs the single overlay
+vs the process-pool engine.
+
+Generates PDFs of 1, 50 and 500 pages and stamps a batch of each (digital
+signature stamps, the case that used to build its stamp twice):
+  - legacy:  the previous stamp_pdf, kept here for comparison
+  - inline:  PDFStampingService.stamp_pdf (one overlay, one merge)
+  - engine:  the whole batch submitted to PDFStampEngine at once
+            (latency includes the time a document waits for a worker)
+Reports pages/sec over the batch and median / p95 latency per document.
+No database is needed.
+
+    python -m benchmarks.bench_pdf_stamping [1 50 500]
+
+STAMP_ENGINE_PROCESSES sets the pool size (default: CPU count).
+"""
+
+import io
+import os
+import sys
+import time
+import statistics
+from datetime import datetime
+
+from benchmarks.common import print_table
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from PyPDF2 import PdfReader, PdfWriter
+from app.services.pdf_stamping import PDFStampingService
+from app.services.stamp_engine import PDFStampEngine
+
+# Documents per batch, by page count
+BATCH_SIZES = {1: 200, 50: 20, 500: 4}
+
+STAMP_ARGS = {
+    'verification_code': 'DCH-2025-BENCH1',
+    'approver_name': 'Benchmark Approver',
+    'approval_date': datetime(2025, 1, 1, 12, 0, 0),
+    'approval_type': 'DIGITAL_SIGNATURE',
+    'signature_hash': '0x' + 'ab' * 20 + '...',
+    'tx_hash': '0x' + 'cd' * 32,
+    'signer_address': '0x' + 'ef' * 20
+}
+
+
+def make_pdf(pages):
+    """An A4 PDF with a few lines of text on every page"""
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    for page in range(pages):
+        can.setFont("Helvetica", 11)
+        for line in range(40):
+            can.drawString(60, 780 - line * 18, f"Page {page + 1}, line {line + 1}: benchmark document body text")
+        can.showPage()
+    can.save()
+    return packet.getvalue()
+
+
+def legacy_stamp(service, pdf_content, verification_code, approver_name, approval_date,
+                 approval_type, signature_hash, tx_hash, signer_address):
+    """The pre-engine stamp_pdf: two fresh overlays, the stamp drawn twice for digital signatures"""
+    original_pdf = PdfReader(io.BytesIO(pdf_content))
+    output_pdf = PdfWriter()
+    for page_num, page in enumerate(original_pdf.pages):
+        page_width = float(page.mediabox.width)
+        page_height = float(page.mediabox.height)
+        if page_num == 0:
+            qr_pdf = PdfReader(service.create_qr_overlay(verification_code, page_width, page_height))
+            page.merge_page(qr_pdf.pages[0])
+            stamp_overlay = service.create_approval_stamp(
+                approver_name, approval_date, verification_code, approval_type
+            )
+            if approval_type == "DIGITAL_SIGNATURE":
+                stamp_overlay = io.BytesIO()
+                can = canvas.Canvas(stamp_overlay, pagesize=(page_width, page_height))
+                service._draw_digital_signature_stamp(
+                    can, (page_width - service.STAMP_WIDTH) / 2, 50, approver_name, approval_date,
+                    verification_code, signature_hash, tx_hash, signer_address
+                )
+                can.save()
+                stamp_overlay.seek(0)
+            page.merge_page(PdfReader(stamp_overlay).pages[0])
+        output_pdf.add_page(page)
+    output_buffer = io.BytesIO()
+    output_pdf.write(output_buffer)
+    return output_buffer.getvalue()
+
+
+def p95(timings):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+
+
+def run_sequential(stamp, pdf_content, count):
+    """Stamp count documents one after another; return (total seconds, per-document ms)"""
+    timings = []
+    started = time.perf_counter()
+    for _ in range(count):
+        start = time.perf_counter()
+        stamp(pdf_content)
+        timings.append((time.perf_counter() - start) * 1000)
+    return time.perf_counter() - started, timings
+
+
+def run_engine(engine, pdf_content, count):
+    """Submit count documents at once; latency is submit-to-done per document"""
+    timings = []
+    started = time.perf_counter()
+    futures = []
+    for _ in range(count):
+        submitted = time.perf_counter()
+        future = engine.submit(pdf_content, **STAMP_ARGS)
+        future.add_done_callback(lambda f, s=submitted: timings.append((time.perf_counter() - s) * 1000))
+        futures.append(future)
+    for future in futures:
+        future.result()
+    return time.perf_counter() - started, timings
+
+
+def row(label, pages, count, elapsed, timings):
+    return (pages, count, label, f"{pages * count / elapsed:.0f}",
+            f"{statistics.median(timings):.1f}", f"{p95(timings):.1f}")
+
+
+def main():
+    page_counts = [int(arg) for arg in sys.argv[1:]] or [1, 50, 500]
+    processes = int(os.getenv('STAMP_ENGINE_PROCESSES', os.cpu_count() or 2))
+    service = PDFStampingService('http://localhost:5173')
+    engine = PDFStampEngine(processes=processes, base_url=service.base_url)
+    engine.start()
+
+    results = []
+    try:
+        for pages in page_counts:
+            pdf_content = make_pdf(pages)
+            count = BATCH_SIZES.get(pages, 10)
+
+            # Warm-up, so the first timed call doesn't pay for imports and fonts
+            legacy_stamp(service, pdf_content, **STAMP_ARGS)
+            service.stamp_pdf(pdf_content, **STAMP_ARGS)
+
+            elapsed, timings = run_sequential(lambda pdf: legacy_stamp(service, pdf, **STAMP_ARGS), pdf_content, count)
+            results.append(row('legacy', pages, count, elapsed, timings))
+            elapsed, timings = run_sequential(lambda pdf: service.stamp_pdf(pdf, **STAMP_ARGS), pdf_content, count)
+            results.append(row('inline', pages, count, elapsed, timings))
+            elapsed, timings = run_engine(engine, pdf_content, count)
+            results.append(row(f"engine x{processes}", pages, count, elapsed, timings))
+    finally:
+        engine.shutdown()
+
+    print_table(['pages', 'documents', 'mode', 'pages/sec', 'median ms', 'p95 ms'], results)
+
+
+if __name__ == '__main__':
+    main()
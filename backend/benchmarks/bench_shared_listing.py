@@ -0,0 +1,82 @@
+"""
+Received/Sent listing benchmark: per-row User lookups vs one DISTINCT ON query.
+
+Seeds N shares to one recipient (each document shared twice, by different
+users, so deduplication matters) and compares the old loop in
+list_documents with latest_shares_query().
+
+    python -m benchmarks.bench_shared_listing [10 100 1000 10000]
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import create_bench_app, measure, rolled_back, seed_users, document_rows, print_table
+from app import db
+from app.models.user import User
+from app.models.document import Document, DocumentShare
+
+
+def legacy_received(user_id):
+    """The pre-DISTINCT ON implementation, kept here for comparison"""
+    rows = db.session.query(Document, DocumentShare).join(
+        DocumentShare, Document.id == DocumentShare.document_id
+    ).filter(
+        DocumentShare.shared_with_id == user_id,
+        Document.is_active == True
+    ).order_by(Document.created_at.desc()).all()
+    seen_docs = set()
+    result = []
+    for doc, share in rows:
+        if doc.id not in seen_docs:
+            seen_docs.add(doc.id)
+            shared_by_user = User.query.get(share.shared_by_id)
+            result.append((doc, share, shared_by_user.email if shared_by_user else None))
+    return result
+
+
+def seed_shares(share_count):
+    _, (recipient, *sharers) = seed_users(1 + min(share_count, 50))
+    doc_count = max(1, share_count // 2)
+    docs = document_rows(sharers[0].id, doc_count)
+    db.session.execute(Document.__table__.insert(), docs)
+    now = datetime.utcnow()
+    shares = []
+    for i in range(share_count):
+        shares.append({
+            'id': uuid.uuid4(),
+            'document_id': docs[i % doc_count]['id'],
+            'shared_by_id': sharers[i % len(sharers)].id,
+            'shared_with_id': recipient.id,
+            'permission': 'read',
+            'shared_at': now - timedelta(seconds=i)
+        })
+    db.session.execute(DocumentShare.__table__.insert(), shares)
+    db.session.flush()
+    return recipient.id
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000, 10000]
+    app = create_bench_app()
+    from app.routes.documents import latest_shares_query
+
+    results = []
+    with app.app_context():
+        for size in sizes:
+            with rolled_back():
+                recipient_id = seed_shares(size)
+                legacy_q, legacy_ms, legacy_p95 = measure(lambda: legacy_received(recipient_id))
+                new_q, new_ms, new_p95 = measure(lambda: latest_shares_query(recipient_id, received=True).all())
+                results.append((size, legacy_q, f"{legacy_ms:.1f}", f"{legacy_p95:.1f}",
+                                new_q, f"{new_ms:.1f}", f"{new_p95:.1f}"))
+
+    print_table(
+        ['shares', 'legacy queries', 'legacy ms', 'legacy p95', 'new queries', 'new ms', 'new p95'],
+        results
+    )
+
+
+if __name__ == '__main__':
+    main()
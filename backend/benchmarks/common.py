@@ -0,0 +1,144 @@
+"""
+Shared helpers for the DocuChain benchmarks.
+
+Benchmarks run inside a single transaction against the database in
+DATABASE_URL and roll everything back at the end, but they still create a
+lot of rows - point them at a disposable PostgreSQL database, never at
+production.
+
+Run from the backend folder, e.g.:
+    python -m benchmarks.bench_shared_listing
+"""
+
+import os
+import sys
+import time
+import uuid
+import statistics
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import create_app, db
+
+
+def create_bench_app():
+    """Create the Flask app and refuse to run on anything but PostgreSQL"""
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        print("❌ Benchmarks need PostgreSQL (set DATABASE_URL)")
+        sys.exit(1)
+    return app
+
+
+class QueryCounter:
+    """Count SQL statements executed on the engine while active"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+
+
+def measure(fn, repeats=5):
+    """Run fn repeatedly; return (queries per run, median ms, p95 ms)"""
+    timings = []
+    queries = 0
+    for _ in range(repeats):
+        db.session.expire_all()
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = counter.count
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+    return queries, statistics.median(timings), p95
+
+
+@contextmanager
+def rolled_back():
+    """Run a benchmark body in a transaction that is always rolled back"""
+    try:
+        yield
+    finally:
+        db.session.rollback()
+
+
+def seed_users(count, institution=None):
+    """Create an institution (unless given) and count users in it"""
+    from app.models.institution import Institution
+    from app.models.user import User
+
+    if institution is None:
+        institution = Institution(
+            name='Benchmark Institution',
+            type='university',
+            unique_id=f"BENCH-{uuid.uuid4().hex[:8]}",
+            status='approved'
+        )
+        db.session.add(institution)
+        db.session.flush()
+
+    users = []
+    for i in range(count):
+        users.append(User(
+            id=uuid.uuid4(),
+            unique_id=f"B{i}",
+            email=f"bench-{uuid.uuid4().hex}@example.com",
+            password_hash='x',
+            first_name='Bench',
+            last_name=f"User{i}",
+            role='student',
+            institution_id=institution.id,
+            status='active'
+        ))
+    db.session.add_all(users)
+    db.session.flush()
+    return institution, users
+
+
+def document_rows(owner_id, count, folder_id=None, name_fn=None):
+    """Plain dicts for a bulk insert of count documents owned by owner_id"""
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        name = name_fn(i) if name_fn else f"document-{i}.pdf"
+        rows.append({
+            'id': uuid.uuid4(),
+            'name': name,
+            'file_name': name,
+            'file_size': 1024,
+            'document_type': 'application/pdf',
+            'owner_id': owner_id,
+            'owner_address': '0x0000000000000000000000000000000000000000',
+            'folder_id': folder_id,
+            'transaction_hash': '0x0',
+            'timestamp': int(now.timestamp()),
+            'is_active': True,
+            'is_in_trash': False,
+            'is_starred': False,
+            'created_at': now - timedelta(seconds=i),
+            'updated_at': now
+        })
+    return rows
+
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width table"""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = '  '.join(str(h).rjust(w) for h, w in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(v).rjust(w) for v, w in zip(row, widths)))
@@ -58,6 +58,20 @@ class Config:
     PINATA_SECRET_KEY = os.getenv('PINATA_SECRET_KEY')
     PINATA_JWT = os.getenv('PINATA_JWT')
     PINATA_GATEWAY = os.getenv('PINATA_GATEWAY', 'https://gateway.pinata.cloud/ipfs/')
+    PINATA_API_URL = os.getenv('PINATA_API_URL', 'https://api.pinata.cloud')
+    
+    # IPFS client: 'pinata', or 'local' to keep files in IPFS_LOCAL_DIR (tests / offline development)
+    IPFS_BACKEND = os.getenv('IPFS_BACKEND', 'pinata')
+    IPFS_LOCAL_DIR = os.getenv('IPFS_LOCAL_DIR')  # default: <instance folder>/ipfs
+    IPFS_CONNECT_TIMEOUT = float(os.getenv('IPFS_CONNECT_TIMEOUT', 5))  # seconds
+    IPFS_READ_TIMEOUT = float(os.getenv('IPFS_READ_TIMEOUT', 60))  # seconds
+    IPFS_UPLOAD_TIMEOUT = float(os.getenv('IPFS_UPLOAD_TIMEOUT', 120))  # seconds
+    IPFS_MAX_RETRIES = int(os.getenv('IPFS_MAX_RETRIES', 3))
+    
+    # On-disk cache of IPFS downloads, keyed by CID (IPFS content never changes)
+    IPFS_CACHE_ENABLED = os.getenv('IPFS_CACHE_ENABLED', 'true').lower() == 'true'
+    IPFS_CACHE_DIR = os.getenv('IPFS_CACHE_DIR')  # default: <system temp>/docuchain-ipfs-cache
+    IPFS_CACHE_MAX_BYTES = int(os.getenv('IPFS_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1 GB
     
     # Blockchain
     CONTRACT_ADDRESS = os.getenv('CONTRACT_ADDRESS')
@@ -73,13 +87,77 @@ class Config:
     SMTP_USERNAME = os.getenv('SMTP_USERNAME')
     SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
     
+    # Serve isShared from the denormalized documents.share_count column
+    # (run database/add_document_share_count.sql before enabling)
+    USE_DOCUMENT_SHARE_COUNT = os.getenv('USE_DOCUMENT_SHARE_COUNT', 'false').lower() == 'true'
+    
+    # Ranked full-text/trigram document search instead of plain ILIKE
+    # (run database/add_document_search.sql before enabling)
+    USE_DOCUMENT_SEARCH = os.getenv('USE_DOCUMENT_SEARCH', 'false').lower() == 'true'
+    
+    # Maintain folders.ancestor_ids and use it for subtree moves and breadcrumbs
+    # (run database/add_folder_ancestor_ids.sql before enabling)
+    USE_FOLDER_ANCESTRY = os.getenv('USE_FOLDER_ANCESTRY', 'false').lower() == 'true'
+    
+    # Serve unread counts from conversation_members.unread_count
+    # (run database/add_unread_counters.sql before enabling)
+    USE_UNREAD_COUNTERS = os.getenv('USE_UNREAD_COUNTERS', 'false').lower() == 'true'
+    UNREAD_RECONCILE_INTERVAL = int(os.getenv('UNREAD_RECONCILE_INTERVAL', 900))  # seconds; 0 = only via the admin endpoint
+    
+    # Serve dashboard stats from materialized rollups
+    # (run database/add_dashboard_rollups.sql before enabling)
+    USE_DASHBOARD_ROLLUPS = os.getenv('USE_DASHBOARD_ROLLUPS', 'false').lower() == 'true'
+    DASHBOARD_ROLLUP_REFRESH_INTERVAL = int(os.getenv('DASHBOARD_ROLLUP_REFRESH_INTERVAL', 60))  # seconds
+    
+    # Stamp approved PDFs through the job queue (stamp_worker.py) instead of in the request
+    # (run database/add_stamp_jobs.sql before enabling)
+    USE_STAMP_QUEUE = os.getenv('USE_STAMP_QUEUE', 'false').lower() == 'true'
+    # Run a stamp worker inside each web process (development; on in DevelopmentConfig)
+    STAMP_WORKER_EMBEDDED = os.getenv('STAMP_WORKER_EMBEDDED', 'false').lower() == 'true'
+    STAMP_QUEUE_POLL_INTERVAL = float(os.getenv('STAMP_QUEUE_POLL_INTERVAL', 1.0))  # seconds
+    STAMP_JOB_MAX_ATTEMPTS = int(os.getenv('STAMP_JOB_MAX_ATTEMPTS', 5))
+    STAMP_JOB_LEASE_SECONDS = int(os.getenv('STAMP_JOB_LEASE_SECONDS', 300))  # renewed every third while a job runs
+    
+    # Process pool that stamps the PDFs (0 stamps in the calling process)
+    STAMP_ENGINE_PROCESSES = int(os.getenv('STAMP_ENGINE_PROCESSES', 2))
+    STAMP_ENGINE_START_METHOD = os.getenv('STAMP_ENGINE_START_METHOD', 'spawn')
+    STAMP_ENGINE_TIMEOUT = int(os.getenv('STAMP_ENGINE_TIMEOUT', 120))  # seconds per document
+    
+    # /verify-file: verification code extraction from uploaded PDFs
+    VERIFY_EXTRACT_PROCESSES = int(os.getenv('VERIFY_EXTRACT_PROCESSES', 1))  # per web worker; 0 = in the request
+    VERIFY_EXTRACT_CPU_BUDGET = float(os.getenv('VERIFY_EXTRACT_CPU_BUDGET', 2.0))  # CPU seconds per upload
+    VERIFY_EXTRACT_MAX_PAGES = int(os.getenv('VERIFY_EXTRACT_MAX_PAGES', 50))  # pages searched after the first
+    VERIFY_EXTRACT_MAX_PENDING = int(os.getenv('VERIFY_EXTRACT_MAX_PENDING', 8))  # concurrent uploads per web worker
+    VERIFY_EXTRACT_TIMEOUT = int(os.getenv('VERIFY_EXTRACT_TIMEOUT', 15))  # seconds
+    VERIFY_EXTRACT_CACHE_TTL = int(os.getenv('VERIFY_EXTRACT_CACHE_TTL', 86400))  # seconds, keyed by SHA-256
+    
+    # Buffered activity log writer (false writes each entry immediately)
+    ACTIVITY_LOG_ASYNC = os.getenv('ACTIVITY_LOG_ASYNC', 'true').lower() == 'true'
+    ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+    ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 500))
+    ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 1.0))  # seconds
+    
+    # Monthly activity_logs partitions (run database/partition_activity_logs.sql before enabling)
+    ACTIVITY_LOG_PARTITIONING = os.getenv('ACTIVITY_LOG_PARTITIONING', 'false').lower() == 'true'
+    ACTIVITY_LOG_PARTITIONS_AHEAD = int(os.getenv('ACTIVITY_LOG_PARTITIONS_AHEAD', 3))  # months created ahead
+    ACTIVITY_LOG_RETENTION_MONTHS = int(os.getenv('ACTIVITY_LOG_RETENTION_MONTHS', 12))  # months kept attached
+    ACTIVITY_LOG_ARCHIVE_DIR = os.getenv('ACTIVITY_LOG_ARCHIVE_DIR')  # detached partitions are archived here, then dropped
+    ACTIVITY_LOG_MAINTENANCE_INTERVAL = int(os.getenv('ACTIVITY_LOG_MAINTENANCE_INTERVAL', 21600))  # seconds
+    
     # Other
     TRASH_RETENTION_DAYS = int(os.getenv('TRASH_RETENTION_DAYS', 30))
     
     # Performance & Caching
-    CACHE_TYPE = 'simple'  # Use 'redis' in production with Redis server
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'simple')  # 'redis' shares the cache across gunicorn workers
+    CACHE_REDIS_URL = os.getenv('REDIS_URL')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))  # Bound for the in-process LRU
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes default cache
     
+    # WebSocket presence & cross-worker delivery
+    PRESENCE_TYPE = os.getenv('PRESENCE_TYPE', 'local')  # 'redis' shares connected users across workers
+    PRESENCE_REDIS_URL = os.getenv('REDIS_URL')
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')  # e.g. redis://localhost:6379/0
+    
     # Compression
     COMPRESS_MIMETYPES = ['text/html', 'text/css', 'application/json', 'application/javascript']
     COMPRESS_LEVEL = 6
@@ -89,6 +167,7 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     TESTING = False
+    STAMP_WORKER_EMBEDDED = os.getenv('STAMP_WORKER_EMBEDDED', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     """Production configuration"""
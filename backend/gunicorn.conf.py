@@ -50,3 +50,9 @@ def on_starting(server):
 def worker_exit(server, worker):
     """Clean up on worker exit"""
     print(f"Worker {worker.pid} exiting...")
+    # Persist audit entries still buffered in this worker
+    try:
+        from app.services.activity_log_writer import activity_log_writer
+        activity_log_writer.shutdown()
+    except Exception as e:
+        print(f"Worker {worker.pid} could not flush activity logs: {e}")
@@ -0,0 +1,47 @@
+# Stamp worker - processes queued PDF stamp jobs (see app/services/stamp_queue.py)
+#
+#   python stamp_worker.py
+#
+# Run as many processes as needed; jobs are claimed with SKIP LOCKED so each
+# job goes to exactly one worker. Set SOCKETIO_MESSAGE_QUEUE (same value as
+# the web app) so completion events reach connected browsers. Requires
+# USE_STAMP_QUEUE=true (on the web app too); STAMP_WORKER_EMBEDDED is for
+# development only.
+
+import os
+import signal
+
+# Gevent monkey-patching MUST be done before any other imports
+if os.getenv('FLASK_ENV') == 'production':
+    from gevent import monkey
+    monkey.patch_all()
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import create_app
+from app.services.stamp_queue import stamp_job_queue
+from app.services.stamp_engine import stamp_engine
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    """Finish the current job, then exit"""
+    global _stopping
+    _stopping = True
+    print(f"Stamp worker {os.getpid()} stopping after the current job...")
+
+
+# The app is created under __main__ only: the stamp engine's spawned
+# processes re-import this module and must not build an app of their own
+if __name__ == '__main__':
+    app = create_app()
+    if not app.config.get('USE_STAMP_QUEUE'):
+        raise SystemExit("USE_STAMP_QUEUE is off: run database/add_stamp_jobs.sql and enable it first")
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    print(f"Stamp worker {stamp_job_queue.worker_id} started")
+    stamp_job_queue.work(app, stop=lambda: _stopping)
+    stamp_engine.shutdown()
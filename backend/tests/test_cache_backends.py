@@ -0,0 +1,100 @@
+"""
+Response cache backends: LRU/expiry/tag behaviour of the local backend and
+invalidation of the Redis backend against an in-memory fake server.
+
+    python -m pytest tests   (or: python -m unittest discover tests)
+"""
+
+import unittest
+from unittest import mock
+
+from app.performance import (
+    LocalCacheBackend, RedisCacheBackend, CACHE_KEY_PREFIX, STATS_KEY_PREFIX, cleanup_cache
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def entry(body):
+    return {'body': body, 'status': 200, 'mimetype': 'application/json'}
+
+
+class LocalCacheBackendTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalCacheBackend(max_entries=2)
+        cache.set('a', entry('a'), 60)
+        cache.set('b', entry('b'), 60)
+        cache.get('a')
+        cache.set('c', entry('c'), 60)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expired_entries_are_misses(self):
+        cache = LocalCacheBackend()
+        cache.set('a', entry('a'), -1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_delete_tags_removes_only_tagged_keys(self):
+        cache = LocalCacheBackend()
+        cache.set('docs:1', entry('1'), 60, tags=['user:1'])
+        cache.set('docs:2', entry('2'), 60, tags=['user:2'])
+        self.assertEqual(cache.delete_tags(['user:1']), 1)
+        self.assertIsNone(cache.get('docs:1'))
+        self.assertIsNotNone(cache.get('docs:2'))
+
+    def test_delete_matching(self):
+        cache = LocalCacheBackend()
+        cache.set('documents:1', entry('1'), 60)
+        cache.set('folders:1', entry('1'), 60)
+        self.assertEqual(cache.delete_matching('documents'), 1)
+        self.assertIsNotNone(cache.get('folders:1'))
+        cache.delete_matching(None)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_cleanup_cache_drops_expired_entries_and_their_tags(self):
+        cache = LocalCacheBackend()
+        cache.set('docs:1', entry('1'), -1, tags=['user:1'])
+        cache.set('docs:2', entry('2'), 60, tags=['user:2'])
+        with mock.patch('app.performance._cache_backend', cache):
+            cleanup_cache()
+        self.assertEqual(list(cache._entries), ['docs:2'])
+        self.assertEqual(set(cache._tags), {'user:2'})
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class RedisCacheBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        self.cache = RedisCacheBackend(self.client)
+
+    def tearDown(self):
+        if self.cache._listener is not None:
+            self.cache._listener.stop()
+
+    def test_delete_tags_clears_redis_and_near_cache(self):
+        self.cache.set('docs:1', entry('1'), 60, tags=['user:1'])
+        self.cache.set('docs:2', entry('2'), 60, tags=['user:2'])
+        self.assertEqual(self.cache.delete_tags(['user:1']), 1)
+        self.assertIsNone(self.cache.get('docs:1'))
+        self.assertIsNone(self.client.get(CACHE_KEY_PREFIX + 'docs:1'))
+        self.assertEqual(self.cache.get('docs:2')['body'], '2')
+
+    def test_full_invalidation_keeps_stats(self):
+        self.cache.set('docs:1', entry('1'), 60)
+        self.cache.record(True)
+        self.cache.record(False)
+        self.cache.delete_matching(None)
+        self.assertIsNone(self.cache.get('docs:1'))
+        self.assertEqual(int(self.client.get(STATS_KEY_PREFIX + 'hits')), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+IPFS_BACKEND=local: content-addressed pinning and reads from a directory on
+disk, through the same IPFSClient calls the app makes against Pinata.
+
+    python -m pytest tests   (or: python -m unittest discover tests)
+"""
+
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app.services.ipfs_client import IPFSClient, IPFSError, LocalBackend
+
+
+class LocalBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp(prefix='docuchain-ipfs-')
+        self.addCleanup(shutil.rmtree, self.local_dir, ignore_errors=True)
+        app = Flask(__name__)
+        app.config.update(IPFS_BACKEND='local', IPFS_LOCAL_DIR=self.local_dir)
+        self.client = IPFSClient()
+        self.client.configure(app)
+
+    def test_configure_selects_local_backend(self):
+        self.assertIsInstance(self.client.backend, LocalBackend)
+        self.assertEqual(self.client.get_stats()['backend'], 'local')
+
+    def test_cid_is_cidv1_of_the_content_digest(self):
+        data = b'%PDF-1.4 approved document'
+        cid = self.client.pin_file(data, 'doc.pdf', content_type='application/pdf')
+        self.assertTrue(cid.startswith('bafkrei'))
+        raw = base64.b32decode(cid[1:].upper() + '=' * (-len(cid[1:]) % 8))
+        self.assertEqual(raw[:4], bytes([0x01, 0x55, 0x12, 0x20]))
+        self.assertEqual(raw[4:], hashlib.sha256(data).digest())
+
+    def test_same_content_same_cid(self):
+        first = self.client.pin_file(b'same', 'a.pdf')
+        second = self.client.pin_file(b'same', 'b.pdf')
+        other = self.client.pin_file(b'other', 'c.pdf')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_round_trips_every_source_type(self):
+        data = os.urandom(200 * 1024)  # several CHUNK_SIZE reads
+        path = os.path.join(self.local_dir, 'source.bin')
+        with open(path, 'wb') as f:
+            f.write(data)
+        fileobj = io.BytesIO(b'skip' + data)
+        fileobj.seek(4)  # files are read from their current position
+        sources = {'bytes': data, 'memoryview': memoryview(data), 'path': path, 'file': fileobj}
+
+        cids = set()
+        for name, source in sources.items():
+            with self.subTest(source=name):
+                cid = self.client.pin_file(source, 'source.bin')
+                self.assertEqual(self.client.cat(cid), data)
+                out = io.BytesIO()
+                self.assertEqual(self.client.download_to(cid, out), len(data))
+                self.assertEqual(out.getvalue(), data)
+                cids.add(cid)
+        self.assertEqual(len(cids), 1)
+        self.assertEqual(self.client.stats['uploads'], len(sources))
+        self.assertEqual(self.client.stats['bytes_uploaded'], len(sources) * len(data))
+
+    def test_no_partial_files_left_behind(self):
+        self.client.pin_file(b'content', 'doc.pdf')
+        self.assertEqual([n for n in os.listdir(self.local_dir) if n.endswith('.part')], [])
+
+    def test_unknown_cid_raises(self):
+        with self.assertRaises(IPFSError):
+            self.client.cat('bafkreimissing')
+        # Only names inside the store are looked up
+        with self.assertRaises(IPFSError):
+            self.client.cat('../' + os.path.basename(self.local_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+-- Indexes for the paginated circulars feed
+-- circulars_feed_page() walks each circular's newest live posts with
+-- ORDER BY created_at DESC, id DESC and aggregates likes/comments/saves
+-- for the page's message ids only.
+
+\c "Docu-Chain";
+
+CREATE INDEX IF NOT EXISTS idx_messages_live_conv_created_id
+    ON messages (conversation_id, created_at DESC, id DESC)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS idx_message_comments_live_message
+    ON message_comments (message_id)
+    WHERE is_deleted = false;
+
+-- message_likes / saved_posts are covered by their unique
+-- (message_id, user_id) constraints
@@ -0,0 +1,150 @@
+-- Pre-aggregated dashboard statistics
+-- One row per institution (admin dashboard) and one row per user (faculty and
+-- student dashboards), so GET /api/dashboard/stats is a single indexed read
+-- instead of a dozen COUNT queries. After running this script, set
+-- USE_DASHBOARD_ROLLUPS=true in backend/.env; the app then refreshes both
+-- views concurrently every DASHBOARD_ROLLUP_REFRESH_INTERVAL seconds.
+
+\c "Docu-Chain";
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_institution_stats AS
+WITH bounds AS (
+    SELECT timezone('utc', now())::date AS today,
+           date_trunc('month', timezone('utc', now())) AS month_start
+),
+user_counts AS (
+    SELECT u.institution_id,
+           COUNT(*) FILTER (WHERE u.role = 'student' AND u.status = 'active') AS active_students,
+           COUNT(*) FILTER (WHERE u.role = 'faculty' AND u.status = 'active') AS active_faculty,
+           COUNT(*) FILTER (WHERE u.role = 'admin' AND u.status = 'active') AS active_admins,
+           COUNT(DISTINCT u.department_id) AS departments,
+           COUNT(*) FILTER (WHERE u.last_login::date = b.today) AS active_today,
+           COUNT(*) FILTER (WHERE u.status = 'pending') AS pending_accounts,
+           COUNT(*) FILTER (WHERE u.role = 'student' AND u.created_at >= b.month_start) AS new_students_this_month
+    FROM users u
+    CROSS JOIN bounds b
+    WHERE u.institution_id IS NOT NULL
+    GROUP BY u.institution_id
+),
+document_counts AS (
+    SELECT u.institution_id,
+           COUNT(*) FILTER (WHERE d.is_active) AS active_documents,
+           COUNT(*) FILTER (WHERE d.created_at >= b.month_start) AS new_documents_this_month
+    FROM documents d
+    JOIN users u ON u.id = d.owner_id
+    CROSS JOIN bounds b
+    GROUP BY u.institution_id
+),
+approval_counts AS (
+    SELECT u.institution_id,
+           COUNT(*) FILTER (WHERE r.status = 'APPROVED') AS approved,
+           COUNT(*) FILTER (WHERE r.status = 'PENDING') AS pending,
+           COUNT(*) FILTER (WHERE r.status = 'REJECTED') AS rejected
+    FROM approval_requests r
+    JOIN users u ON u.id = r.requester_id
+    GROUP BY u.institution_id
+),
+blockchain_counts AS (
+    SELECT u.institution_id, COUNT(*) AS confirmed_transactions
+    FROM blockchain_transactions t
+    JOIN users u ON u.id = t.user_id
+    WHERE t.status = 'confirmed'
+    GROUP BY u.institution_id
+),
+share_counts AS (
+    SELECT u.institution_id, COUNT(*) AS shares
+    FROM document_shares s
+    JOIN documents d ON d.id = s.document_id
+    JOIN users u ON u.id = d.owner_id
+    GROUP BY u.institution_id
+)
+SELECT uc.institution_id,
+       uc.active_students, uc.active_faculty, uc.active_admins, uc.departments,
+       uc.active_today, uc.pending_accounts, uc.new_students_this_month,
+       COALESCE(dc.active_documents, 0) AS active_documents,
+       COALESCE(dc.new_documents_this_month, 0) AS new_documents_this_month,
+       COALESCE(ac.approved, 0) AS approved_requests,
+       COALESCE(ac.pending, 0) AS pending_requests,
+       COALESCE(ac.rejected, 0) AS rejected_requests,
+       COALESCE(bc.confirmed_transactions, 0) AS confirmed_transactions,
+       COALESCE(sc.shares, 0) AS shares
+FROM user_counts uc
+LEFT JOIN document_counts dc ON dc.institution_id = uc.institution_id
+LEFT JOIN approval_counts ac ON ac.institution_id = uc.institution_id
+LEFT JOIN blockchain_counts bc ON bc.institution_id = uc.institution_id
+LEFT JOIN share_counts sc ON sc.institution_id = uc.institution_id;
+
+-- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY, and the dashboard lookup
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dashboard_institution_stats_institution
+    ON dashboard_institution_stats (institution_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_user_stats AS
+WITH document_counts AS (
+    SELECT d.owner_id AS user_id,
+           COUNT(*) FILTER (WHERE d.is_active) AS active_documents,
+           COUNT(*) FILTER (WHERE d.is_active AND d.ipfs_hash IS NOT NULL) AS verified_documents,
+           COUNT(*) FILTER (WHERE d.is_active AND d.document_type = 'generated') AS generated_documents
+    FROM documents d
+    GROUP BY d.owner_id
+),
+request_counts AS (
+    SELECT r.requester_id AS user_id,
+           COUNT(*) FILTER (WHERE r.status = 'PENDING') AS pending_requests,
+           COUNT(*) FILTER (WHERE r.status = 'APPROVED') AS approved_requests,
+           COUNT(*) FILTER (WHERE r.status = 'REJECTED') AS rejected_requests
+    FROM approval_requests r
+    GROUP BY r.requester_id
+),
+step_counts AS (
+    SELECT s.approver_id AS user_id,
+           COUNT(*) FILTER (WHERE NOT s.has_approved AND NOT s.has_rejected AND r.status = 'PENDING') AS pending_for_me,
+           COUNT(*) FILTER (WHERE s.has_approved) AS approved_by_me,
+           COUNT(*) FILTER (WHERE s.has_rejected) AS rejected_by_me
+    FROM approval_steps s
+    JOIN approval_requests r ON r.id = s.request_id
+    GROUP BY s.approver_id
+),
+received_shares AS (
+    SELECT shared_with_id AS user_id, COUNT(*) AS shared_with_me
+    FROM document_shares
+    GROUP BY shared_with_id
+),
+sent_shares AS (
+    SELECT d.owner_id AS user_id, COUNT(*) AS shared_by_me
+    FROM document_shares s
+    JOIN documents d ON d.id = s.document_id
+    GROUP BY d.owner_id
+)
+SELECT u.id AS user_id,
+       u.institution_id,
+       COALESCE(dc.active_documents, 0) AS active_documents,
+       COALESCE(dc.verified_documents, 0) AS verified_documents,
+       COALESCE(dc.generated_documents, 0) AS generated_documents,
+       COALESCE(rc.pending_requests, 0) AS pending_requests,
+       COALESCE(rc.approved_requests, 0) AS approved_requests,
+       COALESCE(rc.rejected_requests, 0) AS rejected_requests,
+       COALESCE(sc.pending_for_me, 0) AS pending_for_me,
+       COALESCE(sc.approved_by_me, 0) AS approved_by_me,
+       COALESCE(sc.rejected_by_me, 0) AS rejected_by_me,
+       COALESCE(rs.shared_with_me, 0) AS shared_with_me,
+       COALESCE(ss.shared_by_me, 0) AS shared_by_me
+FROM users u
+LEFT JOIN document_counts dc ON dc.user_id = u.id
+LEFT JOIN request_counts rc ON rc.user_id = u.id
+LEFT JOIN step_counts sc ON sc.user_id = u.id
+LEFT JOIN received_shares rs ON rs.user_id = u.id
+LEFT JOIN sent_shares ss ON ss.user_id = u.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dashboard_user_stats_user
+    ON dashboard_user_stats (user_id);
+
+-- When the views were last refreshed (kept out of the views themselves so a
+-- concurrent refresh only rewrites rows whose counts changed)
+CREATE TABLE IF NOT EXISTS dashboard_rollup_refreshes (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    refreshed_at TIMESTAMP NOT NULL
+);
+
+INSERT INTO dashboard_rollup_refreshes (id, refreshed_at)
+VALUES (1, timezone('utc', now()))
+ON CONFLICT (id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
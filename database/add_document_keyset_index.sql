@@ -0,0 +1,9 @@
+-- Keyset pagination index for document listings
+-- Serves GET /api/documents?limit=N&cursor=... and ?stream=ndjson, which order
+-- a user's folder by (created_at DESC, id DESC) and seek past the last row.
+
+\c "Docu-Chain";
+
+CREATE INDEX IF NOT EXISTS idx_documents_owner_folder_keyset
+    ON documents (owner_id, folder_id, created_at DESC, id DESC)
+    WHERE is_active = true AND is_in_trash = false;
@@ -0,0 +1,29 @@
+-- Document search: generated tsvector column + trigram indexes
+-- Used by app/services/document_search.py (GET /api/documents/search);
+-- set USE_DOCUMENT_SEARCH=true once this has run.
+-- The expression must match SEARCH_VECTOR_SQL in app/models/document.py.
+-- Requires PostgreSQL 12+ (generated columns) and the pg_trgm extension.
+
+\c "Docu-Chain";
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', regexp_replace(coalesce(name, ''), '[^[:alnum:]]+', ' ', 'g')), 'A') ||
+        setweight(to_tsvector('simple', regexp_replace(coalesce(file_name, ''), '[^[:alnum:]]+', ' ', 'g')), 'B') ||
+        setweight(to_tsvector('simple', regexp_replace(coalesce(document_type, ''), '[^[:alnum:]]+', ' ', 'g')), 'C')
+    ) STORED;
+
+-- Full-text prefix matches (search_vector @@ to_tsquery('simple', 'rep:*'))
+CREATE INDEX IF NOT EXISTS idx_documents_search_vector ON documents USING GIN (search_vector);
+
+-- Substring matches (ILIKE '%q%') and similarity ranking
+CREATE INDEX IF NOT EXISTS idx_documents_name_trgm ON documents USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_documents_file_name_trgm ON documents USING GIN (file_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_documents_document_type_trgm ON documents USING GIN (document_type gin_trgm_ops);
+
+-- Visibility check for shared results (EXISTS on document_shares)
+CREATE INDEX IF NOT EXISTS idx_docshares_document_shared_with ON document_shares (document_id, shared_with_id);
+
+ANALYZE documents;
@@ -0,0 +1,21 @@
+-- Denormalized share counter for documents
+-- Lets document listings resolve isShared without counting document_shares per row.
+-- After running this script, set USE_DOCUMENT_SHARE_COUNT=true in backend/.env;
+-- routes/shares.py then keeps the counter in sync on share and revoke.
+
+\c "Docu-Chain";
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS share_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill from existing shares
+UPDATE documents d
+SET share_count = s.cnt
+FROM (
+    SELECT document_id, COUNT(*) AS cnt
+    FROM document_shares
+    GROUP BY document_id
+) s
+WHERE d.id = s.document_id;
+
+-- Grouped share lookups used by the bulk document serializer
+CREATE INDEX IF NOT EXISTS idx_docshares_document_id ON document_shares (document_id);
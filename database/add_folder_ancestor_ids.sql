@@ -0,0 +1,35 @@
+-- Materialized folder ancestry
+-- folders.ancestor_ids holds the folder ids from the root down to the folder
+-- itself. The backend sets it on insert and rewrites whole subtrees on
+-- rename/move (Folder.update_children_paths), so search breadcrumbs and
+-- subtree lookups need a single query instead of walking parent_id.
+--
+-- Run this, then set USE_FOLDER_ANCESTRY=true. The script is idempotent:
+-- run it again right before enabling if folders were created or moved in
+-- between. Subtree moves rewrite descendant paths by prefix, so the backfill
+-- also rebuilds path and level from the parent_id hierarchy, repairing paths
+-- left stale by renames/moves made before update_children_paths existed.
+
+\c "Docu-Chain";
+
+ALTER TABLE folders ADD COLUMN IF NOT EXISTS ancestor_ids UUID[];
+
+-- Backfill ancestry, path and level of existing folders from the parent_id hierarchy
+WITH RECURSIVE chain AS (
+    SELECT id, ARRAY[id] AS ancestor_ids, '/' || name AS path, 0 AS level
+    FROM folders
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT f.id, c.ancestor_ids || f.id, c.path || '/' || f.name, c.level + 1
+    FROM folders f
+    JOIN chain c ON f.parent_id = c.id
+)
+UPDATE folders
+SET ancestor_ids = chain.ancestor_ids,
+    path = chain.path,
+    level = chain.level
+FROM chain
+WHERE folders.id = chain.id;
+
+-- Subtree lookups: WHERE ancestor_ids @> ARRAY[<folder id>]
+CREATE INDEX IF NOT EXISTS idx_folders_ancestor_ids ON folders USING GIN (ancestor_ids);
@@ -0,0 +1,11 @@
+-- Indexes for the Shared/Received and Shared/Sent listings
+-- latest_shares_query() picks the latest share per document with
+-- DISTINCT ON (document_id) ... ORDER BY document_id, shared_at DESC.
+
+\c "Docu-Chain";
+
+CREATE INDEX IF NOT EXISTS idx_docshares_with_doc_shared_at
+    ON document_shares (shared_with_id, document_id, shared_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_docshares_by_doc_shared_at
+    ON document_shares (shared_by_id, document_id, shared_at DESC);
@@ -0,0 +1,34 @@
+-- Durable queue for PDF stamping
+-- approve_document inserts a stamp_jobs row in the approval's transaction;
+-- stamp workers (backend/stamp_worker.py) claim rows with FOR UPDATE SKIP
+-- LOCKED, retry failures with backoff and record the stamped IPFS hash.
+-- Run this script before deploying the stamp queue.
+
+\c "Docu-Chain";
+
+CREATE TABLE IF NOT EXISTS stamp_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    approval_request_id UUID NOT NULL REFERENCES approval_requests(id) ON DELETE CASCADE,
+    requested_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    locked_by VARCHAR(255),
+    locked_at TIMESTAMP,
+    payload JSONB NOT NULL,
+    result_ipfs_hash VARCHAR(255),
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    updated_at TIMESTAMP DEFAULT timezone('utc', now()),
+    completed_at TIMESTAMP
+);
+
+-- Claim scan: only unfinished jobs are indexed, so the index stays tiny
+CREATE INDEX IF NOT EXISTS idx_stamp_jobs_runnable
+    ON stamp_jobs (run_after)
+    WHERE status IN ('queued', 'running');
+
+-- Status polling per approval request
+CREATE INDEX IF NOT EXISTS idx_stamp_jobs_approval_request
+    ON stamp_jobs (approval_request_id, created_at DESC);
@@ -0,0 +1,28 @@
+-- Per-member unread counters for chat
+-- Lets /api/chat/unread and the conversation list read a counter instead of
+-- counting messages per conversation. After running this script, set
+-- USE_UNREAD_COUNTERS=true in backend/.env; send/read paths then keep the
+-- counters in sync and POST /api/chat/admin/reconcile-unread repairs drift.
+
+\c "Docu-Chain";
+
+ALTER TABLE conversation_members ADD COLUMN IF NOT EXISTS unread_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill from existing messages
+UPDATE conversation_members target
+SET unread_count = actual.count
+FROM (
+    SELECT cm.id, COUNT(m.id) AS count
+    FROM conversation_members cm
+    LEFT JOIN messages m
+      ON m.conversation_id = cm.conversation_id
+     AND m.sender_id <> cm.user_id
+     AND m.is_deleted = false
+     AND (cm.last_read_at IS NULL OR m.created_at > cm.last_read_at)
+    GROUP BY cm.id
+) actual
+WHERE target.id = actual.id;
+
+-- Index-only SUM(unread_count) per user
+CREATE INDEX IF NOT EXISTS idx_conv_members_user_unread
+    ON conversation_members (user_id) INCLUDE (unread_count);
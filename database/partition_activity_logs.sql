@@ -0,0 +1,112 @@
+-- Monthly range partitioning for activity_logs
+-- Converts the append-only audit table into a table partitioned by
+-- created_at. Existing rows before the current month are attached as a
+-- single partition (activity_logs_legacy) instead of being copied; rows of the
+-- current month move into their monthly partition. Monthly partitions are
+-- named activity_logs_pYYYY_MM; a default partition catches anything outside
+-- the created range.
+--
+-- After running this script, set ACTIVITY_LOG_PARTITIONING=true in
+-- backend/.env. The app then creates partitions ahead of time, detaches
+-- partitions older than ACTIVITY_LOG_RETENTION_MONTHS and, when
+-- ACTIVITY_LOG_ARCHIVE_DIR is set, archives detached partitions to
+-- gzip-compressed CSV files (see app/services/activity_log_partitions.py).
+
+\c "Docu-Chain";
+
+-- Build the indexes the legacy partition needs before taking any lock that
+-- blocks writers. ATTACH PARTITION requires the same primary key as the
+-- parent, (id, created_at), and adopts matching indexes instead of building
+-- them inside the transaction below.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS activity_logs_legacy_pkey_new
+    ON activity_logs (id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS activity_logs_legacy_user_created
+    ON activity_logs (user_id, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS activity_logs_legacy_user_action
+    ON activity_logs (user_id, action_category, action_type);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS activity_logs_legacy_created_brin
+    ON activity_logs USING brin (created_at) WITH (pages_per_range = 32);
+
+BEGIN;
+
+ALTER TABLE activity_logs RENAME TO activity_logs_legacy;
+ALTER TABLE activity_logs_legacy
+    DROP CONSTRAINT activity_logs_pkey,
+    ADD CONSTRAINT activity_logs_legacy_pkey PRIMARY KEY USING INDEX activity_logs_legacy_pkey_new;
+
+-- The partition key must be part of the primary key
+CREATE TABLE activity_logs (
+    id UUID NOT NULL,
+    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    action_type VARCHAR(50) NOT NULL,
+    action_category VARCHAR(50) NOT NULL,
+    description TEXT NOT NULL,
+    target_id VARCHAR(255),
+    target_type VARCHAR(50),
+    target_name VARCHAR(500),
+    extra_data JSONB DEFAULT '{}'::jsonb,
+    ip_address VARCHAR(45),
+    user_agent VARCHAR(500),
+    status VARCHAR(20) DEFAULT 'success',
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Per-user listing, export and stats: newest first within a user
+CREATE INDEX idx_activity_logs_user_created ON activity_logs (user_id, created_at DESC);
+-- Per-user filter options and category/action breakdowns
+CREATE INDEX idx_activity_logs_user_action ON activity_logs (user_id, action_category, action_type);
+-- Time range scans across users (admin views, archival); tiny next to a btree
+CREATE INDEX idx_activity_logs_created_brin ON activity_logs USING brin (created_at) WITH (pages_per_range = 32);
+
+CREATE TABLE activity_logs_default PARTITION OF activity_logs DEFAULT;
+
+-- Current month plus three months ahead
+DO $$
+DECLARE
+    month_start DATE := date_trunc('month', timezone('utc', now()))::date;
+    i INTEGER;
+    lower_bound DATE;
+BEGIN
+    FOR i IN 0..3 LOOP
+        lower_bound := (month_start + make_interval(months => i))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF activity_logs FOR VALUES FROM (%L) TO (%L)',
+            'activity_logs_p' || to_char(lower_bound, 'YYYY_MM'),
+            lower_bound,
+            (lower_bound + interval '1 month')::date
+        );
+    END LOOP;
+END $$;
+
+-- Move this month's rows (and any clock-skewed future rows) out of the legacy table
+INSERT INTO activity_logs (
+    id, user_id, action_type, action_category, description, target_id, target_type,
+    target_name, extra_data, ip_address, user_agent, status, created_at
+)
+SELECT id, user_id, action_type, action_category, description, target_id, target_type,
+       target_name, extra_data, ip_address, user_agent, status, created_at
+FROM activity_logs_legacy
+WHERE created_at >= date_trunc('month', timezone('utc', now()));
+
+DELETE FROM activity_logs_legacy
+WHERE created_at >= date_trunc('month', timezone('utc', now()));
+
+-- Attach the history as one partition; the validated CHECK lets ATTACH skip its own scan
+DO $$
+DECLARE
+    boundary DATE := date_trunc('month', timezone('utc', now()))::date;
+BEGIN
+    EXECUTE format(
+        'ALTER TABLE activity_logs_legacy ADD CONSTRAINT activity_logs_legacy_range CHECK (created_at IS NOT NULL AND created_at < %L)',
+        boundary
+    );
+    EXECUTE format(
+        'ALTER TABLE activity_logs ATTACH PARTITION activity_logs_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        boundary
+    );
+END $$;
+
+COMMIT;
+
+ANALYZE activity_logs;
@@ -68,7 +68,24 @@ const NotificationDropdown = () => {
     return () => clearInterval(interval);
   }, [fetchNotifications]);
 
-  // Close dropdown when clicking outside
+  // Live notifications pushed over the chat socket
+  useEffect(() => {
+    const handlePushed = (event) => {
+      const pushed = (event.detail && event.detail.notifications) || [];
+      if (!pushed.length) return;
+      setNotifications(prev => {
+        const known = new Set(prev.map(n => n.id));
+        const fresh = pushed.filter(n => !known.has(n.id));
+        return [...fresh.reverse(), ...prev].slice(0, 10);
+      });
+      setUnreadCount(prev => prev + pushed.filter(n => !n.is_read).length);
+    };
+
+    window.addEventListener('docuchain:notifications', handlePushed);
+    return () => window.removeEventListener('docuchain:notifications', handlePushed);
+  }, []);
+
+    // Close dropdown when clicking outside
   useEffect(() => {
     const handleClickOutside = (event) => {
       if (dropdownRef.current && !dropdownRef.current.contains(event.target)) {
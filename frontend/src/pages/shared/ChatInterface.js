@@ -285,8 +285,10 @@ const ChatInterface = () => {
 
     // Circulars feed state
     const [circularsFeed, setCircularsFeed] = useState([]);
+    const [circularsFeedCursor, setCircularsFeedCursor] = useState(null);
     const [canPostCircular, setCanPostCircular] = useState(false);
     const [circularsList, setCircularsList] = useState([]);
+    const circularsTotalPosts = circularsList.reduce((sum, c) => sum + (c.postCount ?? 0), 0) || circularsFeed.length;
     const [newCircularPost, setNewCircularPost] = useState('');
     const [selectedCircularId, setSelectedCircularId] = useState('');
     const [circularAttachment, setCircularAttachment] = useState(null);
@@ -617,15 +619,18 @@ const ChatInterface = () => {
     }, []);
 
     // Fetch circulars feed
-    const fetchCircularsFeed = useCallback(async () => {
+    // Pass the previous page's cursor to append the next (older) page
+    const fetchCircularsFeed = useCallback(async (cursor = null) => {
         try {
-            const response = await fetch(`${API_URL}/chat/circulars/feed`, {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await fetch(`${API_URL}/chat/circulars/feed${query}`, {
                 headers: getAuthHeader()
             });
             
             if (response.ok) {
                 const data = await response.json();
-                setCircularsFeed(data.feed || []);
+                setCircularsFeed(prev => cursor ? [...prev, ...(data.feed || [])] : (data.feed || []));
+                setCircularsFeedCursor(data.nextCursor || null);
                 setCanPostCircular(data.canPost || false);
                 setCircularsList(data.circulars || []);
                 if (data.circulars?.length > 0 && !selectedCircularId) {
@@ -639,8 +644,8 @@ const ChatInterface = () => {
                     if (item.userLiked) liked.add(item.id);
                     if (item.userSaved) saved.add(item.id);
                 });
-                setLikedPosts(liked);
-                setSavedPosts(saved);
+                setLikedPosts(prev => cursor ? new Set([...prev, ...liked]) : liked);
+                setSavedPosts(prev => cursor ? new Set([...prev, ...saved]) : saved);
             }
         } catch (error) {
             console.error('Error fetching circulars feed:', error);
@@ -977,6 +982,22 @@ const ChatInterface = () => {
             setOnlineUsers(prev => ({ ...prev, [data.userId]: { online: false, lastSeen: data.lastSeen } }));
         });
         
+        // Batched presence changes for everyone we share a conversation with
+        socket.on('presence_update', (data) => {
+            setOnlineUsers(prev => {
+                const next = { ...prev };
+                (data.users || []).forEach(u => {
+                    next[u.userId] = { online: u.online, lastSeen: u.lastSeen };
+                });
+                return next;
+            });
+        });
+        
+        // Notifications pushed by the server-side fan-out; the dropdown listens for these
+        socket.on('notifications', (data) => {
+            window.dispatchEvent(new CustomEvent('docuchain:notifications', { detail: data }));
+        });
+        
         } catch (error) {
             console.warn('Failed to initialize WebSocket:', error);
         }
@@ -3871,7 +3892,7 @@ const ChatInterface = () => {
                                                     <div className="circular-item-info">
                                                         <span className="circular-item-name">{circular.name}</span>
                                                         <span className="circular-item-posts">
-                                                            {circularsFeed.filter(f => f.circularId === circular.id).length} posts
+                                                            {circular.postCount ?? circularsFeed.filter(f => f.circularId === circular.id).length} posts
                                                         </span>
                                                     </div>
                                                     {/* Options button - for everyone */}
@@ -4060,7 +4081,7 @@ const ChatInterface = () => {
                                         </div>
                                         <div className="circulars-title">
                                             <h3>Announcements & Circulars</h3>
-                                            <p>{circularsFeed.length} announcement{circularsFeed.length !== 1 ? 's' : ''}</p>
+                                            <p>{circularsTotalPosts} announcement{circularsTotalPosts !== 1 ? 's' : ''}</p>
                                         </div>
                                     </div>
                                 </div>
@@ -4564,6 +4585,15 @@ const ChatInterface = () => {
                                                         )}
                                                     </div>
                                                 ))}
+                                                {circularsFeedCursor && (
+                                                    <button
+                                                        className="view-toggle-btn"
+                                                        onClick={() => fetchCircularsFeed(circularsFeedCursor)}
+                                                    >
+                                                        <i className="ri-arrow-down-line"></i>
+                                                        Load older announcements
+                                                    </button>
+                                                )}
                                             </div>
                                         )}
                                     </>
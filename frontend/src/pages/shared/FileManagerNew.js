@@ -598,31 +598,18 @@ const FileManager = () => {
         return;
       }
       
-      // Fetch ALL documents recursively from all folders
-      const documentsResult = await hybridFileManagerService.getDocuments(null, true);
+      // Aggregate counts from the backend instead of listing every document
+      const countsResult = await hybridFileManagerService.getDocumentCounts();
       
-      if (documentsResult.success && documentsResult.documents) {
-        const allDocs = documentsResult.documents;
+      if (countsResult.success && countsResult.counts) {
+        const byType = countsResult.counts.byType || {};
         
         const counts = {
-          documents: 0,
-          images: 0,
-          videos: 0
+          documents: byType.documents || 0,
+          images: byType.images || 0,
+          videos: byType.videos || 0
         };
         
-        allDocs.forEach(doc => {
-          const fileType = getFileTypeFromMime(doc.documentType || doc.document_type);
-          
-          // Count by type (getFileTypeFromMime returns: 'pdf', 'doc', 'sheet', 'image', 'video', 'audio', 'other')
-          if (fileType === 'pdf' || fileType === 'doc' || fileType === 'sheet') {
-            counts.documents++;
-          } else if (fileType === 'image') {
-            counts.images++;
-          } else if (fileType === 'video') {
-            counts.videos++;
-          }
-        });
-        
         setTotalFileCounts(counts);
         console.log('✅ Total file counts loaded:', counts);
       }
@@ -331,6 +331,32 @@ class HybridFileManagerService {
     }
   }
 
+  /**
+   * Get document counts (per folder, per type, starred, trash, shared)
+   * without listing every document
+   */
+  async getDocumentCounts() {
+    try {
+      const headers = this.authToken ? { 'Authorization': `Bearer ${this.authToken}` } : {};
+      const response = await axios.get(`${this.apiBaseUrl}/api/documents/counts`, { headers });
+      
+      if (response.data.success) {
+        return {
+          success: true,
+          counts: response.data.counts
+        };
+      } else {
+        throw new Error(response.data.error);
+      }
+    } catch (error) {
+      console.error('❌ Error getting document counts:', error);
+      return { 
+        success: false, 
+        error: error.response?.data?.error || error.message 
+      };
+    }
+  }
+
   /**
    * Get blockchain transactions
    */